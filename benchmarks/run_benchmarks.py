@@ -0,0 +1,386 @@
+"""Benchmarks of the overhead of experimentor itself.
+
+Each benchmark times one part of the framework without any real experiment
+behind it:
+- config_iter: enumerating a `ConfigureIterable`, for a wide configuration
+  (few axes with many options) and a deep one (many axes with few options).
+- config_count: `count()` on the same configurations.
+- add_log_file: `TrackLog.add_log_file` for new experiments, with and
+  without `skip_if_exists`, and for finished experiments that are skipped,
+  in a log directory that already has 10k or 100k experiments.
+- latest_log_file: `get_latest_track_log_file` on a directory with many logs.
+- command_launch: `SimpleCommandRunner` running `true`, with and without the
+  shell.
+- console_write: printing lines through the `Console` that replaces the
+  stdout while a progress bar is shown, with and without the experiments'
+  titles.
+
+Run it from the root of the repository:
+```
+python benchmarks/run_benchmarks.py --output results.json
+```
+
+The results are written as JSON (see `--output`) with the version of the
+package, the commit and the platform, so they can be compared between
+versions:
+```
+python benchmarks/run_benchmarks.py --compare results.json
+```
+`--compare` prints the ratio of every benchmark to the baseline and exits
+with 1 if any of them is slower than `--threshold`. Use `--quick` for
+smaller sizes, and `--filter` to run only the benchmarks whose names
+contain a string.
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tqdm
+
+import experimentor
+from experimentor.console import Console, experiment_output
+from experimentor.experimentor import count
+
+# The time format of the log file names of TrackLog
+LOG_TIME_FORMAT = '%Y_%m_%d_%H_%M_%S_%f'
+
+
+class Benchmark:
+    """A benchmark with its parameters.
+
+    `setup` returns the state passed to `run`, and `run` does `ops`
+    operations. Only `run` is timed.
+    """
+    def __init__(self, name: str, params: dict, ops: int, run, setup=None,
+                 teardown=None):
+        self.name = name
+        self.params = params
+        self.ops = ops
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+
+    @property
+    def key(self) -> str:
+        params = ','.join(f'{key}={value}' for key, value in self.params.items())
+        return f'{self.name}[{params}]' if params else self.name
+
+    def measure(self, repeat: int) -> dict:
+        """Run the benchmark `repeat` times.
+
+        :param repeat: The number of timed runs.
+        :return: The result, with the seconds of every run.
+        """
+        times = []
+        for _ in range(repeat):
+            state = self.setup() if self.setup is not None else None
+            try:
+                start = time.perf_counter()
+                self.run(state)
+                times.append(time.perf_counter() - start)
+            finally:
+                if self.teardown is not None:
+                    self.teardown(state)
+        best = min(times)
+        return {
+            'key': self.key,
+            'name': self.name,
+            'params': self.params,
+            'ops': self.ops,
+            'times': times,
+            'best': best,
+            'median': statistics.median(times),
+            'per_op': best / self.ops,
+            'ops_per_sec': self.ops / best if best > 0 else None,
+        }
+
+
+def config_benchmarks(quick: bool) -> list[Benchmark]:
+    options = 64 if quick else 256
+    axes = 12 if quick else 16
+    shapes = {
+        # A few axes with many options
+        'wide': [{f'x{j}o{i}': i for i in range(options)} for j in range(2)],
+        # Many axes with two options
+        'deep': [{f'a{i}': 0, f'b{i}': 1} for i in range(axes)],
+    }
+    benchmarks = []
+    for shape, config in shapes.items():
+        total = count(config)
+
+        def iterate(_, config=config):
+            for _ in experimentor.ConfigureIterable(config):
+                pass
+
+        benchmarks.append(Benchmark('config_iter', {'shape': shape}, total,
+                                    iterate))
+        benchmarks.append(Benchmark('config_count', {'shape': shape}, 1,
+                                    lambda _, config=config: count(config)))
+    return benchmarks
+
+
+class LogDirFixture:
+    """A log directory with `size` finished experiments, created on first
+    use and shared by all the runs.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.template = None
+
+    def create(self) -> str:
+        if self.template is None:
+            self.template = tempfile.mkdtemp(prefix='bench_log_')
+            track_log = experimentor.TrackLog(self.template, disable_lock=True)
+            for i in range(self.size):
+                name = f'exp{i}'
+                track_log.add_log_file(name, False)
+                track_log.experiment_started(name, 0)
+                track_log.experiment_finished(name, 0)
+            track_log.close()
+        return self.template
+
+    def cleanup(self):
+        if self.template is not None:
+            shutil.rmtree(self.template, ignore_errors=True)
+            self.template = None
+
+
+def track_log_benchmarks(quick: bool, fixtures: list) -> list[Benchmark]:
+    sizes = [1000, 10000] if quick else [10000, 100000]
+    calls = 200 if quick else 1000
+    benchmarks = []
+    for size in sizes:
+        fixture = LogDirFixture(size)
+        fixtures.append(fixture)
+
+        def setup(fixture=fixture):
+            # The journal is loaded here, so only add_log_file is timed
+            root = fixture.create()
+            return experimentor.TrackLog(root, disable_lock=True), root
+
+        def teardown(state):
+            track_log, root = state
+            track_log.close()
+            for i in range(calls):
+                shutil.rmtree(os.path.join(root, f'new{i}'),
+                              ignore_errors=True)
+
+        for skip_if_exists in (False, True):
+            def add_new(state, skip_if_exists=skip_if_exists):
+                track_log, _ = state
+                for i in range(calls):
+                    track_log.add_log_file(f'new{i}', skip_if_exists)
+
+            benchmarks.append(Benchmark(
+                'add_log_file',
+                {'existing': size, 'skip_if_exists': skip_if_exists,
+                 'experiments': 'new'},
+                calls, add_new, setup, teardown))
+
+        def add_finished(state, size=size):
+            track_log, _ = state
+            for i in range(calls):
+                assert track_log.add_log_file(f'exp{i * size // calls}',
+                                              True) is None
+
+        benchmarks.append(Benchmark(
+            'add_log_file',
+            {'existing': size, 'skip_if_exists': True,
+             'experiments': 'finished'},
+            calls, add_finished, setup, teardown))
+    return benchmarks
+
+
+def latest_log_benchmarks(quick: bool, fixtures: list) -> list[Benchmark]:
+    sizes = [100, 1000] if quick else [1000, 10000]
+    calls = 20
+    benchmarks = []
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix='bench_latest_')
+        fixtures.append(TempDir(root))
+        subdir = os.path.join(root, 'exp')
+        os.makedirs(subdir)
+        start = datetime.datetime(2024, 1, 1)
+        for i in range(size):
+            name = (start + datetime.timedelta(seconds=i)).strftime(
+                LOG_TIME_FORMAT)
+            open(os.path.join(subdir, name + '.log'), 'w').close()
+
+        def latest(_, root=root):
+            for _ in range(calls):
+                assert experimentor.get_latest_track_log_file(root, 'exp')
+
+        benchmarks.append(Benchmark('latest_log_file', {'logs': size}, calls,
+                                    latest))
+    return benchmarks
+
+
+class TempDir:
+    def __init__(self, path: str):
+        self.path = path
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def command_benchmarks(quick: bool, fixtures: list) -> list[Benchmark]:
+    calls = 50 if quick else 200
+    root = tempfile.mkdtemp(prefix='bench_command_')
+    fixtures.append(TempDir(root))
+    file = os.path.join(root, 'out.log')
+    benchmarks = []
+    for shell in (True, False):
+        runner = experimentor.SimpleCommandRunner('true', shell=shell)
+
+        def launch(_, runner=runner):
+            for i in range(calls):
+                runner.run_experiment('true', {}, file)
+
+        benchmarks.append(Benchmark('command_launch', {'shell': shell}, calls,
+                                    launch))
+    return benchmarks
+
+
+def console_benchmarks(quick: bool) -> list[Benchmark]:
+    lines = 20000 if quick else 100000
+
+    def setup():
+        output = io.StringIO()
+        # The same settings as the progress bar of the experiments
+        pbar = tqdm.tqdm(total=lines, file=output, dynamic_ncols=True)
+        console = Console(output)
+        console.start()
+        return console, pbar
+
+    def teardown(state):
+        console, pbar = state
+        console.close()
+        pbar.close()
+
+    benchmarks = []
+    for titled in (False, True):
+        def write(state, titled=titled):
+            console, pbar = state
+            stream = console.stream(console.file)
+            context = (experiment_output('exp') if titled
+                       else contextlib.nullcontext())
+            with context:
+                for i in range(lines):
+                    print(f'line {i}', file=stream)
+            pbar.update(lines)
+
+        benchmarks.append(Benchmark('console_write', {'titled': titled}, lines,
+                                    write, setup, teardown))
+    return benchmarks
+
+
+def environment() -> dict:
+    try:
+        version = importlib.metadata.version('experimentor')
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'version': version,
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': datetime.datetime.now(datetime.UTC).isoformat(),
+    }
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> bool:
+    """Print the ratio of every result to the baseline.
+
+    :param results: The results of this run.
+    :param baseline_path: The path to the results of the baseline.
+    :param threshold: The ratio above which a benchmark is a regression.
+    :return: Whether no benchmark regressed.
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = {result['key']: result for result in json.load(f)['results']}
+    ok = True
+    for result in results:
+        old = baseline.get(result['key'])
+        if old is None:
+            continue
+        ratio = result['per_op'] / old['per_op']
+        mark = ''
+        if ratio > threshold:
+            mark = '  REGRESSION'
+            ok = False
+        print(f"{result['key']}: {ratio:.2f}x{mark}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the overhead of experimentor.')
+    parser.add_argument('--output', type=str,
+                        help='File to write the results to as JSON')
+    parser.add_argument('--compare', type=str, metavar='BASELINE',
+                        help='Results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Ratio to the baseline above which a benchmark '
+                             'is reported as a regression')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs of every benchmark')
+    parser.add_argument('--quick', action='store_true',
+                        help='Use smaller sizes')
+    parser.add_argument('--filter', type=str,
+                        help='Only run the benchmarks whose names contain '
+                             'this string')
+    args = parser.parse_args()
+
+    fixtures = []
+    benchmarks = (config_benchmarks(args.quick)
+                  + track_log_benchmarks(args.quick, fixtures)
+                  + latest_log_benchmarks(args.quick, fixtures)
+                  + command_benchmarks(args.quick, fixtures)
+                  + console_benchmarks(args.quick))
+    if args.filter is not None:
+        benchmarks = [benchmark for benchmark in benchmarks
+                      if args.filter in benchmark.name]
+    results = []
+    try:
+        for benchmark in benchmarks:
+            result = benchmark.measure(args.repeat)
+            results.append(result)
+            print(f"{benchmark.key}: {result['per_op'] * 1e6:.2f} us/op "
+                  f"({result['ops_per_sec']:.0f} ops/s)")
+    finally:
+        for fixture in fixtures:
+            fixture.cleanup()
+
+    report = {'environment': environment(), 'quick': args.quick,
+              'repeat': args.repeat, 'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        if not compare(results, args.compare, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
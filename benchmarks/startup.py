@@ -0,0 +1,210 @@
+"""Benchmark of the startup time of the experimentor command.
+
+The command is started from shell loops and job wrappers, so the time to
+import the package matters as much as the time of the work. Each case runs
+a fresh interpreter with `python -X importtime` and records:
+- The wall time of the whole process (the best of `--repeat` runs).
+- The import time of each top-level module, from the `-X importtime` report
+  of the best run, and the modules that took the longest.
+- The modules that the case must not import (see `CASES`), such as tqdm for
+  `experimentor --help`. Importing any of them fails the benchmark.
+
+The cases are `experimentor --help`, `experimentor status` on a small sweep,
+and `import experimentor`, with a bare interpreter as the reference.
+
+Run it from the root of the repository:
+```
+python benchmarks/startup.py --output startup.json
+python benchmarks/startup.py --compare startup.json
+```
+`--compare` prints the ratio of the wall time of every case to the baseline
+and exits with 1 if any of them is slower than `--threshold`.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from run_benchmarks import environment
+
+import experimentor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules that are only needed to run experiments
+RUN_MODULES = ('tqdm', 'asyncio', 'numpy', 'concurrent.futures',
+               'multiprocessing', 'experimentor.experimentor',
+               'experimentor.experiment_runner')
+
+# The name, the arguments of the interpreter and the modules it must not
+# import. `{log_dir}` and `{config}` are replaced by the paths of the sweep
+# created for the benchmark.
+CASES = [
+    ('python', ['-c', 'pass'], ()),
+    ('import', ['-c', 'import experimentor'], RUN_MODULES),
+    ('help', ['-m', 'experimentor', '--help'], RUN_MODULES),
+    ('status', ['-m', 'experimentor', 'status', '--config-file', '{config}',
+                '--log-dir', '{log_dir}', '--list', 'none'], RUN_MODULES),
+]
+
+# The number of experiments of the sweep of the status case
+SWEEP_SIZE = 100
+
+
+def parse_importtime(stderr: str) -> tuple[dict[str, int], dict[str, int]]:
+    """Parse the report of `-X importtime`.
+
+    :param stderr: The stderr of the process.
+    :return: The cumulative import time in microseconds of every imported
+        module, and of the top-level ones (imported by the program itself).
+    """
+    modules = {}
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # The header of the report
+            continue
+        cumulative = int(fields[1])
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        modules[stripped] = cumulative
+        if len(name) - len(stripped) == 1:
+            top_level[stripped] = cumulative
+    return modules, top_level
+
+
+def run_case(args: list[str], repeat: int) -> dict:
+    """Run a case `repeat` times.
+
+    :param args: The arguments of the interpreter.
+    :param repeat: The number of runs.
+    :return: The wall time of every run, and the import report of the
+        fastest run.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [path for path in [env.get('PYTHONPATH')] if path])
+    times = []
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                                 capture_output=True, text=True, env=env)
+        elapsed = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} failed:\n{process.stderr}")
+        times.append(elapsed)
+        if best is None or elapsed < best[0]:
+            best = elapsed, process.stderr
+    modules, top_level = parse_importtime(best[1])
+    return {'times': times, 'best': best[0], 'modules': modules,
+            'top_level': top_level}
+
+
+def make_sweep(root: str) -> dict[str, str]:
+    """Create a sweep whose experiments are all done, recorded in the
+    journal of `TrackLog` as usual.
+
+    :param root: The directory to create the sweep in.
+    :return: The replacements of the arguments of the cases.
+    """
+    config_file = os.path.join(root, 'config.json')
+    with open(config_file, 'w') as f:
+        json.dump([{f'n{i}': i for i in range(SWEEP_SIZE)}], f)
+    log_dir = os.path.join(root, 'logs')
+    track_log = experimentor.TrackLog(log_dir, disable_lock=True)
+    for i in range(SWEEP_SIZE):
+        track_log.add_log_file(f'n{i}', False)
+        track_log.experiment_started(f'n{i}', 0)
+        track_log.experiment_finished(f'n{i}', 0)
+    track_log.close()
+    return {'config': config_file, 'log_dir': log_dir}
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> bool:
+    """Print the ratio of the wall time of every case to the baseline.
+
+    :param results: The results of this run.
+    :param baseline_path: The path to the results of the baseline.
+    :param threshold: The ratio above which a case is a regression.
+    :return: Whether no case regressed.
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = {result['name']: result for result in json.load(f)['results']}
+    ok = True
+    for result in results:
+        old = baseline.get(result['name'])
+        if old is None:
+            continue
+        ratio = result['best'] / old['best']
+        mark = ''
+        if ratio > threshold:
+            mark = '  REGRESSION'
+            ok = False
+        print(f"{result['name']}: {ratio:.2f}x{mark}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the startup time of experimentor.')
+    parser.add_argument('--output', type=str,
+                        help='File to write the results to as JSON')
+    parser.add_argument('--compare', type=str, metavar='BASELINE',
+                        help='Results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Ratio to the baseline above which a case is '
+                             'reported as a regression')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of runs of every case')
+    parser.add_argument('--top', type=int, default=5,
+                        help='Number of the slowest imports to print')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_startup_')
+    # Keep the status index of the sweep out of the cache of the user
+    os.environ['XDG_CACHE_HOME'] = os.path.join(root, 'cache')
+    results = []
+    ok = True
+    try:
+        replacements = make_sweep(root)
+        for name, case_args, forbidden in CASES:
+            case_args = [arg.format(**replacements) for arg in case_args]
+            result = run_case(case_args, args.repeat)
+            result['name'] = name
+            result['forbidden'] = [module for module in forbidden
+                                   if module in result['modules']]
+            results.append(result)
+            print(f"{name}: {result['best'] * 1000:.1f} ms")
+            slowest = sorted(result['top_level'].items(),
+                             key=lambda item: -item[1])[:args.top]
+            for module, cumulative in slowest:
+                print(f"    {module}: {cumulative / 1000:.1f} ms")
+            if result['forbidden']:
+                print(f"    imports {', '.join(result['forbidden'])}  "
+                      f"FORBIDDEN")
+                ok = False
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {'environment': environment(), 'repeat': args.repeat,
+              'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        ok = compare(results, args.compare, args.threshold) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@
 the experiment if the log file already exists.
 
 Our experiment runner can be easily set to skip the experiment if the log file
-already exists. This is useful when you want to resume the experiment.
+already exists. This is useful when you want to resume the experiment. The
+default track log records the states of the experiments in a journal, so only
+the experiments that have succeeded are skipped, and the failed ones are run
+again.
 However, you must bear in mind that if you have previously run the experiment
 but want to change the configuration, you should move the previous log files
 to another directory (or delete them if you don't need them anymore).
@@ -47,4 +50,4 @@ if __name__ == '__main__':
     experimentor.run_experiments(configuration,
                                  experimentor.SimpleCommandRunner("echo"),
                                  'log', 1, skip_if_exists=True)
-    print("The first experiment is skipped because the log file already exists.")
+    print("The first experiment is skipped because it has succeeded.")
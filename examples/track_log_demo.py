@@ -8,9 +8,9 @@ and the value is the value of the parameter. The experiment has the title
 of the parameter value.
 
 In the experiment, the stdout will be redirected to the log file. The log file
-will be named after the current time in the format of '%Y_%m_%d_%H_%M_%S.log'
-in UTC time to avoid conflicts. The log file will be stored in a subdirectory
-named after the experiment title.
+will be named after the current time in the format of
+'%Y_%m_%d_%H_%M_%S_%f.log' in UTC time to avoid conflicts. The log file will
+be stored in a subdirectory named after the experiment title.
 """
 
 import experimentor
@@ -1,11 +1,76 @@
-from .experimentor import run_experiments, Experimentor
-from .experiment_runner import BaseExperimentRunner, SimpleCommandRunner
-from .track_log import (BaseTrackLog, TrackLog, has_track_log,
-                        get_latest_track_log_file, open_latest_track_log_file)
-
-__all__ = [
-    'run_experiments', 'Experimentor',
-    'BaseExperimentRunner', 'SimpleCommandRunner',
-    'BaseTrackLog', 'TrackLog', 'has_track_log',
-    'get_latest_track_log_file', 'open_latest_track_log_file',
-]
+"""Run a series of experiments automatically.
+
+The names below are imported from their modules when they are first used,
+so `import experimentor` is fast, and a program that only reads the logs
+does not import the runners, asyncio or tqdm.
+"""
+
+import importlib
+
+# The module of every public name
+_MODULES = {
+    'run_experiments': 'experimentor',
+    'run_experiments_async': 'experimentor',
+    'Experimentor': 'experimentor',
+    'BaseExperimentRunner': 'experiment_runner',
+    'SimpleCommandRunner': 'experiment_runner',
+    'AsyncCommandRunner': 'experiment_runner',
+    'CallableRunner': 'experiment_runner',
+    'CommandTemplate': 'command',
+    'Axis': 'axes',
+    'ChoiceAxis': 'axes',
+    'RangeAxis': 'axes',
+    'LinspaceAxis': 'axes',
+    'LogspaceAxis': 'axes',
+    'FileAxis': 'axes',
+    'IterableAxis': 'axes',
+    'ConfigureIterable': 'configure_production',
+    'Coordinator': 'distributed',
+    'run_worker': 'distributed',
+    'RetryPolicy': 'failure',
+    'FailureReport': 'failure',
+    'RunLedger': 'ledger',
+    'ExperimentLimits': 'limits',
+    'ExperimentTimeoutError': 'limits',
+    'LogCapture': 'log_capture',
+    'open_log': 'log_capture',
+    'SuccessiveHalving': 'halving',
+    'Hyperband': 'halving',
+    'SearchResult': 'halving',
+    'RuntimePredictor': 'ordering',
+    'SweepPlan': 'plan',
+    'compile_plan': 'plan',
+    'ResultCache': 'result_cache',
+    'Resources': 'scheduler',
+    'ResourceScheduler': 'scheduler',
+    'machine_resources': 'scheduler',
+    'BaseTrackLog': 'track_log',
+    'TrackLog': 'track_log',
+    'SqliteTrackLog': 'sqlite_track_log',
+    'has_track_log': 'track_log',
+    'get_latest_track_log_file': 'track_log',
+    'open_latest_track_log_file': 'track_log',
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str):
+    module = _MODULES.get(name)
+    if module is None:
+        # A submodule, such as `experimentor.track_log`
+        try:
+            return importlib.import_module(f'.{name}', __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute "
+                                 f"{name!r}") from None
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    # Cache it, so this function is not called again for the name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,33 +1,508 @@
+"""The command line interface.
+
+The commands are often started from shell loops and job wrappers, so only
+the modules a command needs are imported, after its arguments are parsed.
+`experimentor --help` imports nothing but `argparse`.
+"""
+
 import argparse
 import json
+import os
 import sys
 
-from .const import DEFAULT_MAX_TRIALS
-from .experiment_runner import SimpleCommandRunner
-from .experimentor import run_experiments
+from .const import DEFAULT_MAX_TRIALS, DEFAULT_PORT
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Run experiments automatically.')
-    parser.add_argument('--config-file', type=str,
-                        help='Config file', required=True)
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse the shard option in the form of 'k/N'.
+
+    :param value: The value of the option.
+    :return: The index of the shard (starting from 0) and the number of
+        shards.
+    """
+    try:
+        k, n = (int(i) for i in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard: {value}")
+    if n < 1 or not 0 <= k < n:
+        raise argparse.ArgumentTypeError(f"Invalid shard: {value}")
+    return k, n
+
+
+def parse_number(value: str) -> int | float:
+    """Parse an integer or a floating point number.
+
+    :param value: The value of the option.
+    :return: The number.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments to give the configurations.
+
+    :param parser: The parser to add the arguments to.
+    """
+    config_group = parser.add_mutually_exclusive_group(required=True)
+    config_group.add_argument('--config-file', type=str, help='Config file')
+    config_group.add_argument('--plan', type=str,
+                              help='Plan file compiled by "experimentor plan"')
+
+
+def load_config(args: argparse.Namespace, start_index=0,
+                stop_index: int | None = None) -> 'ConfigureIterable':
+    """Load the configurations given in the command line.
+
+    :param args: The parsed arguments.
+    :param start_index: The index of the first configuration.
+    :param stop_index: The index after the last configuration.
+    :return: The configurations.
+    """
+    if args.plan is not None:
+        from .plan import SweepPlan
+        return SweepPlan(args.plan).configs(start_index, stop_index)
+    from .configure_production import ConfigureIterable
+    with open(args.config_file, 'r') as f:
+        return ConfigureIterable(json.load(f), start_index, stop_index)
+
+
+def add_runner_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments to run the experiments with `SimpleCommandRunner`.
+
+    :param parser: The parser to add the arguments to.
+    """
     parser.add_argument('--command', type=str,
                         help='Base command to run', required=True)
+    parser.add_argument('--no-shell', action='store_true',
+                        help='Run the command without the shell. The '
+                             'command can refer to the values of the '
+                             'configuration by name, e.g. "--lr={lr}", and '
+                             '"{args}" marks where the other arguments go')
     log_group = parser.add_mutually_exclusive_group()
     log_group.add_argument('--no-log', action='store_true',
                            help='Do not log the output')
     log_group.add_argument('--log-dir', type=str, help='Log directory')
+    parser.add_argument('--log-db', action='store_true',
+                        help='Store the logs in a single SQLite database in '
+                             'the log directory instead of one file per run')
+    parser.add_argument('--shared', action='store_true',
+                        help='Share the log directory with other processes '
+                             'running the same sweep, possibly on other hosts; '
+                             'each experiment is claimed with a lease')
+    parser.add_argument('--lease-ttl', type=float, default=60.0,
+                        help='Seconds after which the lease of a dead '
+                             'process is reclaimed with --shared')
+    parser.add_argument('--no-ledger', action='store_true',
+                        help='Do not record the time, CPU, memory and log '
+                             'size of every trial in ledger.jsonl in the '
+                             'log directory')
     parser.add_argument('--max-trial', type=int,
                         default=DEFAULT_MAX_TRIALS, help='Maximum number of trials')
-    if len(sys.argv) == 1:
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip the experiments that have succeeded in the '
+                             'log directory')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Maximum number of experiments to run at the same time')
+    parser.add_argument('--stderr', choices=['merge', 'separate'],
+                        help='Capture the stderr into the log file, or into '
+                             'a separate ".stderr" file next to it')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='Compress the logs while they are written')
+    parser.add_argument('--max-log-size', type=int,
+                        help='Keep at most this many MiB of each output '
+                             'stream (the head and the tail)')
+    parser.add_argument('--cache-dir', type=str,
+                        help='Reuse the outputs of the experiments with the '
+                             'same command line from this directory')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Maximum size of the cache in MiB')
+    parser.add_argument('--hash-executable', action='store_true',
+                        help='Run the cached experiments again if the '
+                             'executable changes')
+    limit_group = parser.add_argument_group('limits')
+    limit_group.add_argument('--timeout', type=float,
+                             help='Kill an experiment and all the processes '
+                                  'it started after this many seconds')
+    limit_group.add_argument('--stall-timeout', type=float,
+                             help='Kill an experiment if its log has not '
+                                  'grown for this many seconds')
+    limit_group.add_argument('--memory-limit', type=int,
+                             help='Maximum address space in MiB of each '
+                                  'process of an experiment')
+    limit_group.add_argument('--cpu-limit', type=int,
+                             help='Maximum CPU time in seconds of each '
+                                  'process of an experiment')
+
+
+def make_track_log(args: argparse.Namespace,
+                   log_dir: str | None) -> 'BaseTrackLog | None':
+    """Make the track log from the command line arguments.
+
+    :param args: The parsed arguments.
+    :param log_dir: The log directory, or None if nothing is logged.
+    :return: The SQLite track log if `--log-db` is given, a shared track log
+        if `--shared` is given, or None to use the default track log.
+    """
+    if log_dir is None:
+        return None
+    if args.log_db:
+        if args.shared:
+            raise ValueError("--log-db and --shared cannot be used together")
+        from .sqlite_track_log import SqliteTrackLog
+        return SqliteTrackLog(log_dir)
+    if args.shared:
+        from .track_log import TrackLog
+        return TrackLog(log_dir, shared=True, lease_ttl=args.lease_ttl)
+    return None
+
+
+def make_capture(args: argparse.Namespace) -> 'LogCapture | None':
+    """Make the log capture from the command line arguments.
+
+    :param args: The parsed arguments.
+    :return: The log capture, or None if only the stdout is logged as is.
+    """
+    if (args.stderr is None and args.compress is None
+            and args.max_log_size is None):
+        return None
+    max_bytes = None
+    if args.max_log_size is not None:
+        max_bytes = args.max_log_size * 1024 * 1024
+    from .log_capture import LogCapture
+    return LogCapture(args.stderr, args.compress, max_bytes)
+
+
+def make_limits(args: argparse.Namespace) -> 'ExperimentLimits | None':
+    """Make the limits of the experiments from the command line arguments.
+
+    :param args: The parsed arguments.
+    :return: The limits, or None if no limit is given.
+    """
+    if (args.timeout is None and args.stall_timeout is None
+            and args.memory_limit is None and args.cpu_limit is None):
+        return None
+    memory = None
+    if args.memory_limit is not None:
+        memory = args.memory_limit * 1024 * 1024
+    from .limits import ExperimentLimits
+    return ExperimentLimits(args.timeout, args.stall_timeout, memory,
+                            args.cpu_limit)
+
+
+def make_cache(args: argparse.Namespace) -> 'ResultCache | None':
+    """Make the result cache from the command line arguments.
+
+    :param args: The parsed arguments.
+    :return: The result cache, or None if no cache directory is given.
+    """
+    if args.cache_dir is None:
+        return None
+    from .result_cache import ResultCache
+    return ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+
+def run_main(argv: list[str]):
+    """Run the experiments on this machine.
+
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Run experiments automatically.',
+                                     epilog='Other commands: serve, worker, '
+                                            'status, plan. '
+                                            'Run "experimentor <command> '
+                                            '--help" for more information.')
+    add_config_arguments(parser)
+    add_runner_arguments(parser)
+    parser.add_argument('--start-index', type=int, default=0,
+                        help='Index of the first configuration to run')
+    parser.add_argument('--stop-index', type=int,
+                        help='Index after the last configuration to run')
+    parser.add_argument('--shard', type=parse_shard, metavar='k/N',
+                        help='Only run the k-th (starting from 0) of N '
+                             'disjoint shards of the configurations')
+    parser.add_argument('--cpus-per-experiment', type=int,
+                        help='Number of cores needed by each experiment. If '
+                             'this or --memory-per-experiment is given, the '
+                             'experiments are packed onto the cores and memory '
+                             'of the machine')
+    parser.add_argument('--memory-per-experiment', type=int,
+                        help='Memory in MiB needed by each experiment')
+    parser.add_argument('--longest-first', action='store_true',
+                        help='Run the configurations with the longest runtime '
+                             'first, as predicted from the ledger of the log '
+                             'directory')
+    parser.add_argument('--show-workers', action='store_true',
+                        help='List the running experiments below the progress '
+                             'bar')
+    failure_group = parser.add_argument_group('failures')
+    failure_group.add_argument('--keep-going', action='store_true',
+                               help='Keep running the other experiments when '
+                                    'an experiment fails all its trials, and '
+                                    'retry it at the end')
+    failure_group.add_argument('--retry-delay', type=float, default=0.0,
+                               help='Seconds to wait before the first retry '
+                                    'of an experiment')
+    failure_group.add_argument('--retry-backoff', type=float, default=2.0,
+                               help='Factor of the delay between two retries')
+    failure_group.add_argument('--deferred-rounds', type=int, default=1,
+                               help='Number of times the failed experiments '
+                                    'are retried at the end with --keep-going')
+    failure_group.add_argument('--deferred-delay', type=float, default=0.0,
+                               help='Seconds to wait before each round of '
+                                    'the retries at the end with --keep-going')
+    failure_group.add_argument('--failure-report', type=str, metavar='FILE',
+                               help='Write the failed experiments to this '
+                                    'JSON file with --keep-going')
+    search_group = parser.add_argument_group(
+        'search', 'Run a successive halving or Hyperband search instead of '
+                  'all the configurations with the full budget')
+    search_group.add_argument('--search', choices=['halving', 'hyperband'],
+                              help='Search algorithm')
+    search_group.add_argument('--min-budget', type=parse_number,
+                              help='Budget of the first rung')
+    search_group.add_argument('--max-budget', type=parse_number,
+                              help='Budget of the last rung')
+    search_group.add_argument('--eta', type=int, default=3,
+                              help='Factor of the budget between two rungs')
+    search_group.add_argument('--budget-option', type=str,
+                              help='Option to pass the budget to the command, '
+                                   'e.g. "epochs" for "--epochs 3"')
+    search_group.add_argument('--metric-pattern', type=str,
+                              help='Regular expression to find the metric in '
+                                   'the log; the first group of the last '
+                                   'match is used')
+    search_group.add_argument('--maximize', action='store_true',
+                              help='A larger metric is better')
+    search_group.add_argument('--seed', type=int,
+                              help='Seed to sample the configurations for '
+                                   'Hyperband')
+    if len(argv) == 0:
         parser.print_help(sys.stderr)
         sys.exit(1)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    from .experiment_runner import SimpleCommandRunner
+    from .experimentor import Experimentor, run_experiments
+    from .failure import RetryPolicy
+    from .halving import SuccessiveHalving, Hyperband
+    from .ordering import RuntimePredictor
+    from .scheduler import Resources, ResourceScheduler
+
+    config = load_config(args, args.start_index, args.stop_index)
+    if args.shard is not None:
+        config = config.shard(*args.shard)
+    log_dir = None if args.no_log else args.log_dir
+    resources = None
+    scheduler = None
+    if (args.cpus_per_experiment is not None
+            or args.memory_per_experiment is not None):
+        resources = Resources(args.cpus_per_experiment or 1,
+                              (args.memory_per_experiment or 0) * 1024 * 1024)
+        scheduler = ResourceScheduler()
+    runner = SimpleCommandRunner(args.command, resources, args.budget_option,
+                                 args.metric_pattern, make_cache(args),
+                                 args.hash_executable, not args.no_shell,
+                                 make_capture(args), make_limits(args))
+    retry_policy = RetryPolicy(args.retry_delay, args.retry_backoff,
+                               deferred_rounds=args.deferred_rounds,
+                               deferred_delay=args.deferred_delay)
+    predictor = None
+    if args.longest_first:
+        if log_dir is None:
+            parser.error('--longest-first needs --log-dir')
+        predictor = RuntimePredictor.from_log_dir(log_dir)
+    if args.search is None:
+        report = run_experiments(config, runner, log_dir, args.max_trial,
+                                 skip_if_exists=args.resume,
+                                 track_log=make_track_log(args, log_dir),
+                                 max_workers=args.jobs, scheduler=scheduler,
+                                 continue_on_failure=args.keep_going,
+                                 retry_policy=retry_policy,
+                                 ledger=not args.no_ledger,
+                                 predictor=predictor,
+                                 show_workers=args.show_workers)
+        if report is not None:
+            if args.failure_report is not None:
+                with open(args.failure_report, 'w') as f:
+                    f.write(report.to_json())
+            if not report:
+                sys.exit(1)
+        return
+
+    if (args.min_budget is None or args.max_budget is None
+            or args.budget_option is None or args.metric_pattern is None
+            or log_dir is None):
+        parser.error('--search needs --min-budget, --max-budget, '
+                     '--budget-option, --metric-pattern and --log-dir')
+    if args.search == 'halving':
+        search = SuccessiveHalving(args.min_budget, args.max_budget, args.eta,
+                                   not args.maximize)
+    else:
+        search = Hyperband(args.min_budget, args.max_budget, args.eta,
+                           not args.maximize, args.seed)
+    results = Experimentor(config, runner, log_dir,
+                           make_track_log(args, log_dir), max_workers=args.jobs,
+                           retry_policy=retry_policy,
+                           ledger=not args.no_ledger,
+                           show_workers=args.show_workers).run_search(
+                               search, args.max_trial)
+    for result in results:
+        print(f"{result.title}: {result.metric} (budget {result.budget})")
+
+
+def serve_main(argv: list[str]):
+    """Hand out the configurations to the workers.
+
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog='experimentor serve',
+        description='Coordinate a sweep run by "experimentor worker" processes.')
+    add_config_arguments(parser)
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='Port to listen on')
+    parser.add_argument('--heartbeat-timeout', type=float, default=60.0,
+                        help='Seconds without a heartbeat from a worker '
+                             'after which its configuration is handed out '
+                             'again')
+    args = parser.parse_args(argv)
+
+    from .distributed import Coordinator
+
+    config = load_config(args)
+    failures = Coordinator(config, args.host, args.port,
+                           args.heartbeat_timeout).serve()
+    if failures:
+        sys.exit(1)
+
+
+def worker_main(argv: list[str]):
+    """Run the configurations handed out by "experimentor serve".
+
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog='experimentor worker',
+        description='Run the configurations handed out by "experimentor serve".')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address of the coordinator')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='Port of the coordinator')
+    add_runner_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from .distributed import run_worker
+    from .experiment_runner import SimpleCommandRunner
 
-    config = json.load(open(args.config_file))
     log_dir = None if args.no_log else args.log_dir
-    run_experiments(config, SimpleCommandRunner(args.script),
-                    log_dir, args.max_trial)
+    runner = SimpleCommandRunner(args.command, cache=make_cache(args),
+                                 hash_executable=args.hash_executable,
+                                 shell=not args.no_shell,
+                                 capture=make_capture(args),
+                                 limits=make_limits(args))
+    run_worker(args.host, args.port, runner,
+               log_dir, args.max_trial, skip_if_exists=args.resume,
+               track_log=make_track_log(args, log_dir),
+               max_workers=args.jobs, ledger=not args.no_ledger)
+
+
+def status_main(argv: list[str]):
+    """Report how far a sweep is from its log directory.
+
+    :param argv: The command line arguments.
+    """
+    from .status import STATES, MISSING, StatusIndex, sweep_status
+
+    parser = argparse.ArgumentParser(
+        prog='experimentor status',
+        description='Report the done, failed, started and missing '
+                    'experiments of a sweep.')
+    add_config_arguments(parser)
+    parser.add_argument('--log-dir', type=str, help='Log directory',
+                        required=True)
+    parser.add_argument('--shard', type=parse_shard, metavar='k/N',
+                        help='Only report the k-th (starting from 0) of N '
+                             'shards of the configurations')
+    parser.add_argument('--list', choices=STATES + ('none',), default=MISSING,
+                        help='List the titles in this state (default: '
+                             'missing)')
+    parser.add_argument('--latest', type=str, metavar='TITLE',
+                        help='Only print the path to the latest log file of '
+                             'the experiment')
+    parser.add_argument('-j', '--jobs', type=int, default=8,
+                        help='Number of threads to walk the log directory')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Walk the log directory from scratch without '
+                             'reading or updating the cached index')
+    args = parser.parse_args(argv)
+
+    if args.latest is not None:
+        index = StatusIndex(args.log_dir, not args.no_index)
+        index.refresh(args.jobs)
+        if not args.no_index:
+            index.save()
+        latest = index.latest_log_file(args.latest)
+        if latest is None:
+            sys.exit(f"No log file for {args.latest}")
+        print(latest)
+        return
+
+    config = load_config(args)
+    if args.shard is not None:
+        config = config.shard(*args.shard)
+    status = sweep_status(config, args.log_dir, args.jobs, not args.no_index)
+    print(status.summary())
+    if args.list != 'none':
+        for title in status.titles[args.list]:
+            print(title)
+
+
+def plan_main(argv: list[str]):
+    """Validate a configuration and compile it into a plan file.
+
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog='experimentor plan',
+        description='Validate a configuration and compile it into a plan '
+                    'file that the other commands read with --plan.')
+    parser.add_argument('--config-file', type=str,
+                        help='Config file', required=True)
+    parser.add_argument('-o', '--output', type=str, required=True,
+                        help='Plan file to write')
+    args = parser.parse_args(argv)
+
+    from .plan import compile_plan
+
+    with open(args.config_file, 'r') as f:
+        config = json.load(f)
+    try:
+        total = compile_plan(config, args.output)
+    except (ValueError, TypeError) as e:
+        sys.exit(f"Invalid configuration: {e}")
+    size = os.path.getsize(args.output)
+    print(f"Compiled {total} configurations into {args.output} "
+          f"({size} bytes)")
+
+
+COMMANDS = {
+    'serve': serve_main,
+    'worker': worker_main,
+    'status': status_main,
+    'plan': plan_main,
+}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+    else:
+        run_main(sys.argv[1:])
 
 
 if __name__ == '__main__':
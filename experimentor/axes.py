@@ -0,0 +1,294 @@
+"""This module provides the parameter axes of a sweep.
+
+Each entry in the configuration list is an axis: the configurations are the
+cartesian product of the axes. A dictionary is a `ChoiceAxis`, where each
+key-value pair is a choice. The other axes generate their values lazily, so
+a sweep over a large number of values does not need to allocate all of them
+up front. In a configuration, a lazy axis contributes its name as the key
+and the generated value as the value, and `name=value` to the title (see
+`title_part`).
+
+In JSON, a lazy axis is written as a dictionary with a single key (the name
+of the axis) whose value is a dictionary with a single expression. The
+expressions start with '$', so they never clash with the options of
+`experimentor.SimpleCommandRunner`:
+
+- `{"n": {"$range": [0, 100, 2]}}`: the same as `range(0, 100, 2)`.
+- `{"lr": {"$linspace": [0, 1, 11]}}`: 11 evenly spaced values from 0 to 1.
+- `{"lr": {"$logspace": [-5, -1, 1000]}}`: 1000 values from 1e-5 to 1e-1,
+  evenly spaced on a log scale.
+- `{"x": {"$file": "values.txt"}}`: the non-empty lines of the file.
+"""
+
+import array
+import os
+import threading
+from collections.abc import Callable, Iterable
+
+# The number of significant digits of the floats in the titles
+TITLE_FLOAT_DIGITS = 12
+
+
+class Axis:
+    """Base class of the parameter axes.
+
+    An axis must have a `length` attribute (None if the length is unknown)
+    and an `item` method that returns the title, the key and the value of
+    the choice with the given index. If the keys are known without
+    enumerating the choices, `known_keys` should return them, so the keys
+    shared by several axes are detected once when the sweep is created
+    instead of for every configuration.
+    """
+    length: int | None = None
+
+    def known_keys(self) -> list | None:
+        """Get the keys that the choices of the axis can have.
+
+        :return: The keys, or None if they are unknown.
+        """
+        return None
+
+    def item(self, index: int) -> tuple[str, object, object]:
+        """Get the choice with the given index.
+
+        :param index: The index of the choice. Must not be negative.
+        :return: The title, the key and the value of the choice. Raise an
+            IndexError if the index is out of range.
+        """
+        raise NotImplementedError
+
+
+class ChoiceAxis(Axis):
+    """An axis where each key-value pair of a dictionary is a choice.
+    """
+    def __init__(self, choices: dict):
+        self.keys = list(choices.keys())
+        self.titles = [str(key) for key in self.keys]
+        self.values = list(choices.values())
+        self.length = len(self.keys)
+
+    def known_keys(self) -> list:
+        return self.keys
+
+    def item(self, index: int) -> tuple[str, object, object]:
+        return self.titles[index], self.keys[index], self.values[index]
+
+
+class NamedAxis(Axis):
+    """Base class of the axes that generate values for a single key.
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    def known_keys(self) -> list:
+        return [self.name]
+
+    def value(self, index: int):
+        """Get the value with the given index.
+
+        :param index: The index of the value. Must not be negative.
+        :return: The value. Raise an IndexError if the index is out of
+            range.
+        """
+        raise NotImplementedError
+
+    def item(self, index: int) -> tuple[str, object, object]:
+        value = self.value(index)
+        return (f'{title_part(self.name)}={title_part(value)}', self.name,
+                value)
+
+
+class RangeAxis(NamedAxis):
+    """An axis of integers, the same as `range(start, stop, step)`.
+    """
+    def __init__(self, name: str, start: int, stop: int | None = None,
+                 step=1):
+        super().__init__(name)
+        if stop is None:
+            start, stop = 0, start
+        self.values = range(start, stop, step)
+        self.length = len(self.values)
+
+    def value(self, index: int):
+        return self.values[index]
+
+
+class LinspaceAxis(NamedAxis):
+    """An axis of `num` evenly spaced numbers from `start` to `stop`.
+    """
+    def __init__(self, name: str, start: float, stop: float, num: int,
+                 endpoint=True):
+        super().__init__(name)
+        if num < 0:
+            raise ValueError("num must not be negative")
+        self.start = start
+        self.stop = stop
+        self.length = num
+        divisor = num - 1 if endpoint else num
+        self.step = (stop - start) / divisor if divisor > 0 else 0.0
+
+    def value(self, index: int):
+        if not 0 <= index < self.length:
+            raise IndexError("axis index out of range")
+        return self.start + index * self.step
+
+
+class LogspaceAxis(LinspaceAxis):
+    """An axis of `num` numbers from `base ** start` to `base ** stop`,
+    evenly spaced on a log scale.
+    """
+    def __init__(self, name: str, start: float, stop: float, num: int,
+                 base=10.0, endpoint=True):
+        super().__init__(name, start, stop, num, endpoint)
+        self.base = base
+
+    def value(self, index: int):
+        return self.base ** super().value(index)
+
+
+class FileAxis(NamedAxis):
+    """An axis of the non-empty lines of a text file.
+
+    The file is scanned once for the offsets of the lines, which are stored
+    in a compact array. The lines themselves are read when they are needed.
+    """
+    def __init__(self, name: str, path: str,
+                 converter: Callable[[str], object] | None = None):
+        """Initialize the FileAxis object.
+
+        :param name: The name of the axis.
+        :param path: The path to the file.
+        :param converter: A function to convert each line (without the line
+            break). If None, the lines are used as strings.
+        """
+        super().__init__(name)
+        self.path = path
+        self.converter = converter
+        self.starts = array.array('q')
+        self.ends = array.array('q')
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                stripped = line.rstrip(b'\r\n')
+                if stripped.strip():
+                    self.starts.append(offset)
+                    self.ends.append(offset + len(stripped))
+                offset += len(line)
+        self.length = len(self.starts)
+        self._fd = os.open(path, os.O_RDONLY)
+
+    def __del__(self):
+        fd = getattr(self, '_fd', None)
+        if fd is not None:
+            os.close(fd)
+
+    def value(self, index: int):
+        start = self.starts[index]
+        line = os.pread(self._fd, self.ends[index] - start, start).decode()
+        if self.converter is not None:
+            return self.converter(line)
+        return line
+
+
+class IterableAxis(NamedAxis):
+    """An axis of the values of an arbitrary iterable.
+
+    If the iterable is a sequence (it supports `len()` and indexing), the
+    values are accessed directly. Otherwise, the values are pulled from the
+    iterator when they are first needed and kept for later use. If
+    `iterable` is callable, it is called to get the iterable.
+
+    If the length is neither given nor available from `len()`, the length
+    is unknown. Only the first axis of a sweep can have an unknown length.
+    """
+    def __init__(self, name: str, iterable: Iterable | Callable[[], Iterable],
+                 length: int | None = None):
+        super().__init__(name)
+        if callable(iterable) and not isinstance(iterable, Iterable):
+            iterable = iterable()
+        self.sequence = None
+        self.iterator = None
+        self.cache = []
+        self._lock = threading.Lock()
+        if hasattr(iterable, '__getitem__') and hasattr(iterable, '__len__'):
+            self.sequence = iterable
+            if length is None:
+                length = len(iterable)
+        else:
+            self.iterator = iter(iterable)
+            if length is None and hasattr(iterable, '__len__'):
+                length = len(iterable)
+        self.length = length
+
+    def value(self, index: int):
+        if index < 0 or (self.length is not None and index >= self.length):
+            raise IndexError("axis index out of range")
+        if self.sequence is not None:
+            return self.sequence[index]
+        with self._lock:
+            while len(self.cache) <= index:
+                try:
+                    self.cache.append(next(self.iterator))
+                except StopIteration:
+                    raise IndexError("axis index out of range")
+            return self.cache[index]
+
+
+def title_part(value) -> str:
+    """Format a name or a value for the title of an experiment.
+
+    The title is used as a directory name, so the path separators, '%' and
+    the control characters are escaped as '%XX'. A line of a file can then
+    not make a nested path. Floats are written with `TITLE_FLOAT_DIGITS`
+    significant digits, so 0.1 + 0.2 is '0.3'.
+
+    :param value: The name or the value.
+    :return: The text for the title.
+    """
+    if isinstance(value, float):
+        text = format(value, f'.{TITLE_FLOAT_DIGITS}g')
+    else:
+        text = str(value)
+    return ''.join(f'%{ord(char):02X}' if char in '/\\%' or ord(char) < 32
+                   else char for char in text)
+
+
+EXPRESSIONS = {
+    '$range': lambda name, args: RangeAxis(name, *args),
+    '$linspace': lambda name, args: LinspaceAxis(name, *args),
+    '$logspace': lambda name, args: LogspaceAxis(name, *args),
+    '$file': lambda name, path: FileAxis(name, path),
+}
+
+
+def is_axis_expression(entry: dict) -> bool:
+    """Check whether the dictionary is a lazy axis expression in JSON.
+
+    :param entry: An entry in the configuration list.
+    :return: Whether the entry is in the form of `{name: {"$expr": args}}`.
+    """
+    if len(entry) != 1:
+        return False
+    expression = next(iter(entry.values()))
+    return (type(expression) == dict and len(expression) == 1
+            and str(next(iter(expression))).startswith('$'))
+
+
+def make_axis(entry: dict | Axis) -> Axis:
+    """Make an axis from an entry in the configuration list.
+
+    :param entry: A dictionary, a lazy axis expression (see the module
+        documentation), or an `Axis` object.
+    :return: The axis.
+    """
+    if isinstance(entry, Axis):
+        return entry
+    if type(entry) != dict:
+        raise TypeError(f"Invalid configuration entry: {entry!r}")
+    if not is_axis_expression(entry):
+        return ChoiceAxis(entry)
+    name, expression = next(iter(entry.items()))
+    kind, args = next(iter(expression.items()))
+    if kind not in EXPRESSIONS:
+        raise ValueError(f"Unknown axis expression: {kind}")
+    return EXPRESSIONS[kind](name, args)
@@ -5,12 +5,14 @@ If only the stderr is a tty, the progress bar will be displayed in the stderr.
 If neither of them is a tty, the progress bar will be disabled.
 This check is done in the `tqdm_file` function.
 
-The `CliFile` class is a wrapper for the stdout and stderr if any of them is
-a tty. It will redirect all write calls to the `tqdm.tqdm.write` function.
-This makes the progress bar display correctly in the CLI.
+While the progress bar is shown, the stdout and stderr are redirected to an
+`experimentor.console.Console` if they are ttys, which writes the output
+above the progress bar at a bounded rate. See the `console` module.
+
+`tqdm` is imported when it is first used, so the commands that do not show
+a progress bar start faster.
 """
 
-import tqdm
 import contextlib
 import sys
 
@@ -28,24 +30,9 @@ def tqdm_file() -> type(sys.stdout) | None:
     else:
         return None
 
-class CliFile(object):
-    """A class to redirect the write calls to `tqdm.tqdm.write`.
-    """
-    file = None
-    def __init__(self, file):
-        self.file = file
-
-    def flush(self):
-        self.file.flush()
-
-    def write(self, x):
-        if len(x.rstrip()) > 0: # To avoid unintended empty lines
-            tqdm.tqdm.write(x, file=self.file)
-
-
 @contextlib.contextmanager
-def redirect_stream_for_tqdm():
-    """Redirect stdout and stderr to `CliFile` if they are tty.
+def redirect_stream_for_tqdm(progress_bar_file=None, status_lines=0):
+    """Redirect stdout and stderr to a `Console` if they are tty.
     This makes the progress bar display correctly in the CLI.
 
     The yield statement is used to separate the setup and teardown code.
@@ -56,15 +43,33 @@ def redirect_stream_for_tqdm():
         # Your code here
         ...
     ```
+
+    :param progress_bar_file: The file the progress bar is displayed in. If
+        None, the first redirected stream.
+    :param status_lines: The number of lines of the status area of the
+        running experiments below the progress bar. If 0, no status area is
+        shown.
+    :return: The console, or None if neither stream is a tty.
     """
+    from .console import Console, redirect_to_console
+
     old_stdout = sys.stdout
     old_stderr = sys.stderr
-    if hasattr(sys.stdout, 'isatty') and sys.stdout.isatty():
-        sys.stdout = CliFile(sys.stdout)
-    if hasattr(sys.stdout, 'isatty') and sys.stderr.isatty():
-        sys.stderr = CliFile(sys.stderr)
-    try:
-        yield
-    finally:
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
+    streams = [stream for stream in (old_stdout, old_stderr)
+               if hasattr(stream, 'isatty') and stream.isatty()]
+    if not streams:
+        yield None
+        return
+    if progress_bar_file is None:
+        progress_bar_file = streams[0]
+    with Console(progress_bar_file, status_lines=status_lines) as console, \
+            redirect_to_console(console):
+        if old_stdout in streams:
+            sys.stdout = console.stream(old_stdout)
+        if old_stderr in streams:
+            sys.stderr = console.stream(old_stderr)
+        try:
+            yield console
+        finally:
+            sys.stdout = old_stdout
+            sys.stderr = old_stderr
@@ -0,0 +1,155 @@
+"""This module builds the command lines of the experiments.
+
+`config_arguments` turns a configuration into command line arguments.
+`CommandTemplate` goes one step further: the base command is split into an
+argument list once, and the arguments of each experiment are filled into it
+without a shell. A token of the base command can refer to a value of the
+configuration by its name in braces, for example, `--lr={lr}` or
+`out/{dataset}.txt`, and the token `{args}` marks where the other arguments
+go (at the end by default). Literal braces are written as `{{` and `}}`.
+"""
+
+import os
+import shlex
+import shutil
+import string
+
+# The token of a command template where the generated arguments go
+ARGUMENTS_TOKEN = '{args}'
+
+
+def option_name(name: str) -> str:
+    """Get the command line option of a name.
+
+    :param name: The name of the option.
+    :return: A short option if the name is a single character, otherwise a
+        long option.
+    """
+    if len(name) == 1:
+        return f'-{name}'
+    return f'--{name}'
+
+
+def config_arguments(config: dict) -> list[str]:
+    """Generate the command line arguments from the configuration.
+
+    1) If the value is a dictionary, options will be generated according
+       to the key-value pairs in the dictionary. If the key is a single
+       character, the option will be a short option. Otherwise, it will
+       be a long option.
+    2) If the value is not a dictionary, the value itself is an argument.
+       The order of the arguments will be the same as the order of the
+       key-value pairs in the dictionary.
+
+    :param config: The configuration of the experiment.
+    :return: The list of arguments.
+    """
+    arguments = []
+    for _, value in config.items():
+        if type(value) == dict:
+            for k, v in value.items():
+                arguments.append(option_name(k))
+                arguments.append(str(v))
+        else:
+            arguments.append(str(value))
+    return arguments
+
+
+class CommandTemplate:
+    """A command line compiled into an argument list once.
+
+    The names in the braces are looked up in the configuration: an option
+    in a dictionary value is found by its name, and any other value by its
+    key (for example, the name of a lazy axis). The values used in the
+    template are not generated again in place of `{args}`. A format spec is
+    allowed, for example, `{lr:.0e}`.
+
+    The executable is looked up in PATH once, so the children can be
+    started with `posix_spawn` (or `vfork`) without a shell.
+    """
+    def __init__(self, command: str | list[str]):
+        """Initialize the CommandTemplate object.
+
+        :param command: The command, either as a string to be split with
+            `shlex.split` or as a list of arguments.
+        """
+        if isinstance(command, str):
+            command = shlex.split(command)
+        if not command:
+            raise ValueError("The command is empty")
+        self.command = list(command)
+        # Each part is None for the generated arguments, a string for a
+        # literal argument, or a list of (literal, field, spec) tuples
+        self.parts = []
+        self.fields = set()
+        formatter = string.Formatter()
+        for token in self.command:
+            if token == ARGUMENTS_TOKEN:
+                if None in self.parts:
+                    raise ValueError(f"{ARGUMENTS_TOKEN} is given twice")
+                self.parts.append(None)
+                continue
+            pieces = []
+            for literal, field, spec, conversion in formatter.parse(token):
+                if field == '' or conversion is not None:
+                    raise ValueError(f"Invalid field in {token!r}")
+                pieces.append((literal, field, spec))
+                if field is not None:
+                    self.fields.add(field)
+            if all(field is None for _, field, _ in pieces):
+                self.parts.append(''.join(literal for literal, _, _ in pieces))
+            else:
+                self.parts.append(pieces)
+        if None not in self.parts:
+            self.parts.append(None)
+        if not isinstance(self.parts[0], str):
+            raise ValueError("The executable must not be a template")
+        self.executable = self.parts[0]
+        if os.sep not in self.executable:
+            self.executable = shutil.which(self.executable)
+
+    def render(self, config: dict, options: dict | None = None) -> list[str]:
+        """Build the arguments of an experiment.
+
+        :param config: The configuration of the experiment.
+        :param options: Additional options, for example, the budget of a
+            search. They are generated after the configuration.
+        :return: The list of arguments, starting from the command as given
+            (not the resolved executable).
+        """
+        values = {}
+        arguments = []
+        for key, value in config.items():
+            if type(value) == dict:
+                for k, v in value.items():
+                    values[k] = v
+                    if k not in self.fields:
+                        arguments.append(option_name(k))
+                        arguments.append(str(v))
+            else:
+                values[key] = value
+                if key not in self.fields:
+                    arguments.append(str(value))
+        for k, v in (options or {}).items():
+            values[k] = v
+            if k not in self.fields:
+                arguments.append(option_name(k))
+                arguments.append(str(v))
+
+        argv = []
+        for part in self.parts:
+            if part is None:
+                argv.extend(arguments)
+            elif isinstance(part, str):
+                argv.append(part)
+            else:
+                token = []
+                for literal, field, spec in part:
+                    token.append(literal)
+                    if field is not None:
+                        if field not in values:
+                            raise ValueError(f"No value for {{{field}}} in "
+                                             f"the configuration")
+                        token.append(format(values[field], spec))
+                argv.append(''.join(token))
+        return argv
@@ -1,8 +1,24 @@
 """
 This module provides a class that can be iterated to get all possible
 configurations.
+
+The batch API (`ConfigureIterable.index_batches`) needs the optional `numpy`
+package. It is imported on the first call, so the other users of this module
+do not pay for it.
 """
 
+import array
+import copy
+import itertools
+import sys
+import warnings
+from collections.abc import Callable
+
+from .axes import Axis, make_axis
+
+# The default number of configurations in a batch of `index_batches`
+DEFAULT_BATCH_SIZE = 65536
+
 class ExperimentorError(Exception):
     """The exception class for the Experimentor.
     """
@@ -11,59 +27,473 @@ class ExperimentorError(Exception):
 
 class ConfigureIterable:
     """An iterable class that generates all possible configurations.
+
+    Each entry in the configuration list is an axis (see
+    `experimentor.axes`): a dictionary whose key-value pairs are the
+    choices, a lazy axis expression, or an `experimentor.axes.Axis` object.
+    The configurations are the cartesian product of the axes, in the order
+    of an odometer: the last axis changes the fastest. Since every
+    configuration can be decoded directly from its mixed-radix index, the
+    object supports random access: `len()`, `space[i]` and slicing
+    (`space[start:stop:step]`, which returns a new `ConfigureIterable` over
+    the selected configurations). `shard` splits the configurations into
+    disjoint parts.
+
+    The first axis may have an unknown length (for example, a generator).
+    In this case, `len()` raises a TypeError, negative indices are not
+    supported, and the iteration stops when the first axis is exhausted.
+
+    Constraints prune the product while it is enumerated. A constraint is a
+    function that takes a partial configuration (the keys and values of the
+    axes chosen so far, in the order of the axes) and returns False if no
+    configuration starting with it is valid. If the constraint raises a
+    KeyError because a key is not chosen yet, it is treated as satisfied for
+    now. A KeyError on a complete configuration is reported with a warning
+    (once per constraint), since it usually means a misspelled key. For
+    example, `lambda c: c['batch'] * c['seq_len'] <= budget` is checked as
+    soon as both keys are chosen, and the whole subtree below an invalid
+    prefix is skipped. With constraints, the indices (and `len()`) refer to
+    the pruned configurations. Iterating walks the product lazily. `len()`
+    walks it once to count the configurations, and the indices of the
+    surviving configurations are only stored when random access (indexing,
+    negative slices or `index_batches`) needs them.
+
+    For compatibility, `next()` can also be called on the object itself: it
+    takes the configurations one by one from an iterator kept by the
+    object, independent of the iterators made by `iter()`.
+
+    The keys of the axes are checked for duplicates once on construction
+    (see `experimentor.axes.Axis.known_keys`). For large sweeps,
+    `index_batches` gives the configurations in blocks of axis indices, and
+    the titles and dictionaries are only built for the configurations that
+    are used.
     """
-    class ConfigurePair:
-        def __init__(self, key, value):
-            self.key = key
-            self.value = value
+    def __init__(self, config: list, start_index=0,
+                 stop_index: int | None = None,
+                 constraints: list[Callable[[dict], bool]] | None = None):
+        """Initialize the ConfigureIterable object.
 
-    def __init__(self, config: list):
+        :param config: A list of axes. See the documentation of the class.
+        :param start_index: The index of the first configuration. This is
+            useful to resume an interrupted sweep.
+        :param stop_index: The index after the last configuration. If None,
+            all the configurations after `start_index` are used.
+        :param constraints: The functions to prune the configurations. See
+            the documentation of the class.
+        """
         # type check
-        assert type(config) == list
-        for i in config:
-            assert type(i) == dict
-
-        self.length = len(config)
-        self.config = [[] for _ in range(self.length)]
-        self.num_index = [len(config[i]) for i in range(self.length)]
-        self.index = [0 for _ in range(self.length)]
-        self.finished = False
-        for i in range(self.length):
-            self.config[i] = [ConfigureIterable.ConfigurePair(key, value)
-                              for key, value in config[i].items()]
+        assert isinstance(config, (list, tuple))
+
+        self.axes = [make_axis(entry) for entry in config]
+        self.keys_checked = check_keys(self.axes)
+        self.length = len(self.axes)
+        self.num_index = [axis.length for axis in self.axes]
+        if any(num is None for num in self.num_index[1:]):
+            raise ValueError("Only the first axis can have an unknown length")
+        self.inner_size = 1
+        for num in self.num_index[1:]:
+            self.inner_size *= num
+
+        if self.length == 0 or self.inner_size == 0:
+            total = 0
+        elif self.num_index[0] is None:
+            total = None
+        else:
+            total = self.num_index[0] * self.inner_size
+        self.bounded = total is not None
+        self.constraints = list(constraints) if constraints else []
+        self.warned = set()
+        self.iterator = None
+        self.survivors = None
+        # The slice of the configurations, until the number of the pruned
+        # configurations is known
+        self._slice = None
+        self._indices = None
+        if self.constraints and self.bounded and total > 0:
+            self._slice = slice(start_index, stop_index)
+        elif self.bounded:
+            self._indices = range(total)[start_index:stop_index]
+        else:
+            if start_index < 0 or (stop_index is not None and stop_index < 0):
+                raise ValueError("Negative indices are not supported if the "
+                                 "number of configurations is unknown")
+            if stop_index is None:
+                stop_index = sys.maxsize
+            self._indices = range(start_index, stop_index)
+
+    @property
+    def indices(self) -> range:
+        """The indices of the selected configurations among all the
+        configurations that satisfy the constraints.
+
+        With constraints, the configurations are counted on the first use.
+        """
+        if self._indices is None:
+            total = sum(1 for _ in self.walk())
+            self._indices = range(total)[self._slice]
+        return self._indices
+
+    def walk_indices(self) -> range | None:
+        """Get the indices to select while walking the product, without
+        counting the configurations first if possible.
+
+        :return: The indices, or None if they are only known after counting.
+        """
+        if self._indices is not None:
+            return self._indices
+        start, stop, step = self._slice.start, self._slice.stop, \
+            self._slice.step
+        if any(i is not None and i < 0 for i in (start, stop, step)):
+            return None
+        return range(sys.maxsize)[self._slice]
 
     def __iter__(self):
-        return self
+        if self.constraints and self.survivors is None:
+            indices = self.walk_indices()
+            if indices is None:
+                indices = self.indices
+            for position, index in enumerate(self.walk()):
+                if position >= indices.stop:
+                    return
+                if position in indices:
+                    yield self.decode(index)
+            return
+        if not self.constraints and self.indices.step == 1:
+            yield from self.odometer(self.indices.start, self.indices.stop)
+            return
+        for position in self.indices:
+            try:
+                item = self.decode(self.flat_index(position))
+            except IndexError:
+                if self.bounded:
+                    raise
+                return
+            yield item
 
     def __next__(self) -> tuple[str, dict]:
-        # exit if all configure are used
-        if self.finished:
-            raise StopIteration
-
-        conf = {}
-        title = ''
-        for i in range(self.length):
-            if i != 0:
-                title += '_'
-            title += str(self.config[i][self.index[i]].key)
-            sub_config = self.config[i][self.index[i]]
-            if sub_config.key in conf:
-                raise ValueError(f'Duplicated key: {sub_config.key}')
-            conf[sub_config.key] = sub_config.value
-        # move to next configure
-        self.increment()
-        return title, conf
+        if self.iterator is None:
+            self.iterator = iter(self)
+        return next(self.iterator)
 
-    def increment(self):
-        carry = True
-        for i in range(self.length - 1, -1, -1):
-            if carry:
-                self.index[i] += 1
-                carry = False
-            if self.index[i] >= self.num_index[i]:
-                self.index[i] = 0
-                carry = True
+    def odometer(self, start: int, stop: int):
+        """Enumerate the configurations in a range of the whole product.
+
+        The indices of the axes are incremented like an odometer, so only
+        the choices of the axes that change are looked up again.
+
+        :param start: The index of the first configuration.
+        :param stop: The index after the last configuration.
+        :return: A generator of the titles and the configurations.
+        """
+        if start >= stop or self.length == 0:
+            return
+        digits = self.unravel(start)
+        items = [None] * self.length
+        last = self.length - 1
+        changed = 0
+        for _ in range(start, stop):
+            try:
+                for i in range(changed, self.length):
+                    items[i] = self.axes[i].item(digits[i])
+            except IndexError:
+                if self.bounded:
+                    raise
+                return
+            if not self.keys_checked:
+                yield self.materialize(items)
+            else:
+                # Only the last axis changes in most steps, so the title and
+                # the configuration of the other axes are reused
+                if changed < last or last == 0:
+                    prefix_title, prefix_conf = self.materialize(items[:last])
+                    if last > 0:
+                        prefix_title += '_'
+                sub_title, key, value = items[last]
+                conf = prefix_conf.copy()
+                conf[key] = value
+                yield prefix_title + sub_title, conf
+            i = last
+            while i > 0 and digits[i] + 1 == self.num_index[i]:
+                digits[i] = 0
+                i -= 1
+            digits[i] += 1
+            changed = i
+
+    def index_batches(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Enumerate the configurations in batches of axis indices.
+
+        Each batch holds the indices of the configurations in the sweep and
+        a matrix with the index of the choice of every axis (one row per
+        configuration), computed with `numpy.unravel_index` for the whole
+        batch. The titles and the dictionaries are only built when a
+        configuration is taken from the batch, so the batches can be
+        filtered cheaply with NumPy first, for example,
+        `batch.select(batch.digits[:, 0] < 10)`.
+
+        :param batch_size: The maximum number of configurations in a batch.
+        :return: A generator of `IndexBatch` objects.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("index_batches needs the numpy package")
+        if not self.bounded:
+            raise ValueError("index_batches needs a known number of "
+                             "configurations")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        survivors = None
+        if self.constraints:
+            survivors = numpy.frombuffer(self.survivor_indices(),
+                                         dtype=numpy.int64)
+        for begin in range(0, len(self.indices), batch_size):
+            indices = self.indices[begin:begin + batch_size]
+            positions = numpy.arange(indices.start, indices.stop,
+                                     indices.step, dtype=numpy.int64)
+            flat = positions if survivors is None else survivors[positions]
+            if self.length == 0:
+                digits = numpy.empty((len(flat), 0), dtype=numpy.int64)
             else:
-                break
-        if carry:
-            self.finished = True
+                digits = numpy.stack(
+                    numpy.unravel_index(flat, self.num_index), axis=1)
+            yield IndexBatch(self, positions, digits)
+
+    def __len__(self):
+        if not self.bounded:
+            raise TypeError("The number of configurations is unknown")
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if not self.bounded and any(i is not None and i < 0 for i in
+                                        (item.start, item.stop, item.step)):
+                raise ValueError("Negative indices are not supported if the "
+                                 "number of configurations is unknown")
+            lazy = self.walk_indices()
+            if self._indices is None and lazy is not None and all(
+                    i is None or i >= 0
+                    for i in (item.start, item.stop, item.step)):
+                # Slice the slice without counting the configurations
+                indices = lazy[item]
+                view = self._view(None)
+                view._slice = slice(indices.start, indices.stop,
+                                    indices.step)
+                return view
+            return self._view(self.indices[item])
+        if not self.bounded and item < 0:
+            raise ValueError("Negative indices are not supported if the "
+                             "number of configurations is unknown")
+        return self.decode(self.flat_index(self.indices[item]))
+
+    def flat_index(self, position: int) -> int:
+        """Get the index in the whole product of a configuration.
+
+        :param position: The index of the configuration among the
+            configurations that satisfy the constraints.
+        :return: The mixed-radix index of the configuration.
+        """
+        if not self.constraints:
+            return position
+        if self.bounded:
+            return self.survivor_indices()[position]
+        for i, index in enumerate(self.walk()):
+            if i == position:
+                return index
+        raise IndexError("configuration index out of range")
+
+    def survivor_indices(self) -> array.array:
+        """Get the indices in the whole product of all the configurations
+        that satisfy the constraints, for random access.
+
+        The product is walked on the first call, and the indices are kept.
+
+        :return: The mixed-radix indices, 8 bytes each.
+        """
+        if self.survivors is None:
+            self.survivors = array.array('q', self.walk())
+            if self._indices is None:
+                self._indices = range(len(self.survivors))[self._slice]
+        return self.survivors
+
+    def check(self, conf: dict, complete=False) -> bool:
+        """Check whether a partial configuration satisfies the constraints.
+
+        :param conf: The partial configuration.
+        :param complete: Whether a choice is made on every axis. A constraint
+            that raises a KeyError then is reported with a warning.
+        :return: False if any constraint is violated.
+        """
+        for constraint in self.constraints:
+            try:
+                if not constraint(conf):
+                    return False
+            except KeyError as e:
+                if complete and constraint not in self.warned:
+                    self.warned.add(constraint)
+                    warnings.warn(f"Constraint {constraint!r} raised KeyError "
+                                  f"{e} on the complete configuration "
+                                  f"{conf}, so it is not checked",
+                                  stacklevel=2)
+        return True
+
+    def walk(self, depth=0, prefix=0, conf: dict | None = None):
+        """Enumerate the configurations that satisfy the constraints.
+
+        The product is walked depth-first, and the subtree below a partial
+        configuration that violates a constraint is skipped.
+
+        :param depth: The index of the axis to choose.
+        :param prefix: The mixed-radix index of the choices so far.
+        :param conf: The partial configuration so far.
+        :return: A generator of the mixed-radix indices of the
+            configurations.
+        """
+        if conf is None:
+            conf = {}
+        if self.length == 0:
+            return
+        axis = self.axes[depth]
+        num = self.num_index[depth]
+        digits = itertools.count() if num is None else range(num)
+        for digit in digits:
+            try:
+                _, key, value = axis.item(digit)
+            except IndexError:
+                if num is None:
+                    return
+                raise
+            if not self.keys_checked and key in conf:
+                raise ValueError(f'Duplicated key: {key}')
+            index = digit if depth == 0 else prefix * num + digit
+            conf[key] = value
+            if self.check(conf, depth == self.length - 1):
+                if depth == self.length - 1:
+                    yield index
+                else:
+                    yield from self.walk(depth + 1, index, conf)
+            del conf[key]
+
+    def _view(self, indices: range | None) -> 'ConfigureIterable':
+        # With None, the caller sets the slice to count lazily
+        view = copy.copy(self)
+        view._indices = indices
+        view._slice = None
+        view.iterator = None
+        return view
+
+    def shard(self, k: int, n: int) -> 'ConfigureIterable':
+        """Get the k-th of n disjoint shards of the configurations.
+
+        The configurations are dealt out in turn, so each shard gets a
+        similar mix of configurations.
+
+        :param k: The index of the shard, starting from 0.
+        :param n: The number of shards.
+        :return: The configurations of the shard.
+        """
+        if n < 1 or not 0 <= k < n:
+            raise ValueError(f"Invalid shard {k}/{n}")
+        return self[k::n]
+
+    def unravel(self, index: int) -> list[int]:
+        """Get the index of the choice of every axis.
+
+        :param index: The mixed-radix index of the configuration.
+        :return: The indices of the choices, one per axis.
+        """
+        digits = [0] * self.length
+        for i in range(self.length - 1, 0, -1):
+            index, digits[i] = divmod(index, self.num_index[i])
+        if self.length > 0:
+            digits[0] = index
+        return digits
+
+    def decode(self, index: int) -> tuple[str, dict]:
+        """Get the configuration with the given index in the whole product.
+
+        :param index: The mixed-radix index of the configuration.
+        :return: The title and the configuration.
+        """
+        return self.decode_digits(self.unravel(index))
+
+    def decode_digits(self, digits) -> tuple[str, dict]:
+        """Get the configuration with the given choice of every axis.
+
+        :param digits: The index of the choice of every axis, for example, a
+            row of `IndexBatch.digits`.
+        :return: The title and the configuration.
+        """
+        return self.materialize([axis.item(int(digit))
+                                 for axis, digit in zip(self.axes, digits)])
+
+    def materialize(self, items: list[tuple[str, object, object]]
+                    ) -> tuple[str, dict]:
+        """Build the title and the configuration from the chosen items.
+
+        :param items: The title, the key and the value chosen on every axis.
+        :return: The title and the configuration.
+        """
+        title = '_'.join([item[0] for item in items])
+        conf = {key: value for _, key, value in items}
+        if not self.keys_checked and len(conf) != len(items):
+            seen = set()
+            for _, key, _ in items:
+                if key in seen:
+                    raise ValueError(f'Duplicated key: {key}')
+                seen.add(key)
+        return title, conf
+
+
+class IndexBatch:
+    """A batch of configurations as the indices of their choices.
+
+    `positions` holds the index of each configuration in the sweep, and
+    row `i` of `digits` holds the index of the choice of every axis for the
+    `i`-th configuration. Both are NumPy arrays. Iterating over the batch
+    builds the titles and the configurations one at a time.
+    """
+    def __init__(self, space: ConfigureIterable, positions, digits):
+        self.space = space
+        self.positions = positions
+        self.digits = digits
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i: int) -> tuple[str, dict]:
+        return self.space.decode_digits(self.digits[i].tolist())
+
+    def __iter__(self):
+        decode_digits = self.space.decode_digits
+        for row in self.digits.tolist():
+            yield decode_digits(row)
+
+    def select(self, mask) -> 'IndexBatch':
+        """Select some configurations of the batch.
+
+        :param mask: A boolean array with an entry per configuration, or an
+            array of the indices of the configurations in the batch.
+        :return: The batch of the selected configurations.
+        """
+        return IndexBatch(self.space, self.positions[mask], self.digits[mask])
+
+
+def check_keys(axes: list[Axis]) -> bool:
+    """Check that no key can be chosen on two axes.
+
+    :param axes: The axes of the sweep.
+    :return: Whether the keys of all the axes are known, so no
+        configuration can have a duplicated key.
+    """
+    complete = True
+    seen = set()
+    for axis in axes:
+        keys = axis.known_keys()
+        if keys is None:
+            complete = False
+            continue
+        for key in keys:
+            if key in seen:
+                raise ValueError(f'Duplicated key: {key}')
+        seen.update(keys)
+    return complete
@@ -0,0 +1,287 @@
+"""This module multiplexes the output of the experiments on the terminal.
+
+While the progress bar is shown, the stdout and stderr are replaced by
+`ConsoleStream` objects (see `experimentor.cli.redirect_stream_for_tqdm`).
+Writing to them only appends to a buffer: the output is split into lines
+per experiment, and a complete line is queued with the title of the
+experiment that printed it as a prefix. A background thread of the
+`Console` writes the queued lines at most every `refresh_interval` seconds,
+grouped by experiment, in a single write per stream, and clears and redraws
+the progress bar once around it. So the cost of a `print` does not depend
+on the terminal, and the lines of the experiments running at the same time
+do not interleave.
+
+The experiment of a line is taken from the context: `experiment_output` sets
+it for the code that runs an experiment (the threads of the thread pool, and
+the tasks and the threads of `asyncio.to_thread` inherit it). The output of
+the child processes that inherit the file descriptors of the terminal does
+not go through Python, so it is not buffered.
+
+The console can also show a status area below the progress bar, with a line
+for every running experiment and how long it has been running.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+# The default number of seconds between two writes to the terminal
+DEFAULT_REFRESH_INTERVAL = 0.1
+
+# The default number of queued bytes above which a write waits for the
+# terminal, so the memory does not grow if the experiments print faster
+# than the terminal shows
+DEFAULT_MAX_BUFFER = 1024 * 1024
+
+# The title of the experiment running in the current context
+_current_title = contextvars.ContextVar('experimentor_console_title',
+                                       default=None)
+
+# The console the streams are redirected to, for `experiment_output`
+_active_console = None
+
+
+class Console:
+    """Buffer the output of the experiments and write it at a bounded rate.
+    """
+    def __init__(self, file, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 max_buffer=DEFAULT_MAX_BUFFER, status_lines=0):
+        """Initialize the Console object.
+
+        :param file: The file the progress bar is displayed in. The progress
+            bars on it are cleared while the output is written.
+        :param refresh_interval: The minimum number of seconds between two
+            writes to the terminal.
+        :param max_buffer: The number of queued bytes above which a write
+            flushes the queue itself.
+        :param status_lines: The number of lines of the status area below
+            the progress bar. If 0, no status area is shown.
+        """
+        if refresh_interval <= 0:
+            raise ValueError("refresh_interval must be positive")
+        self.file = file
+        self.refresh_interval = refresh_interval
+        self.max_buffer = max_buffer
+        self.status_lines = status_lines
+        self._lock = threading.Lock()
+        # Held while writing to the terminal, so the lines keep their order
+        self._flush_lock = threading.Lock()
+        # The queued (stream, title, line) tuples and their size
+        self._queue = []
+        self._queue_size = 0
+        # The incomplete last line of every (stream, title)
+        self._partial = {}
+        # The start time of the running experiments, by title
+        self._running = {}
+        self._status_bars = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Start writing the output in the background.
+        """
+        self._thread = threading.Thread(target=self._refresh_loop,
+                                        name='experimentor-console',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Write all the output left, including the incomplete lines, and
+        remove the status area.
+        """
+        if self.closed:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self.closed = True
+            for (stream, title), text in self._partial.items():
+                self._queue.append((stream, title, text + '\n'))
+            self._partial = {}
+        self.flush()
+        with self._flush_lock:
+            for bar in self._status_bars:
+                bar.close()
+            self._status_bars = []
+
+    def stream(self, file) -> 'ConsoleStream':
+        """Make a stream that writes to `file` through the console.
+
+        :param file: The file to write the output to, for example,
+            `sys.stdout`.
+        :return: The stream.
+        """
+        return ConsoleStream(self, file)
+
+    def write(self, stream: 'ConsoleStream', data: str):
+        """Queue the output of the current experiment.
+
+        :param stream: The stream written to.
+        :param data: The text.
+        """
+        title = _current_title.get()
+        with self._lock:
+            if self.closed:
+                # The streams are restored, but another thread may still
+                # hold one of them
+                stream.file.write(data)
+                return
+            key = stream, title
+            partial = self._partial.pop(key, '')
+            lines = (partial + data).split('\n')
+            if lines[-1]:
+                self._partial[key] = lines[-1]
+            for line in lines[:-1]:
+                self._queue.append((stream, title, line + '\n'))
+                self._queue_size += len(line) + 1
+            full = self._queue_size > self.max_buffer
+        if full:
+            self.flush()
+
+    def experiment_started(self, title: str):
+        with self._lock:
+            self._running[title] = time.monotonic()
+
+    def experiment_finished(self, title: str):
+        """Queue the incomplete lines of an experiment and remove it from
+        the status area.
+
+        :param title: The title of the experiment.
+        """
+        with self._lock:
+            self._running.pop(title, None)
+            for key in [key for key in self._partial if key[1] == title]:
+                self._queue.append((key[0], title,
+                                    self._partial.pop(key) + '\n'))
+
+    def flush(self):
+        """Write the queued lines to the terminal now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                queue = self._queue
+                self._queue = []
+                self._queue_size = 0
+            if queue:
+                self._write(queue)
+            if self.status_lines and not self.closed:
+                self._update_status()
+
+    def _write(self, queue: list):
+        import tqdm
+
+        # The lines of an experiment are kept together, in the order the
+        # experiments first printed
+        groups = {}
+        for stream, title, line in queue:
+            groups.setdefault((stream, title), []).append(line)
+        texts = {}
+        for (stream, title), lines in groups.items():
+            prefix = '' if title is None else f'[{title}] '
+            texts.setdefault(stream, []).extend(prefix + line
+                                                for line in lines)
+        with tqdm.tqdm.external_write_mode(file=self.file):
+            for stream, lines in texts.items():
+                stream.file.write(''.join(lines))
+                stream.file.flush()
+
+    def _update_status(self):
+        import tqdm
+
+        with self._lock:
+            running = sorted(self._running.items(), key=lambda item: item[1])
+        now = time.monotonic()
+        lines = [f'{title} ({now - start:.0f}s)' for title, start in running]
+        if len(lines) > self.status_lines:
+            hidden = len(lines) - self.status_lines + 1
+            lines = lines[:self.status_lines - 1] + [f'... {hidden} more']
+        while len(self._status_bars) < len(lines):
+            self._status_bars.append(tqdm.tqdm(
+                total=0, position=len(self._status_bars) + 1, leave=False,
+                file=self.file, dynamic_ncols=True, bar_format='{desc}'))
+        for i, bar in enumerate(self._status_bars):
+            bar.set_description_str(lines[i] if i < len(lines) else '',
+                                    refresh=False)
+            bar.refresh()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.flush()
+
+
+class ConsoleStream:
+    """A file object that writes through a `Console`.
+
+    `flush` does nothing: the output is written by the console at its own
+    rate, so a program that flushes after every line does not make the
+    progress bar redraw.
+    """
+    def __init__(self, console: Console, file):
+        self.console = console
+        self.file = file
+
+    def write(self, data: str) -> int:
+        if data:
+            self.console.write(self, data)
+        return len(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return self.file.isatty()
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    @property
+    def encoding(self):
+        return self.file.encoding
+
+
+@contextlib.contextmanager
+def redirect_to_console(console: Console):
+    """Make `experiment_output` report to `console` while in the context.
+
+    :param console: The console.
+    """
+    global _active_console
+    previous = _active_console
+    _active_console = console
+    try:
+        yield console
+    finally:
+        _active_console = previous
+
+
+@contextlib.contextmanager
+def experiment_output(title: str):
+    """Mark the output printed in the context as the output of an
+    experiment.
+
+    :param title: The title of the experiment.
+    """
+    console = _active_console
+    token = _current_title.set(title)
+    if console is not None:
+        console.experiment_started(title)
+    try:
+        yield
+    finally:
+        _current_title.reset(token)
+        if console is not None:
+            console.experiment_finished(title)
@@ -1,2 +1,11 @@
 # Number of trials to run by default
 DEFAULT_MAX_TRIALS = 3
+
+# Number of experiments to run at the same time with asyncio by default
+DEFAULT_MAX_CONCURRENCY = 64
+
+# Port of the coordinator of a distributed sweep by default
+DEFAULT_PORT = 5975
+
+# Maximum total size of the result cache in bytes by default
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
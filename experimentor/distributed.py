@@ -0,0 +1,419 @@
+"""This module runs a sweep on several machines over TCP.
+
+The `Coordinator` owns the configurations and hands them out to the workers
+one at a time, so faster workers simply get more configurations. The
+configurations are taken from an iterator when they are handed out, so the
+sweep may be unbounded (for example, with an `IterableAxis`). Workers
+(see `run_worker`) run the configurations through the usual runner and
+track log, and report the result, the error messages and the elapsed time
+back. If a worker disconnects, or stops sending heartbeats (for example,
+because it is frozen or the network is partitioned while its connection
+stays open), the configurations it was running are handed out again.
+
+The protocol is one JSON object per line. A worker sends
+`{"type": "request"}` to ask for work, and the coordinator answers with one
+of the following messages:
+
+- `{"type": "task", "index": ..., "title": ..., "config": ...,
+  "heartbeat": ...}`: run the configuration, sending `{"type": "heartbeat",
+  "index": ...}` every `heartbeat` seconds while it runs, then send
+  `{"type": "result", "index": ..., "successful": ..., "elapsed": ...,
+  "errors": [...]}` with the error messages of the failed trials.
+- `{"type": "wait", "delay": ...}`: nothing to run now, but some
+  configurations are still running and may be handed out again. Ask again
+  after `delay` seconds.
+- `{"type": "done"}`: the sweep is finished.
+
+The configurations are sent as JSON, so their values must be
+JSON-serializable. There is no authentication: the workers run whatever the
+coordinator sends, so only listen on a trusted network.
+"""
+
+import collections
+import json
+import socket
+import socketserver
+import threading
+import time
+
+from .configure_production import ConfigureIterable
+from .const import DEFAULT_MAX_TRIALS, DEFAULT_PORT
+from .experiment_runner import BaseExperimentRunner
+from .experimentor import Experimentor, configure_iterable, progress_bar
+from .ledger import RunLedger
+from .track_log import BaseTrackLog, TrackLog
+
+# Seconds for a worker to wait before asking for work again
+WAIT_DELAY = 1.0
+
+# Seconds without a heartbeat after which a configuration is handed out again
+# by default
+DEFAULT_HEARTBEAT_TIMEOUT = 60.0
+
+
+class WorkerStats:
+    """The statistics of a worker.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.connected = True
+        self.succeeded = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+
+class Coordinator:
+    """Hand out the configurations to the workers and collect the results.
+    """
+    def __init__(self, config: list | ConfigureIterable,
+                 host='127.0.0.1', port=DEFAULT_PORT,
+                 heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT):
+        """Initialize the Coordinator object.
+
+        :param config: A list of dictionaries, or a `ConfigureIterable`
+            object.
+        :param host: The address to listen on.
+        :param port: The port to listen on. If 0, a free port is chosen (see
+            the `address` attribute after `start`).
+        :param heartbeat_timeout: The seconds without a heartbeat after which
+            a configuration is handed out again. The workers send a
+            heartbeat every third of it.
+        """
+        if heartbeat_timeout <= 0:
+            raise ValueError("heartbeat_timeout must be positive")
+        self.configs = configure_iterable(config)
+        self.total = len(self.configs) if self.configs.bounded else None
+        self.iterator = iter(self.configs)
+        self.exhausted = False
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.address = None
+        self.next_index = 0
+        # The (index, title, config) of the configurations to hand out again
+        self.requeued = collections.deque()
+        # The (worker, title, config) of the running configurations by index
+        self.running = {}
+        # The time of the last heartbeat of the running configurations
+        self.heartbeats = {}
+        self.finished = 0
+        self.failures = {}
+        self.workers = {}
+        self.server = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def start(self):
+        """Start listening in a background thread.
+        """
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.handle_connection(self.connection, self.rfile,
+                                              self.wfile)
+
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port),
+                                                      Handler,
+                                                      bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.address = self.server.server_address
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop listening.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def serve(self) -> dict:
+        """Run the whole sweep and show the progress.
+
+        :return: The failed configurations. The key is the index of the
+            configuration, and the value is the title and the error messages
+            of its trials.
+        """
+        self.start()
+        print(f"Listening on {self.address[0]}:{self.address[1]}")
+        try:
+            with progress_bar(self.total) as pbar:
+                with self._changed:
+                    while not self.is_done():
+                        self._changed.wait(1.0)
+                        self.requeue_stalled()
+                        pbar.n = self.finished
+                        pbar.set_postfix(
+                            workers=sum(w.connected
+                                        for w in self.workers.values()),
+                            failed=len(self.failures), refresh=False)
+                        pbar.refresh()
+                    # Let the connected workers know that the sweep is done
+                    self._changed.wait_for(
+                        lambda: not any(w.connected
+                                        for w in self.workers.values()),
+                        timeout=WAIT_DELAY * 5)
+        finally:
+            self.stop()
+        self.print_summary()
+        return self.failures
+
+    def is_done(self) -> bool:
+        if self.total is not None:
+            return self.finished == self.total
+        return self.exhausted and not self.running and not self.requeued
+
+    def print_summary(self):
+        """Print the statistics of the workers and the failed configurations.
+        """
+        for worker in self.workers.values():
+            total = worker.succeeded + worker.failed
+            average = worker.elapsed / total if total > 0 else 0.0
+            print(f"{worker.name}: {worker.succeeded} succeeded, "
+                  f"{worker.failed} failed, {average:.2f}s on average")
+        for title, errors in self.failures.values():
+            print(f"Failed: {title}")
+            for error in errors:
+                print(f"  {error}")
+
+    def next_task(self, worker: str) -> dict:
+        """Get the next message for a worker asking for work.
+
+        :param worker: The name of the worker.
+        :return: The message to send.
+        """
+        with self._changed:
+            if self.requeued:
+                index, title, config = self.requeued.popleft()
+            else:
+                try:
+                    if self.exhausted:
+                        raise StopIteration
+                    title, config = next(self.iterator)
+                except StopIteration:
+                    if not self.exhausted:
+                        self.exhausted = True
+                        self._changed.notify_all()
+                    if self.running:
+                        return {'type': 'wait', 'delay': WAIT_DELAY}
+                    return {'type': 'done'}
+                index = self.next_index
+                self.next_index += 1
+            self.running[index] = (worker, title, config)
+            self.heartbeats[index] = time.monotonic()
+        return {'type': 'task', 'index': index, 'title': title,
+                'config': config, 'heartbeat': self.heartbeat_timeout / 3}
+
+    def heartbeat(self, worker: str, index: int):
+        """Record a heartbeat of a running configuration.
+
+        :param worker: The name of the worker.
+        :param index: The index of the configuration.
+        """
+        with self._lock:
+            running = self.running.get(index)
+            if running is not None and running[0] == worker:
+                self.heartbeats[index] = time.monotonic()
+
+    def requeue_stalled(self):
+        """Hand out the configurations without a recent heartbeat again.
+
+        Must be called with the lock held.
+        """
+        now = time.monotonic()
+        for index, last in list(self.heartbeats.items()):
+            if now - last > self.heartbeat_timeout:
+                worker, title, config = self.running.pop(index)
+                del self.heartbeats[index]
+                self.requeued.append((index, title, config))
+                print(f"No heartbeat from {worker} for "
+                      f"{self.heartbeat_timeout:g}s, handing out {title} "
+                      f"again")
+
+    def report(self, worker: str, index: int, successful: bool,
+               elapsed: float, errors: list[str]):
+        """Record the result of a configuration.
+
+        :param worker: The name of the worker.
+        :param index: The index of the configuration.
+        :param successful: Whether the configuration succeeded.
+        :param elapsed: The time in seconds to run the configuration.
+        :param errors: The error messages of the failed trials.
+        """
+        with self._changed:
+            running = self.running.get(index)
+            if running is None or running[0] != worker:
+                return
+            del self.running[index]
+            del self.heartbeats[index]
+            stats = self.workers[worker]
+            stats.elapsed += elapsed
+            if successful:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+                self.failures[index] = (running[1], errors)
+            self.finished += 1
+            self._changed.notify_all()
+
+    def disconnect(self, worker: str):
+        """Hand out the configurations of a disconnected worker again.
+
+        :param worker: The name of the worker.
+        """
+        with self._changed:
+            self.workers[worker].connected = False
+            for index, (name, title, config) in list(self.running.items()):
+                if name == worker:
+                    del self.running[index]
+                    del self.heartbeats[index]
+                    self.requeued.append((index, title, config))
+            self._changed.notify_all()
+
+    def handle_connection(self, connection: socket.socket, rfile, wfile):
+        """Serve a worker until it disconnects.
+
+        :param connection: The socket of the worker.
+        :param rfile: The file to read the messages from.
+        :param wfile: The file to write the messages to.
+        """
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        host, port = connection.getpeername()[:2]
+        worker = f'{host}:{port}'
+        with self._changed:
+            self.workers[worker] = WorkerStats(worker)
+            self._changed.notify_all()
+        try:
+            for line in rfile:
+                message = json.loads(line)
+                if message['type'] == 'hello':
+                    with self._lock:
+                        self.workers[worker].name = message.get('name', worker)
+                elif message['type'] == 'request':
+                    send_message(wfile, self.next_task(worker))
+                elif message['type'] == 'heartbeat':
+                    self.heartbeat(worker, message['index'])
+                elif message['type'] == 'result':
+                    self.report(worker, message['index'],
+                                message['successful'], message['elapsed'],
+                                message['errors'])
+        except OSError as e:
+            print(f"Lost the connection to {worker}: {e}")
+        except (ValueError, KeyError) as e:
+            print(f"Invalid message from {worker}: {type(e).__name__}: {e}")
+        finally:
+            self.disconnect(worker)
+
+
+def send_message(wfile, message: dict):
+    wfile.write((json.dumps(message) + '\n').encode())
+    wfile.flush()
+
+
+def run_worker(host: str, port: int, runner: BaseExperimentRunner,
+               log_dir: str | None, max_trial=DEFAULT_MAX_TRIALS,
+               skip_if_exists=False, track_log: BaseTrackLog | None = None,
+               max_workers=1, ledger: RunLedger | bool = False):
+    """Run the configurations handed out by a coordinator until the sweep is
+    finished.
+
+    If `log_dir` is given, several workers can share the log directory, so
+    the default track log is created without the lock file. The coordinator
+    makes sure that each configuration is only run by one worker at a time.
+
+    :param host: The address of the coordinator.
+    :param port: The port of the coordinator.
+    :param runner: A class to run the experiment. Should be inherited from
+        `experimentor.BaseExperimentRunner`.
+    :param log_dir: The directory to store logs. If None, no log will be
+        stored.
+    :param max_trial: The maximum number of trials for each configuration.
+    :param skip_if_exists: Skip the configuration if it has succeeded in the
+        log directory.
+    :param track_log: Specify the track log object. If None and `log_dir` is
+        not None, a new track log object will be created.
+    :param max_workers: The number of configurations to run at the same
+        time. Each of them uses its own connection.
+    :param ledger: The ledger to record the cost of every trial in. If True
+        and `log_dir` is not None, the workers append to 'ledger.jsonl' in
+        `log_dir`. If False (the default), no ledger is kept.
+    """
+    if track_log is None and log_dir is not None:
+        track_log = TrackLog(log_dir, disable_lock=True)
+    experimentor = Experimentor([], runner, log_dir, track_log, ledger=ledger)
+    errors = []
+
+    def work():
+        try:
+            _worker_loop(host, port, experimentor, max_trial, skip_if_exists)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(max_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _worker_loop(host: str, port: int, experimentor: Experimentor,
+                 max_trial: int, skip_if_exists: bool):
+    with socket.create_connection((host, port)) as connection:
+        rfile = connection.makefile('rb')
+        wfile = connection.makefile('wb')
+        send_message(wfile, {'type': 'hello',
+                             'name': f'{socket.gethostname()}:'
+                                     f'{threading.get_native_id()}'})
+        while True:
+            send_message(wfile, {'type': 'request'})
+            line = rfile.readline()
+            if not line:
+                raise ConnectionError("The coordinator closed the connection")
+            message = json.loads(line)
+            if message['type'] == 'done':
+                return
+            if message['type'] == 'wait':
+                time.sleep(message['delay'])
+                continue
+            start = time.monotonic()
+            errors = []
+            stopped = threading.Event()
+            heartbeats = threading.Thread(
+                target=_send_heartbeats,
+                args=(wfile, message['index'], message['heartbeat'], stopped),
+                daemon=True)
+            heartbeats.start()
+            try:
+                successful = experimentor.run_with_trials(
+                    message['title'], message['config'], max_trial,
+                    skip_if_exists, errors)
+                if successful is None:
+                    # Run by another process sharing the log directory
+                    successful = True
+            except Exception as e:
+                successful = False
+                errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                stopped.set()
+                heartbeats.join()
+            send_message(wfile, {'type': 'result', 'index': message['index'],
+                                 'successful': successful,
+                                 'elapsed': time.monotonic() - start,
+                                 'errors': errors})
+
+
+def _send_heartbeats(wfile, index: int, interval: float,
+                     stopped: threading.Event):
+    # The result is only sent after this thread stops, so the messages do
+    # not interleave
+    while not stopped.wait(interval):
+        try:
+            send_message(wfile, {'type': 'heartbeat', 'index': index})
+        except OSError:
+            return
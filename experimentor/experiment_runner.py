@@ -1,4 +1,24 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import shlex
 import subprocess
+import sys
+import threading
+from collections.abc import Callable
+
+from .command import CommandTemplate, config_arguments
+from .ledger import record_child_usage, self_usage, wait_child
+from .limits import ExperimentLimits, watch
+from .log_capture import LogCapture, open_log
+from .result_cache import ResultCache
+from .scheduler import Resources
+
+# The maximum number of seconds between two checks of an asynchronous child
+# without a pidfd
+POLL_INTERVAL = 0.05
 
 
 class BaseExperimentRunner:
@@ -24,9 +44,43 @@ class BaseExperimentRunner:
     `experimentor.BaseTrackLog` and the third parameter will be passed from
     the `add_log_file` method of the track log object. See the documentation
     for `experimentor.BaseTrackLog` for more information.
+
+    The runner can also declare the resources needed by each experiment (see
+    `get_resources`). They are used when the experiments are scheduled with
+    an `experimentor.ResourceScheduler`.
+
+    To be used in a successive halving or Hyperband search (see
+    `experimentor.Experimentor.run_search`), `run_experiment` should also
+    accept a keyword argument `budget` (for example, the number of epochs)
+    and return a metric of the experiment.
     """
-    def __init__(self):
-        pass
+    def __init__(self, resources: Resources | Callable[[str, dict], Resources]
+                 | None = None):
+        """Initialize the runner.
+
+        :param resources: The resources needed by each experiment. It can be
+            a `Resources` object for all the experiments, or a function that
+            takes the title and the configuration of the experiment and
+            returns a `Resources` object. If None, each experiment needs one
+            core.
+        """
+        self.resources = resources
+
+    def get_resources(self, title: str, config: dict) -> Resources:
+        """Get the resources needed by the experiment.
+
+        You can override this method to declare the resources according to
+        the configuration, for example, the number of threads.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :return: The resources needed by the experiment.
+        """
+        if self.resources is None:
+            return Resources()
+        if callable(self.resources):
+            return self.resources(title, config)
+        return self.resources
 
     def run_experiment(self, title: str, config: dict, file: str | None):
         """Run the experiment with the given configuration.
@@ -38,16 +92,79 @@ class BaseExperimentRunner:
         :param config: The configuration of the experiment.
         :param file: The "file" to store the output. If None, there's nowhere
             to store the output.
+        :return: Anything. In a search, the metric of the experiment.
         """
         raise NotImplementedError
 
 
 class SimpleCommandRunner(BaseExperimentRunner):
-    def __init__(self, base_command: str):
-        super().__init__()
+    def __init__(self, base_command: str,
+                 resources: Resources | Callable[[str, dict], Resources]
+                 | None = None,
+                 budget_option: str | None = None,
+                 metric_pattern: str | None = None,
+                 cache: ResultCache | None = None, hash_executable=False,
+                 shell=True, capture: LogCapture | None = None,
+                 limits: ExperimentLimits
+                 | Callable[[str, dict], ExperimentLimits | None]
+                 | None = None):
+        """Initialize the SimpleCommandRunner object.
+
+        :param base_command: The command to run. The arguments generated from
+            the configuration are appended to it. If `shell` is False, it is
+            a `CommandTemplate`.
+        :param resources: The resources needed by each experiment. See
+            `BaseExperimentRunner`.
+        :param budget_option: The option to pass the budget of a search
+            with, for example, 'epochs' for '--epochs 3'.
+        :param metric_pattern: A regular expression to find the metric in
+            the log file. The first group of the last match is the metric.
+        :param cache: The cache of the outputs. If an experiment with the
+            same command line has succeeded before, its output is copied to
+            the log file instead of running it again. Only experiments with a
+            log file are cached.
+        :param hash_executable: Whether the hash of the executable is a part
+            of the key in the cache, so that the experiments are run again
+            after the executable changes.
+        :param shell: Whether to run the command with the shell. If False,
+            the command is split into arguments once and started directly,
+            so the values can contain spaces and quotes, and can be placed
+            anywhere in the command (see `experimentor.CommandTemplate`).
+        :param capture: How to capture the output into the log file, for
+            example, with the stderr or compressed. If None, only the stdout
+            is written to the log file.
+        :param limits: The timeouts and the resource limits of each
+            experiment. It can be an `ExperimentLimits` object for all the
+            experiments, or a function that takes the title and the
+            configuration of the experiment and returns an
+            `ExperimentLimits` object or None. An experiment that exceeds
+            them is killed with all the processes it started, and the trial
+            fails with an `ExperimentTimeoutError`.
+        """
+        super().__init__(resources)
         self.base_command = base_command
+        self.template = None if shell else CommandTemplate(base_command)
+        self.budget_option = budget_option
+        self.metric_pattern = (None if metric_pattern is None
+                               else re.compile(metric_pattern))
+        self.cache = cache
+        self.hash_executable = hash_executable
+        self.capture = capture
+        self.limits = limits
 
-    def run_experiment(self, title: str, config: dict, file: str | None):
+    def get_limits(self, title: str, config: dict) -> ExperimentLimits | None:
+        """Get the limits of the experiment.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :return: The limits, or None if there are none.
+        """
+        if callable(self.limits):
+            return self.limits(title, config)
+        return self.limits
+
+    def run_experiment(self, title: str, config: dict, file: str | None,
+                       budget=None):
         """Run the experiment with command line.
 
         The options will be generated according to the type of the value
@@ -60,25 +177,397 @@ class SimpleCommandRunner(BaseExperimentRunner):
            the value. The order of the values will be the same as the order of
            the key-value pairs in the dictionary.
 
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param file: The file to store the output. If None, the output will
+            be treated as a standard output.
+        :param budget: The budget of the experiment in a search. It is passed
+            with `budget_option`.
+        :return: If `metric_pattern` is given, the metric found in the log
+            file. Otherwise, None.
+        """
+        options = None
+        if budget is not None:
+            if self.budget_option is None:
+                raise ValueError("budget_option is needed to pass the budget")
+            options = {self.budget_option: budget}
+        if self.template is None:
+            arguments = config_arguments(config)
+            if options is not None:
+                arguments += config_arguments({'': options})
+            key_arguments = [self.base_command] + arguments
+            command = ' '.join(key_arguments)
+        else:
+            key_arguments = command = self.template.render(config, options)
+        key = None
+        if self.cache is not None and file is not None:
+            executable_hash = None
+            if self.hash_executable:
+                executable_hash = self.cache.executable_hash(self.base_command)
+            capture = None
+            files = [file]
+            if self.capture is not None:
+                capture = self.capture.settings()
+                files = self.capture.paths(file)
+            key = self.cache.key(key_arguments, executable_hash, capture)
+            if self.cache.get(key, files):
+                return self.find_metric(file)
+        limits = self.get_limits(title, config)
+        returncode = self.run_command(command, file, limits)
+        if returncode != 0:
+            if self.template is not None:
+                command = shlex.join(command)
+            raise ValueError(f"{command} returns non-zero value: {returncode}")
+        if key is not None:
+            self.cache.put(key, files)
+        return self.find_metric(file)
+
+    def run_command(self, command: str | list[str], file: str | None,
+                    limits: ExperimentLimits | None = None) -> int:
+        """Run a command and wait for it.
+
+        Without the shell, the executable resolved by the template is started
+        directly. The file descriptors are not closed explicitly (the ones
+        opened by Python are not inherited anyway), which lets `subprocess`
+        use `posix_spawn` or `vfork` instead of `fork`. A command with limits
+        is started in a new session, which rules out `posix_spawn`, but not
+        `vfork`.
+
+        :param command: The command string for the shell, or the list of
+            arguments.
+        :param file: The log file to write the output to. If None, the
+            output goes to the standard output.
+        :param limits: The limits of the command. With limits, the command
+            is started in its own process group. See `experimentor.limits`.
+        :return: The return code of the command.
+        """
+        if self.template is None:
+            kwargs = {'shell': True}
+        else:
+            kwargs = {'executable': self.template.executable,
+                      'close_fds': False}
+        if limits is not None:
+            command, kwargs = limits.popen_args(command, kwargs)
+        if file is None:
+            process = subprocess.Popen(command, **kwargs)
+            with watch(process, limits):
+                return wait_child(process)
+        if self.capture is not None:
+            return self.capture.run(command, file, limits, **kwargs)
+        with open(file, 'w') as f:
+            process = subprocess.Popen(command, stdout=f, **kwargs)
+            with watch(process, limits, [file]):
+                return wait_child(process)
+
+    def find_metric(self, file: str | None) -> float | None:
+        """Find the metric in the log file with `metric_pattern`.
+
+        :param file: The log file.
+        :return: The first group of the last match, or None if there's no
+            pattern, no log file or no match.
+        """
+        if self.metric_pattern is None or file is None:
+            return None
+        with open_log(file) as f:
+            matches = self.metric_pattern.findall(f.read())
+        if not matches:
+            return None
+        match = matches[-1]
+        return float(match[0] if isinstance(match, tuple) else match)
+
+
+class AsyncCommandRunner(BaseExperimentRunner):
+    """Run the experiment with command line on an asyncio event loop.
+
+    No shell is involved: the base command is compiled into a
+    `CommandTemplate` once, and every argument generated from the
+    configuration is passed as a single argument even if it contains spaces.
+    The stdout of the child is written to the log file directly, so the
+    event loop never copies the output. The child is reaped with
+    `experimentor.ledger.wait_child` once it has exited (see
+    `wait_child_async`), so its resource usage is recorded in the ledger.
+
+    Use it with `experimentor.run_experiments_async` to supervise many
+    experiments from a single thread. `max_concurrency` limits the number of
+    children started by this runner at the same time, which is useful when
+    the runner is shared by several sweeps. The synchronous `run_experiment`
+    is also available, so the runner works with `experimentor.run_experiments`
+    as well.
+    """
+    def __init__(self, base_command: str, max_concurrency: int | None = None,
+                 limits: ExperimentLimits
+                 | Callable[[str, dict], ExperimentLimits | None]
+                 | None = None):
+        """Initialize the AsyncCommandRunner object.
+
+        :param base_command: The command to run, as a `CommandTemplate`.
+        :param max_concurrency: The maximum number of children started by
+            this runner at the same time. If None, there's no limit.
+        :param limits: The timeouts and the resource limits of each
+            experiment, as in `SimpleCommandRunner`. The timeouts of each
+            child are checked by a watchdog thread.
+        """
+        super().__init__()
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.base_command = base_command
+        self.template = CommandTemplate(base_command)
+        self.max_concurrency = max_concurrency
+        self.limits = limits
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def get_limits(self, title: str, config: dict) -> ExperimentLimits | None:
+        """Get the limits of the experiment. See
+        `SimpleCommandRunner.get_limits`.
+        """
+        if callable(self.limits):
+            return self.limits(title, config)
+        return self.limits
+
+    def _get_semaphore(self) -> asyncio.Semaphore | None:
+        if self.max_concurrency is None:
+            return None
+        # A semaphore can only be used in one event loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def run_experiment_async(self, title: str, config: dict,
+                                   file: str | None):
+        """Run the experiment with command line without blocking the event
+        loop.
+
         :param title: The title of the experiment.
         :param config: The configuration of the experiment.
         :param file: The file to store the output. If None, the output will
             be treated as a standard output.
         """
-        command = f'{self.base_command}'
-        for _, value in config.items():
-            if type(value) == dict:
-                for k, v in value.items():
-                    if len(k) == 1:
-                        command += f' -{k} {v}'
-                    else:
-                        command += f' --{k} {v}'
-            else:
-                command += f' {value}'
+        limits = self.get_limits(title, config)
+        semaphore = self._get_semaphore()
+        if semaphore is None:
+            returncode = await self._run_command(config, file, limits)
+        else:
+            async with semaphore:
+                returncode = await self._run_command(config, file, limits)
+        if returncode != 0:
+            command = shlex.join(self.template.render(config))
+            raise ValueError(f"{command} returns non-zero value: {returncode}")
+
+    async def _run_command(self, config: dict, file: str | None,
+                           limits: ExperimentLimits | None) -> int:
+        args = self.template.render(config)
+        kwargs = {'executable': self.template.executable, 'close_fds': False}
+        if limits is not None:
+            args, kwargs = limits.popen_args(args, kwargs)
         if file is None:
-            result = subprocess.run(command, shell=True)
+            process = subprocess.Popen(args, **kwargs)
         else:
-            with open(file, 'w') as f:
-                result = subprocess.run(command, shell=True, stdout=f)
-        if result.returncode != 0:
-            raise ValueError(f"{command} returns non-zero value: {result.returncode}")
+            # Opening a file can block, for example, on a network file system
+            f = await asyncio.to_thread(open, file, 'w')
+            with f:
+                process = subprocess.Popen(args, stdout=f, **kwargs)
+        async with watch(process, limits,
+                         None if file is None else [file]):
+            try:
+                return await wait_child_async(process)
+            except asyncio.CancelledError:
+                # Do not leave the child running if the sweep is cancelled
+                if process.returncode is None:
+                    process.kill()
+                    await asyncio.to_thread(wait_child, process)
+                raise
+
+    def run_experiment(self, title: str, config: dict, file: str | None):
+        """Run the experiment in a new event loop.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param file: The file to store the output. If None, the output will
+            be treated as a standard output.
+        """
+        asyncio.run(self.run_experiment_async(title, config, file))
+
+
+async def wait_child_async(process: subprocess.Popen) -> int:
+    """Wait for a child process without blocking the event loop, then reap
+    it with `experimentor.ledger.wait_child`, so its resource usage is
+    reported.
+
+    On Linux, the event loop is woken up by a pidfd of the child when it
+    exits, so no thread is needed per child. Elsewhere, the child is polled
+    every `POLL_INTERVAL` seconds at most.
+
+    :param process: The child process.
+    :return: The return code, as in `subprocess.Popen.returncode`.
+    """
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        pidfd = None
+    if pidfd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+
+        def on_exit():
+            loop.remove_reader(pidfd)
+            exited.set_result(None)
+
+        loop.add_reader(pidfd, on_exit)
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+    else:
+        delay = 0.001
+        # WNOWAIT leaves the child to be reaped by wait_child
+        while not os.waitid(os.P_PID, process.pid,
+                            os.WEXITED | os.WNOHANG | os.WNOWAIT):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_INTERVAL)
+    return wait_child(process)
+
+
+class CallableRunner(BaseExperimentRunner):
+    """Run a Python function in a pool of long-lived worker processes.
+
+    The function is called as `function(title, config)` (with the `budget`
+    keyword argument in a search) in a worker process, and its return value
+    is returned from `run_experiment`. The workers are started once by a
+    forkserver (or spawned on the platforms without one), so the interpreter
+    startup and the heavy imports are paid once per worker instead of once
+    per experiment. While the function runs, the stdout of the worker
+    (including the output of C extensions and child processes) is
+    redirected to the log file.
+
+    The function, the configurations and the return values are sent between
+    the processes with pickle, so the function must be defined at the top
+    level of a module, and the main script must be guarded with
+    `if __name__ == '__main__':` as usual for `multiprocessing`. If a worker
+    dies, the pool is started again and the trial fails.
+    """
+    def __init__(self, function: Callable, max_workers: int | None = None,
+                 preload: list[str] | None = None,
+                 initializer: Callable | None = None, initargs=(),
+                 max_tasks_per_child: int | None = None,
+                 resources: Resources | Callable[[str, dict], Resources]
+                 | None = None, limits: ExperimentLimits | None = None):
+        """Initialize the CallableRunner object.
+
+        :param function: The function to run.
+        :param max_workers: The number of worker processes. If None, one
+            worker per core.
+        :param preload: The modules to import in the forkserver, so that the
+            workers are forked with them already imported. It only takes
+            effect if the forkserver of this process has not been started.
+        :param initializer: A function called in each worker when it starts.
+        :param initargs: The arguments of `initializer`.
+        :param max_tasks_per_child: The number of experiments a worker runs
+            before it is replaced by a new one, to bound the memory growth.
+            If None, the workers live as long as the pool.
+        :param resources: The resources needed by each experiment. See
+            `BaseExperimentRunner`.
+        :param limits: Not supported, and must be None. A worker runs many
+            experiments, so it cannot be killed or limited for one of them.
+            To limit the experiments, run them as commands with
+            `SimpleCommandRunner`.
+        """
+        if limits is not None:
+            raise ValueError("CallableRunner does not support limits; run "
+                             "the experiments with SimpleCommandRunner")
+        super().__init__(resources)
+        self.function = function
+        self.max_workers = max_workers
+        self.preload = preload
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    if self.preload:
+                        context.set_forkserver_preload(self.preload)
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers, context, self.initializer,
+                    self.initargs,
+                    max_tasks_per_child=self.max_tasks_per_child)
+            return self._executor
+
+    def run_experiment(self, title: str, config: dict, file: str | None,
+                       budget=None):
+        """Run the function in a worker process and wait for it.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param file: The file to store the output. If None, the output will
+            be treated as a standard output.
+        :param budget: The budget of the experiment in a search. If None, it
+            is not passed to the function.
+        :return: The return value of the function.
+        """
+        executor = self._get_executor()
+        try:
+            result, usage = executor.submit(_call_in_worker, self.function,
+                                            title, config, file,
+                                            budget).result()
+            record_child_usage(*usage)
+            return result
+        except concurrent.futures.process.BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def close(self):
+        """Stop the worker processes.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _call_in_worker(function: Callable, title: str, config: dict,
+                    file: str | None, budget):
+    # Return the result with the CPU time spent in the call and the peak RSS
+    # of the worker, for the ledger
+    user, sys_time, _ = self_usage()
+    result = _call_with_output(function, title, config, file, budget)
+    end_user, end_sys_time, max_rss = self_usage()
+    return result, (end_user - user, end_sys_time - sys_time, max_rss)
+
+
+def _call_with_output(function: Callable, title: str, config: dict,
+                      file: str | None, budget):
+    kwargs = {} if budget is None else {'budget': budget}
+    if file is None:
+        return function(title, config, **kwargs)
+    sys.stdout.flush()
+    saved_stdout = os.dup(1)
+    try:
+        with open(file, 'w') as f:
+            os.dup2(f.fileno(), 1)
+            try:
+                return function(title, config, **kwargs)
+            finally:
+                sys.stdout.flush()
+    finally:
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
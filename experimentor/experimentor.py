@@ -1,24 +1,66 @@
-import tqdm
+import asyncio
+import concurrent.futures
+import contextlib
+import os
 import sys
+import threading
+import time
 
 from .cli import tqdm_file, redirect_stream_for_tqdm
 from .configure_production import ConfigureIterable, ExperimentorError
-from .const import DEFAULT_MAX_TRIALS
+from .console import experiment_output
+from .const import DEFAULT_MAX_TRIALS, DEFAULT_MAX_CONCURRENCY
 from .experiment_runner import BaseExperimentRunner
+from .failure import FailedExperiment, FailureReport, RetryPolicy
+from .halving import SuccessiveHalving, SearchResult
+from .lease import LeaseHeldError
+from .ledger import LEDGER_FILE, RunLedger
+from .limits import terminate_all
+from .ordering import RuntimePredictor
+from .scheduler import ResourceScheduler
 from .track_log import BaseTrackLog, TrackLog
 
+# The number of seconds between two attempts to kill the running commands
+# after an interruption
+INTERRUPT_INTERVAL = 0.1
 
-def run_experiments(config: list, runner: BaseExperimentRunner,
-                    log_dir: str | None, max_trial=DEFAULT_MAX_TRIALS,
-                    skip_if_exists=False, track_log: BaseTrackLog | None = None):
+
+def run_experiments(config: list | ConfigureIterable,
+                    runner: BaseExperimentRunner, log_dir: str | None,
+                    max_trial=DEFAULT_MAX_TRIALS,
+                    skip_if_exists=False, track_log: BaseTrackLog | None = None,
+                    max_workers=1, scheduler: ResourceScheduler | None = None,
+                    continue_on_failure=False,
+                    retry_policy: RetryPolicy | None = None,
+                    ledger: RunLedger | bool = False,
+                    predictor: RuntimePredictor | None = None,
+                    show_workers=False) -> FailureReport | None:
     """Run experiments with the given configuration and function.
 
     The function will initialize an `Experimentor` object and run the experiments.
 
     You can specify the track log object. The object must have a method
-    called `add_log_file` to add a log file for the experiment.
+    called `add_log_file` to add a log file for the experiment. The methods
+    `experiment_started`, `experiment_finished` and `experiment_done` of
+    `BaseTrackLog` are called if the object has them.
+
+    If `max_workers` is greater than 1, up to `max_workers` configurations
+    will be run at the same time. If `scheduler` is given, the configurations
+    are packed according to the resources they need. See
+    `Experimentor.run_experiments` for more information.
+
+    If `continue_on_failure` is True, a configuration that fails all its
+    trials does not stop the sweep. It is retried at the end according to
+    `retry_policy`, and the failures are returned as a `FailureReport`.
 
-    :param config: A list of dictionaries.
+    If `predictor` is given, the configurations with the longest predicted
+    runtime are run first, and the progress bar is weighted by the
+    predictions.
+
+    If `show_workers` is True, the running configurations are listed below
+    the progress bar.
+
+    :param config: A list of dictionaries, or a `ConfigureIterable` object.
     :param runner: A class to run the experiment. Should be inherited from
         `experimentor.BaseExperimentRunner`.
     :param log_dir: The directory to store logs. If None, no log will be
@@ -28,10 +70,31 @@ def run_experiments(config: list, runner: BaseExperimentRunner,
     :param track_log: Specify the track log object. If None and `log_dir` is
         not None, a new track log object will be created. If None and `log_dir`
         is None, no track log will be created.
+    :param max_workers: The maximum number of configurations to run at the
+        same time.
+    :param scheduler: The scheduler to run the configurations according to
+        their resources. If None, only `max_workers` limits the number of
+        running configurations.
+    :param continue_on_failure: Whether to keep running the other
+        configurations when a configuration fails all its trials.
+    :param retry_policy: The delays between the trials and the deferred
+        retries of the failed configurations. If None, the trials are run
+        back to back and the failed configurations are retried once.
+    :param ledger: The ledger to record the cost of every trial in. If True
+        and `log_dir` is not None, the ledger is 'ledger.jsonl' in `log_dir`.
+        If False (the default), no ledger is kept.
+    :param predictor: The predictor of the runtime of the configurations to
+        run the longest ones first. If None, the configurations are run in
+        their order.
+    :param show_workers: Whether to show the running configurations below
+        the progress bar.
+    :return: The failure report if `continue_on_failure` is True.
     """
-    Experimentor(
-        config, runner, log_dir, track_log
-    ).run_experiments(max_trial, skip_if_exists)
+    return Experimentor(
+        config, runner, log_dir, track_log, max_workers, scheduler,
+        retry_policy, ledger, predictor, show_workers
+    ).run_experiments(max_trial, skip_if_exists,
+                      continue_on_failure=continue_on_failure)
 
 
 class Experimentor:
@@ -41,16 +104,54 @@ class Experimentor:
     configurations, a runner class (derived from
     `experimentor.BaseExperimentRunner`) to run the experiment, and
     optionally a log directory. The configuration is a list of dictionaries.
-    Each entry in the list means one parameter set.
+    Each entry in the list means one parameter set. You can also give a
+    `ConfigureIterable` object, for example, a slice or a shard of the
+    configurations.
 
     If you don't want to store logs, you can set the `log_dir` to None.
+
+    By default, the experiments are run one after another. Set `max_workers`
+    to run several configurations at the same time. In this case, the runner
+    and the track log object are shared by all the worker threads, so they
+    must be thread-safe. `SimpleCommandRunner` and `TrackLog` are.
+
+    Instead of a fixed number of workers, you can also give a
+    `ResourceScheduler`. The configurations are then started as long as the
+    resources they need (see `BaseExperimentRunner.get_resources`) fit into
+    the capacity of the machine.
+
+    The `RetryPolicy` sets the delay between two trials of a configuration,
+    and how the failed configurations are retried when the sweep continues
+    on failure.
+
+    With a `RunLedger` (or `ledger=True` for 'ledger.jsonl' in the log
+    directory), the wall time, the CPU time, the peak memory, the exit code
+    and the log size of every trial are appended to it.
+
+    With a `RuntimePredictor` (for example, from the ledger of a previous
+    run), `run_experiments` starts the configurations with the longest
+    predicted runtime first, so no long configuration is left running alone
+    at the end, and the progress bar shows the predicted runtime done
+    instead of the number of configurations.
+
+    While the progress bar is shown, the output printed by the experiments
+    is buffered and written above it at a bounded rate, one line at a time
+    with the title of the experiment as a prefix (see
+    `experimentor.console`). With `show_workers`, the running
+    configurations are also listed below the progress bar.
     """
-    def __init__(self, config: list, runner: BaseExperimentRunner,
-                 log_dir: str | None, track_log: BaseTrackLog | None = None):
+    def __init__(self, config: list | ConfigureIterable,
+                 runner: BaseExperimentRunner, log_dir: str | None,
+                 track_log: BaseTrackLog | None = None,
+                 max_workers=1, scheduler: ResourceScheduler | None = None,
+                 retry_policy: RetryPolicy | None = None,
+                 ledger: RunLedger | bool = False,
+                 predictor: RuntimePredictor | None = None,
+                 show_workers=False):
         """Init the Experimentor class with the given configuration
         and function.
 
-        :param config: A list of dictionaries.
+        :param config: A list of dictionaries, or a `ConfigureIterable` object.
         :param runner: A class to run the experiment. Should be inherited
             from BaseExperimentRunner.
         :param log_dir: The directory to store logs. If None, no log will
@@ -58,15 +159,50 @@ class Experimentor:
         :param track_log: Specify the track log object. If None and `log_dir`
             is not None, a new track log object will be created. If None and
             `log_dir` is None, no track log will be created.
+        :param max_workers: The default maximum number of configurations to
+            run at the same time.
+        :param scheduler: The default scheduler to run the configurations
+            according to their resources.
+        :param retry_policy: How to retry the failed trials and
+            configurations. If None, the trials are run back to back.
+        :param ledger: The ledger to record the cost of every trial in. If
+            True and `log_dir` is not None, the ledger is 'ledger.jsonl' in
+            `log_dir`. If False (the default), no ledger is kept.
+        :param predictor: The predictor of the runtime of the configurations.
+            If given, the longest configurations are run first. The
+            configurations must be bounded.
+        :param show_workers: Whether to show the running configurations
+            below the progress bar.
         """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
         self.config = config
         self.runner = runner
+        self.max_workers = max_workers
+        self.scheduler = scheduler
+        self.predictor = predictor
+        self.show_workers = show_workers
+        # Set while the running configurations are stopped after an
+        # interruption
+        self.interrupted = threading.Event()
+        self.retry_policy = retry_policy
+        if self.retry_policy is None:
+            self.retry_policy = RetryPolicy()
         self.track_log = track_log
         if self.track_log is None:
             if log_dir is not None:
                 self.track_log = TrackLog(log_dir)
+        self.ledger = None
+        if isinstance(ledger, RunLedger):
+            self.ledger = ledger
+        elif ledger and log_dir is not None:
+            os.makedirs(log_dir, exist_ok=True)
+            self.ledger = RunLedger(os.path.join(log_dir, LEDGER_FILE))
 
-    def run_experiments(self, max_trial=DEFAULT_MAX_TRIALS, skip_if_exists=False):
+    def run_experiments(self, max_trial=DEFAULT_MAX_TRIALS, skip_if_exists=False,
+                        max_workers: int | None = None,
+                        scheduler: ResourceScheduler | None = None,
+                        continue_on_failure=False) -> FailureReport | None:
         """Run experiments with the given configuration and function.
 
         This method will run the experiments with the given configuration and
@@ -76,52 +212,507 @@ class Experimentor:
         log file already exists. This is useful when you want to resume the
         experiment if that is interrupted or failed.
 
+        If `max_workers` is greater than 1, the configurations are run on a
+        thread pool with at most `max_workers` configurations running at the
+        same time. The trials of a configuration are still run one after
+        another in the same worker. If a configuration fails all its trials,
+        no new configuration will be started, and the method raises after the
+        running ones finish.
+
+        If `scheduler` is given, a configuration is only started when the
+        resources it needs are available. In this case, `max_workers` is an
+        additional limit if it is greater than 1.
+
+        If a predictor was given on initialization, all the configurations
+        are loaded and run from the longest predicted runtime, and the
+        progress bar advances by the predicted runtime of each configuration.
+
+        If `continue_on_failure` is True, a configuration that fails all its
+        trials is put in a deferred queue and the sweep goes on. After all
+        the configurations are run, the queue is retried
+        `retry_policy.deferred_rounds` times. The configurations that still
+        fail are printed and returned in a `FailureReport`. With a shared
+        `TrackLog`, the configurations run by other processes are neither
+        succeeded nor failed, and are counted separately in the report.
+
         :param max_trial: The maximum number of trials for each
             configuration.
         :param skip_if_exists: Whether to skip the configuration if the
             log file already exists.
+        :param max_workers: The maximum number of configurations to run at
+            the same time. If None, the value given on initialization is used.
+        :param scheduler: The scheduler to run the configurations according
+            to their resources. If None, the value given on initialization is
+            used.
+        :param continue_on_failure: Whether to keep running the other
+            configurations when a configuration fails all its trials.
+        :return: The failure report if `continue_on_failure` is True,
+            otherwise None.
         """
-        total = count(self.config)
-        disable_tqdm = False
-        progress_bar_file = tqdm_file()
-        if progress_bar_file is None:
-            progress_bar_file = sys.stdout
-            disable_tqdm = True
-        with tqdm.tqdm(total=total, leave=True, disable=disable_tqdm,
-                       file=progress_bar_file, dynamic_ncols=True) as pbar:
-            with redirect_stream_for_tqdm():
-                try:
-                    for title, conf in ConfigureIterable(self.config):
-                        successful = False
-                        for trial in range(max_trial):
-                            try:
-                                self.run_single_experiment(title, conf,
-                                                           skip_if_exists)
-                                successful = True
-                                break
-                            except KeyboardInterrupt:
-                                raise
-                            except Exception as e:
-                                print(e)
-                                print(f"Failed trial {trial + 1} for config "
-                                      f"{conf}")
-                        if not successful:
-                            raise ValueError("Failed to run the function")
-                        pbar.update()
-                except ExperimentorError as e:
-                    print(e)
-                    raise ValueError("Experimentor error")
-                except KeyboardInterrupt:
-                    print("Interrupted")
-                    raise
-
-    def run_single_experiment(self, title, config, skip_if_exists):
+        if max_workers is None:
+            max_workers = self.max_workers
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if scheduler is None:
+            scheduler = self.scheduler
+        if scheduler is not None and max_workers == 1:
+            max_workers = scheduler.capacity.cpus
+        configs = configure_iterable(self.config)
+        total = count(configs)
+        weights = None
+        if self.predictor is not None:
+            if not configs.bounded:
+                raise ValueError("Ordering by the predicted runtime needs a "
+                                 "bounded configuration")
+            configs, weights = self.predictor.order(configs)
+        with progress_bar(total, weights,
+                          self.status_lines(max_workers)) as pbar:
+            if not continue_on_failure:
+                self.run_configs(configs, max_trial, skip_if_exists,
+                                 max_workers, pbar, scheduler,
+                                 weights=weights)
+                return None
+
+            total = 0
+            failures = {}
+            claimed = set()
+
+            def record(title, conf, errors):
+                failures[title] = FailedExperiment(title, conf, errors)
+
+            def counted():
+                nonlocal total
+                for title, conf in configs:
+                    total += 1
+                    yield title, conf
+
+            self.run_configs(counted(), max_trial, skip_if_exists,
+                             max_workers, pbar, scheduler, record, weights,
+                             claimed.add)
+            for deferred_round in range(self.retry_policy.deferred_rounds):
+                if not failures:
+                    break
+                deferred = failures
+                failures = {}
+
+                def record_again(title, conf, errors):
+                    deferred[title].errors.extend(errors)
+                    failures[title] = deferred[title]
+
+                print(f"Retrying {len(deferred)} failed configurations "
+                      f"(round {deferred_round + 1})")
+                time.sleep(self.retry_policy.deferred_delay)
+                if pbar.total is not None:
+                    pbar.total += sum(progress_weight(weights, title)
+                                      for title in deferred)
+                    pbar.refresh()
+                self.run_configs([(failure.title, failure.config)
+                                  for failure in deferred.values()],
+                                 max_trial, skip_if_exists, max_workers, pbar,
+                                 scheduler, record_again, weights,
+                                 claimed.add)
+            report = FailureReport(total, list(failures.values()),
+                                   len(claimed))
+            if failures:
+                print(report.summary())
+            return report
+
+    async def run_experiments_async(self, max_trial=DEFAULT_MAX_TRIALS,
+                                    skip_if_exists=False,
+                                    max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """Run experiments concurrently on the running event loop.
+
+        This is the asyncio counterpart of `run_experiments`. Each
+        configuration is run as a task. If the runner has a coroutine method
+        called `run_experiment_async` (like `AsyncCommandRunner`), it is
+        awaited directly, so a single thread can supervise a large number of
+        experiments. Otherwise, `run_experiment` is run in a thread with
+        `asyncio.to_thread`. The track log and the ledger are always called
+        in threads, so their file writes do not block the event loop.
+
+        At most `max_concurrency` configurations are running at the same
+        time. If a configuration fails all its trials, the running
+        configurations are cancelled and a ValueError is raised.
+
+        :param max_trial: The maximum number of trials for each
+            configuration.
+        :param skip_if_exists: Whether to skip the configuration if the
+            log file already exists.
+        :param max_concurrency: The maximum number of configurations to run
+            at the same time.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        submitted = {}
+
+        def collect(tasks):
+            for task in tasks:
+                title, conf, errors = submitted.pop(task)
+                self.collect_result(title, conf, task.result(), errors)
+                pbar.update()
+
+        configs = configure_iterable(self.config)
+        with progress_bar(count(configs),
+                          status_lines=self.status_lines(max_concurrency)
+                          ) as pbar:
+            pending = set()
+            try:
+                for title, conf in configs:
+                    if len(pending) >= max_concurrency:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED)
+                        collect(done)
+                    errors = []
+                    task = asyncio.create_task(self.run_with_trials_async(
+                        title, conf, max_trial, skip_if_exists, errors))
+                    submitted[task] = (title, conf, errors)
+                    pending.add(task)
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    collect(done)
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def status_lines(self, max_workers: int) -> int:
+        """Get the number of lines of the status area of the running
+        configurations.
+
+        :param max_workers: The maximum number of configurations running at
+            the same time.
+        :return: The number of lines, 0 if the status area is not shown.
+        """
+        return max_workers if self.show_workers else 0
+
+    def run_configs(self, configs, max_trial, skip_if_exists, max_workers,
+                    pbar, scheduler: ResourceScheduler | None = None,
+                    on_failure=None, weights: dict | None = None,
+                    on_claimed=None):
+        """Run the configurations one after another, or on a thread pool if
+        `max_workers` is greater than 1 or `scheduler` is given.
+
+        :param configs: An iterable of (title, config) pairs.
+        :param max_trial: The maximum number of trials for each
+            configuration.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param max_workers: The maximum number of configurations to run at
+            the same time.
+        :param pbar: The progress bar to update.
+        :param scheduler: The scheduler to acquire the resources from.
+        :param on_failure: A function called with the title, the
+            configuration and the error messages when a configuration fails
+            all its trials. If None, a ValueError is raised instead.
+        :param weights: The amount to advance the progress bar by for each
+            title. If None, it advances by 1 for every configuration.
+        :param on_claimed: A function called with the title of a
+            configuration that is run by another process.
+        """
+        if scheduler is not None or max_workers > 1:
+            self.run_parallel(configs, max_trial, skip_if_exists, max_workers,
+                              pbar, scheduler, on_failure, weights, on_claimed)
+            return
+        for title, conf in configs:
+            errors = []
+            result = self.run_with_trials(title, conf, max_trial,
+                                          skip_if_exists, errors)
+            self.collect_result(title, conf, result, errors, on_failure,
+                                on_claimed)
+            pbar.update(progress_weight(weights, title))
+
+    def run_parallel(self, configs, max_trial, skip_if_exists, max_workers,
+                     pbar, scheduler: ResourceScheduler | None = None,
+                     on_failure=None, weights: dict | None = None,
+                     on_claimed=None):
+        """Run the configurations on a thread pool.
+
+        At most `max_workers` configurations are submitted to the pool at the
+        same time, so the configurations are consumed lazily from `configs`.
+        If `scheduler` is given, a configuration is submitted only after the
+        resources it needs are acquired, and the resources are released when
+        it finishes.
+
+        :param configs: An iterable of (title, config) pairs.
+        :param max_trial: The maximum number of trials for each
+            configuration.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param max_workers: The maximum number of configurations to run at
+            the same time.
+        :param pbar: The progress bar to update.
+        :param scheduler: The scheduler to acquire the resources from.
+        :param on_failure: A function called with the title, the
+            configuration and the error messages when a configuration fails
+            all its trials. If None, a ValueError is raised instead.
+        :param weights: The amount to advance the progress bar by for each
+            title. If None, it advances by 1 for every configuration.
+        :param on_claimed: A function called with the title of a
+            configuration that is run by another process.
+        """
+        submitted = {}
+
+        def collect(futures):
+            for future in futures:
+                title, conf, errors = submitted.pop(future)
+                self.collect_result(title, conf, future.result(), errors,
+                                    on_failure, on_claimed)
+                pbar.update(progress_weight(weights, title))
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            pending = set()
+            for title, conf in configs:
+                resources = None
+                if scheduler is not None:
+                    resources = self.runner.get_resources(title, conf)
+                while (len(pending) >= max_workers or (
+                        resources is not None
+                        and not scheduler.try_acquire(resources))):
+                    if not pending:
+                        # The resources are held by someone else
+                        scheduler.acquire(resources)
+                        break
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(done)
+                errors = []
+                future = executor.submit(self.run_scheduled, title, conf,
+                                         max_trial, skip_if_exists, scheduler,
+                                         resources, errors)
+                submitted[future] = (title, conf, errors)
+                pending.add(future)
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+        except KeyboardInterrupt:
+            self.interrupt(submitted)
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.interrupted.clear()
+
+    @staticmethod
+    def collect_result(title, config, result: bool | None, errors: list,
+                       on_failure=None, on_claimed=None):
+        """Handle the result of `run_with_trials`.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param result: The result of `run_with_trials`.
+        :param errors: The error messages of the failed trials.
+        :param on_failure: A function called with the title, the
+            configuration and the error messages if all the trials failed.
+            If None, a ValueError is raised instead.
+        :param on_claimed: A function called with the title if the
+            configuration is run by another process.
+        """
+        if result is None:
+            if on_claimed is not None:
+                on_claimed(title)
+        elif not result:
+            if on_failure is None:
+                raise ValueError("Failed to run the function")
+            on_failure(title, config, errors)
+
+    def interrupt(self, futures):
+        """Stop the configurations running on a thread pool after the
+        main thread is interrupted.
+
+        The commands with limits run in their own process groups, so they do
+        not get the Ctrl-C of the terminal: they are killed until all the
+        workers have noticed the interruption, and no new trial is started.
+
+        :param futures: The futures of the running configurations.
+        """
+        self.interrupted.set()
+        pending = set(futures)
+        while pending:
+            terminate_all()
+            _, pending = concurrent.futures.wait(pending,
+                                                 timeout=INTERRUPT_INTERVAL)
+
+    def run_scheduled(self, title, config, max_trial, skip_if_exists,
+                      scheduler, resources, errors=None) -> bool | None:
+        """Run a single configuration and release its resources afterwards.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param max_trial: The maximum number of trials.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param scheduler: The scheduler the resources are acquired from. If
+            None, nothing is released.
+        :param resources: The resources acquired for the configuration.
+        :param errors: A list to append the error messages of the failed
+            trials to.
+        :return: The result of `run_with_trials`.
+        """
+        try:
+            return self.run_with_trials(title, config, max_trial,
+                                        skip_if_exists, errors)
+        finally:
+            if scheduler is not None:
+                scheduler.release(resources)
+
+    def run_with_trials(self, title, config, max_trial, skip_if_exists,
+                        errors: list | None = None) -> bool | None:
+        """Run a single configuration with at most `max_trial` trials.
+
+        Before each retry, wait for the delay given by the retry policy.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param max_trial: The maximum number of trials.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param errors: A list to append the error messages of the failed
+            trials to.
+        :return: Whether any of the trials succeeded (or the configuration
+            was skipped because it has succeeded before). None if the
+            configuration is run by another process (see `LeaseHeldError`).
+        """
+        for trial in range(max_trial):
+            if trial > 0:
+                time.sleep(self.retry_policy.retry_delay(trial))
+            if self.interrupted.is_set():
+                raise KeyboardInterrupt
+            try:
+                self.run_single_experiment(title, config, skip_if_exists, trial)
+                self.experiment_done(title, True)
+                return True
+            except LeaseHeldError:
+                return None
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print(e)
+                print(f"Failed trial {trial + 1} for config {config}")
+                if errors is not None:
+                    errors.append(f'{type(e).__name__}: {e}')
+        self.experiment_done(title, False)
+        return False
+
+    async def run_with_trials_async(self, title, config, max_trial,
+                                    skip_if_exists,
+                                    errors: list | None = None
+                                    ) -> bool | None:
+        """Run a single configuration with at most `max_trial` trials on
+        the running event loop.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param max_trial: The maximum number of trials.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param errors: A list to append the error messages of the failed
+            trials to.
+        :return: Whether any of the trials succeeded. None if the
+            configuration is run by another process.
+        """
+        for trial in range(max_trial):
+            if trial > 0:
+                await asyncio.sleep(self.retry_policy.retry_delay(trial))
+            try:
+                await self.run_single_experiment_async(title, config,
+                                                       skip_if_exists, trial)
+                await asyncio.to_thread(self.experiment_done, title, True)
+                return True
+            except LeaseHeldError:
+                return None
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                print(e)
+                print(f"Failed trial {trial + 1} for config {config}")
+                if errors is not None:
+                    errors.append(f'{type(e).__name__}: {e}')
+        await asyncio.to_thread(self.experiment_done, title, False)
+        return False
+
+    def experiment_done(self, title, successful):
+        """Tell the track log that all the trials of an experiment are done.
+
+        :param title: The title of the experiment.
+        :param successful: Whether any of the trials succeeded.
+        """
+        self.notify_track_log('experiment_done', title, successful)
+
+    def notify_track_log(self, method: str, *args):
+        """Call a hook of the track log, if it has one.
+
+        Only `add_log_file` is required, so a track log that is not derived
+        from `BaseTrackLog` may not have the other methods.
+
+        :param method: The name of the method, for example,
+            'experiment_started'.
+        :param args: The arguments of the method.
+        """
+        hook = getattr(self.track_log, method, None)
+        if hook is not None:
+            hook(*args)
+
+    async def run_single_experiment_async(self, title, config, skip_if_exists,
+                                          trial=0):
+        """Run a single experiment with the given configuration on the
+        running event loop.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param skip_if_exists: Whether to skip the configuration if the log
+            file already exists.
+        :param trial: The trial number, starting from 0.
+        """
+        file = None
+        if self.track_log is not None:
+            try:
+                file = await asyncio.to_thread(self.track_log.add_log_file,
+                                               title, skip_if_exists)
+                if file is None:  # No need to run the experiment
+                    return
+            except LeaseHeldError:
+                raise
+            except Exception:
+                print("Failed to create log file")
+                raise
+
+        await asyncio.to_thread(self.notify_track_log, 'experiment_started',
+                                title, trial)
+        measurement = None
+        if self.ledger is not None:
+            measurement = self.ledger.start(title, trial)
+        try:
+            run_experiment_async = getattr(self.runner, 'run_experiment_async',
+                                           None)
+            with experiment_output(title):
+                if run_experiment_async is not None:
+                    await run_experiment_async(title, config, file)
+                else:
+                    await asyncio.to_thread(self.runner.run_experiment, title,
+                                            config, file)
+        except Exception as e:
+            await self.experiment_finished_async(title, trial, file,
+                                                 measurement, e)
+            raise
+        await self.experiment_finished_async(title, trial, file, measurement)
+        return True
+
+    def run_single_experiment(self, title, config, skip_if_exists, trial=0,
+                              budget=None):
         """Run a single experiment with the given configuration.
 
         :param title: The title of the experiment.
         :param config: The configuration of the experiment.
         :param skip_if_exists: Whether to skip the configuration if the log
             file already exists.
+        :param trial: The trial number, starting from 0.
+        :param budget: The budget passed to the runner as the `budget`
+            keyword argument. If None, the argument is not passed.
+        :return: The return value of the runner (for example, a metric), or
+            None if the experiment is skipped.
         """
         # Create log file
         file = None
@@ -130,24 +721,278 @@ class Experimentor:
                 file = self.track_log.add_log_file(title, skip_if_exists)
                 if file is None:  # No need to run the experiment
                     return
+            except LeaseHeldError:
+                raise
             except Exception:
                 print("Failed to create log file")
                 raise
 
         # Run the function
-        self.runner.run_experiment(title, config, file)
-        return True
+        self.notify_track_log('experiment_started', title, trial)
+        measurement = None
+        if self.ledger is not None:
+            measurement = self.ledger.start(title, trial)
+        try:
+            with experiment_output(title):
+                if budget is None:
+                    result = self.runner.run_experiment(title, config, file)
+                else:
+                    result = self.runner.run_experiment(title, config, file,
+                                                        budget=budget)
+        except Exception as e:
+            self.experiment_finished(title, trial, file, measurement, e)
+            raise
+        self.experiment_finished(title, trial, file, measurement)
+        return result
+
+    def experiment_finished(self, title, trial, file, measurement,
+                            error: Exception | None = None):
+        """Record the end of a trial in the ledger and the track log.
+
+        The ledger goes first, because the track log may move the log file
+        (see `SqliteTrackLog`).
+
+        :param title: The title of the experiment.
+        :param trial: The trial number, starting from 0.
+        :param file: The log file of the trial.
+        :param measurement: The measurement from the ledger, or None.
+        :param error: The exception raised by the trial, if any.
+        """
+        if measurement is not None:
+            self.ledger.finish(measurement, file, error)
+        self.notify_track_log('experiment_finished', title, trial, error)
+
+    async def experiment_finished_async(self, title, trial, file, measurement,
+                                        error: Exception | None = None):
+        """Record the end of a trial in a thread, so the event loop is not
+        blocked by the writes. See `experiment_finished`.
+        """
+        if measurement is not None:
+            # The usage is collected in the context of the task
+            measurement.stop()
+        await asyncio.to_thread(self.experiment_finished, title, trial, file,
+                                measurement, error)
+
+    def run_search(self, search: SuccessiveHalving,
+                   max_trial=DEFAULT_MAX_TRIALS,
+                   max_workers: int | None = None) -> list[SearchResult]:
+        """Run a successive halving or Hyperband search.
+
+        The runner must return a metric from `run_experiment` and accept the
+        budget as the `budget` keyword argument. In each rung, the
+        configurations are run with the budget of the rung, and only the
+        best ones (see `experimentor.SuccessiveHalving`) are run again in the
+        next rung. Each run is logged separately: the title of the
+        experiment is suffixed with the rung (and the bracket for Hyperband),
+        for example, 'a_c_e_rung0' or 'a_c_e_bracket2_rung0'.
+
+        A configuration that fails all its trials, or for which the runner
+        returns None, is not promoted.
+
+        :param search: A `SuccessiveHalving` or `Hyperband` object.
+        :param max_trial: The maximum number of trials for each run.
+        :param max_workers: The maximum number of configurations to run at
+            the same time. If None, the value given on initialization is used.
+        :return: The results of the configurations in the last rung of every
+            bracket, from the best.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        configs = configure_iterable(self.config)
+        brackets = search.brackets(len(configs))
+        total = 0
+        for bracket in brackets:
+            num = len(bracket.positions)
+            for _ in bracket.budgets:
+                total += num
+                num = search.promote(num)
+
+        def sort_key(result: SearchResult):
+            return result.metric if search.minimize else -result.metric
+
+        results = []
+        futures = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            with progress_bar(total, status_lines=self.status_lines(
+                    max_workers)) as pbar:
+                for bracket in brackets:
+                    candidates = [configs[position]
+                                  for position in bracket.positions]
+                    for rung, budget in enumerate(bracket.budgets):
+                        suffix = '_'.join(filter(None, [bracket.name,
+                                                        f'rung{rung}']))
+                        futures = {
+                            executor.submit(self.run_with_budget,
+                                            f'{title}_{suffix}', conf, budget,
+                                            max_trial): (title, conf)
+                            for title, conf in candidates
+                        }
+                        scored = []
+                        for future in concurrent.futures.as_completed(futures):
+                            title, conf = futures[future]
+                            metric = future.result()
+                            if metric is not None:
+                                scored.append(SearchResult(title, conf, budget,
+                                                           float(metric)))
+                            pbar.update()
+                        scored.sort(key=sort_key)
+                        if rung == len(bracket.budgets) - 1:
+                            results.extend(scored)
+                        else:
+                            candidates = [(result.title, result.config)
+                                          for result in
+                                          scored[:search.promote(len(candidates))]]
+                        if not candidates:
+                            break
+        except KeyboardInterrupt:
+            self.interrupt(futures)
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.interrupted.clear()
+        results.sort(key=sort_key)
+        return results
+
+    def run_with_budget(self, title, config, budget, max_trial):
+        """Run a single configuration with the given budget with at most
+        `max_trial` trials.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param budget: The budget of the run.
+        :param max_trial: The maximum number of trials.
+        :return: The metric returned by the runner, or None if all the trials
+            failed.
+        """
+        for trial in range(max_trial):
+            if trial > 0:
+                time.sleep(self.retry_policy.retry_delay(trial))
+            if self.interrupted.is_set():
+                raise KeyboardInterrupt
+            try:
+                metric = self.run_single_experiment(title, config, False,
+                                                    trial, budget)
+                if metric is None:
+                    print(f"No metric is returned for config {config}")
+                self.experiment_done(title, True)
+                return metric
+            except LeaseHeldError:
+                print(f"Config {config} is run by another process")
+                return None
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print(e)
+                print(f"Failed trial {trial + 1} for config {config}")
+        self.experiment_done(title, False)
+        return None
+
+
+async def run_experiments_async(config: list | ConfigureIterable,
+                                runner: BaseExperimentRunner,
+                                log_dir: str | None,
+                                max_trial=DEFAULT_MAX_TRIALS,
+                                skip_if_exists=False,
+                                track_log: BaseTrackLog | None = None,
+                                max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Run experiments concurrently with the given configuration on the
+    running event loop.
+
+    The function will initialize an `Experimentor` object and await its
+    `run_experiments_async` method. Use it with `AsyncCommandRunner` like
+    this:
+    ```
+    asyncio.run(experimentor.run_experiments_async(
+        config, experimentor.AsyncCommandRunner('echo'), 'log'))
+    ```
+
+    :param config: A list of dictionaries, or a `ConfigureIterable` object.
+    :param runner: A class to run the experiment. Should be inherited from
+        `experimentor.BaseExperimentRunner`.
+    :param log_dir: The directory to store logs. If None, no log will be
+        stored.
+    :param max_trial: The maximum number of trials for each configuration.
+    :param skip_if_exists: Skip the configuration if the log file already exists.
+    :param track_log: Specify the track log object. If None and `log_dir` is
+        not None, a new track log object will be created. If None and `log_dir`
+        is None, no track log will be created.
+    :param max_concurrency: The maximum number of configurations to run at
+        the same time.
+    """
+    await Experimentor(
+        config, runner, log_dir, track_log
+    ).run_experiments_async(max_trial, skip_if_exists, max_concurrency)
+
+
+@contextlib.contextmanager
+def progress_bar(total: int | None, weights: dict | None = None,
+                 status_lines=0):
+    """Show a progress bar while running the experiments.
+
+    The stdout and stderr are redirected while the progress bar is shown, so
+    that the progress bar is displayed correctly. `ExperimentorError` raised
+    inside is turned into a ValueError.
+
+    :param total: The total number of configurations. None if unknown.
+    :param weights: The predicted runtime of each title. If given, the
+        progress bar counts the predicted runtime instead of the
+        configurations, so the estimated time left is weighted by runtime.
+    :param status_lines: The number of lines of the status area of the
+        running experiments below the progress bar. If 0, no status area is
+        shown.
+    """
+    import tqdm
+
+    disable_tqdm = False
+    progress_bar_file = tqdm_file()
+    if progress_bar_file is None:
+        progress_bar_file = sys.stdout
+        disable_tqdm = True
+    kwargs = {}
+    if weights is not None:
+        total = sum(weights.values())
+        # The predicted runtime is not meaningful as a count
+        kwargs['bar_format'] = '{l_bar}{bar}| [{elapsed}<{remaining}]'
+    with tqdm.tqdm(total=total, leave=True, disable=disable_tqdm,
+                   file=progress_bar_file, dynamic_ncols=True,
+                   **kwargs) as pbar:
+        with redirect_stream_for_tqdm(progress_bar_file, status_lines):
+            try:
+                yield pbar
+            except ExperimentorError as e:
+                print(e)
+                raise ValueError("Experimentor error")
+            except KeyboardInterrupt:
+                print("Interrupted")
+                raise
+
+
+def progress_weight(weights: dict | None, title: str) -> float:
+    return 1 if weights is None else weights.get(title, 0)
+
+
+def configure_iterable(config: list | ConfigureIterable) -> ConfigureIterable:
+    """Get the `ConfigureIterable` object of the configuration.
+
+    :param config: The configuration list, or a `ConfigureIterable` object
+        (for example, a slice or a shard of the configurations).
+    :return: The `ConfigureIterable` object.
+    """
+    if isinstance(config, ConfigureIterable):
+        return config
+    return ConfigureIterable(config)
 
 
-def count(config) -> int:
+def count(config: list | ConfigureIterable) -> int | None:
     """Count the number of configurations.
 
-    :param config: The configuration list.
-    :return: The number of configurations.
+    :param config: The configuration list, or a `ConfigureIterable` object.
+    :return: The number of configurations, or None if it is unknown.
     """
-    if len(config) == 0:
-        return 0
-    num = len(config[0])
-    for i in range(1, len(config)):
-        num *= len(config[i])
-    return num
+    configs = configure_iterable(config)
+    if not configs.bounded:
+        return None
+    return len(configs)
@@ -0,0 +1,123 @@
+"""This module handles the retries and the failures of the experiments.
+
+`RetryPolicy` decides how long to wait between two trials of a
+configuration, and how many times the failed configurations are retried at
+the end of a sweep that continues on failure. `FailureReport` is the summary
+of the configurations that still failed after all the retries.
+"""
+
+import json
+
+
+class RetryPolicy:
+    """How to retry the failed trials and configurations.
+
+    The n-th retry of a configuration (starting from 1) waits for
+    `delay * backoff ** (n - 1)` seconds, but no longer than `max_delay`.
+    When the sweep continues on failure, the configurations that failed all
+    their trials are put in a deferred queue, which is retried
+    `deferred_rounds` times after all the other configurations finish. Each
+    round starts after `deferred_delay` seconds.
+    """
+    def __init__(self, delay=0.0, backoff=2.0, max_delay=600.0,
+                 deferred_rounds=1, deferred_delay=0.0):
+        """Initialize the RetryPolicy object.
+
+        :param delay: The delay in seconds before the first retry.
+        :param backoff: The factor of the delay between two retries.
+        :param max_delay: The maximum delay in seconds.
+        :param deferred_rounds: The number of times the failed
+            configurations are retried at the end of the sweep.
+        :param deferred_delay: The delay in seconds before each round of
+            the deferred retries.
+        """
+        if delay < 0 or backoff < 1 or max_delay < 0:
+            raise ValueError("Invalid retry delay")
+        if deferred_rounds < 0 or deferred_delay < 0:
+            raise ValueError("Invalid deferred retries")
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.deferred_rounds = deferred_rounds
+        self.deferred_delay = deferred_delay
+
+    def retry_delay(self, retry: int) -> float:
+        """Get the delay before a retry.
+
+        :param retry: The number of the retry, starting from 1.
+        :return: The delay in seconds.
+        """
+        if retry < 1 or self.delay == 0:
+            return 0.0
+        return min(self.max_delay, self.delay * self.backoff ** (retry - 1))
+
+
+class FailedExperiment:
+    """A configuration that failed all its trials.
+    """
+    def __init__(self, title: str, config: dict, errors: list[str]):
+        """Initialize the FailedExperiment object.
+
+        :param title: The title of the experiment.
+        :param config: The configuration of the experiment.
+        :param errors: The error messages of all the trials, including the
+            deferred retries.
+        """
+        self.title = title
+        self.config = config
+        self.errors = errors
+
+    def to_dict(self) -> dict:
+        return {'title': self.title, 'config': self.config,
+                'errors': self.errors}
+
+
+class FailureReport:
+    """The summary of a sweep that continues on failure.
+    """
+    def __init__(self, total: int, failures: list[FailedExperiment],
+                 claimed=0):
+        """Initialize the FailureReport object.
+
+        :param total: The number of configurations in the sweep.
+        :param failures: The configurations that still failed after all the
+            retries.
+        :param claimed: The number of configurations that were run by other
+            processes sharing the log directory.
+        """
+        self.total = total
+        self.failures = failures
+        self.claimed = claimed
+
+    def __bool__(self):
+        # True if nothing failed in this process
+        return not self.failures
+
+    def summary(self) -> str:
+        """Get a human-readable summary.
+
+        :return: The summary.
+        """
+        succeeded = self.total - len(self.failures) - self.claimed
+        line = (f"{succeeded} of {self.total} configurations succeeded, "
+                f"{len(self.failures)} failed")
+        if self.claimed:
+            line += f", {self.claimed} run by other processes"
+        lines = [line]
+        for failure in self.failures:
+            last_error = failure.errors[-1] if failure.errors else 'unknown'
+            lines.append(f"  {failure.title}: {last_error} "
+                         f"({len(failure.errors)} failed trials)")
+        return '\n'.join(lines)
+
+    def to_json(self) -> str:
+        """Get the report in JSON.
+
+        :return: The JSON string.
+        """
+        return json.dumps({
+            'total': self.total,
+            'failed': len(self.failures),
+            'claimed': self.claimed,
+            'failures': [failure.to_dict() for failure in self.failures],
+        }, indent=2, default=repr)
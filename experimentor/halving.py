@@ -0,0 +1,131 @@
+"""This module plans successive halving and Hyperband searches.
+
+In successive halving, all the configurations are first run with a small
+budget (for example, a few epochs). Only the best `1 / eta` of them are run
+again with `eta` times the budget, and so on until the maximum budget is
+reached. Hyperband runs several successive halving brackets that start
+with different budgets on random samples of the configurations, so that a
+bad choice of the minimum budget does not throw away good configurations.
+
+The runner reports the metric of each run as the return value of
+`run_experiment` and receives the budget as the `budget` keyword argument.
+See `experimentor.Experimentor.run_search`.
+"""
+
+import math
+import random
+
+
+class Bracket:
+    """A successive halving bracket.
+    """
+    def __init__(self, name: str, positions: list[int], budgets: list):
+        """Initialize the Bracket object.
+
+        :param name: The name of the bracket. It is a part of the titles of
+            the runs, and may be empty.
+        :param positions: The indices of the configurations to start with.
+        :param budgets: The budgets of the rungs, from the smallest.
+        """
+        self.name = name
+        self.positions = positions
+        self.budgets = budgets
+
+
+class SearchResult:
+    """The result of a configuration in the last rung it was run in.
+    """
+    def __init__(self, title: str, config: dict, budget, metric: float):
+        self.title = title
+        self.config = config
+        self.budget = budget
+        self.metric = metric
+
+    def __repr__(self):
+        return (f'SearchResult(title={self.title!r}, budget={self.budget!r}, '
+                f'metric={self.metric!r})')
+
+
+class SuccessiveHalving:
+    """Run all the configurations in a single successive halving bracket.
+    """
+    def __init__(self, min_budget, max_budget, eta=3, minimize=True):
+        """Initialize the SuccessiveHalving object.
+
+        :param min_budget: The budget of the first rung.
+        :param max_budget: The budget of the last rung.
+        :param eta: The factor of the budget between two rungs. Only the best
+            `1 / eta` of the configurations are promoted to the next rung.
+        :param minimize: Whether a smaller metric is better.
+        """
+        if not 0 < min_budget <= max_budget:
+            raise ValueError("The budgets must satisfy "
+                             "0 < min_budget <= max_budget")
+        if eta < 2:
+            raise ValueError("eta must be at least 2")
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.eta = eta
+        self.minimize = minimize
+
+    def rung_budgets(self, min_budget) -> list:
+        """Get the budgets of the rungs starting from `min_budget`.
+
+        :param min_budget: The budget of the first rung.
+        :return: The budgets, from the smallest to `max_budget`.
+        """
+        num_rungs = int(math.log(self.max_budget / min_budget, self.eta)
+                        + 1e-9) + 1
+        budgets = [min_budget * self.eta ** i for i in range(num_rungs - 1)]
+        budgets.append(self.max_budget)
+        if isinstance(self.max_budget, int):
+            budgets = [max(1, round(budget)) for budget in budgets]
+        return budgets
+
+    def promote(self, num: int) -> int:
+        """Get the number of configurations promoted to the next rung.
+
+        :param num: The number of configurations in the current rung.
+        :return: The number of configurations in the next rung.
+        """
+        return max(1, num // self.eta)
+
+    def brackets(self, num_configs: int) -> list[Bracket]:
+        """Plan the brackets.
+
+        :param num_configs: The number of configurations.
+        :return: The brackets to run.
+        """
+        return [Bracket('', list(range(num_configs)),
+                        self.rung_budgets(self.min_budget))]
+
+
+class Hyperband(SuccessiveHalving):
+    """Run several successive halving brackets on random samples of the
+    configurations.
+    """
+    def __init__(self, min_budget, max_budget, eta=3, minimize=True,
+                 seed: int | None = None):
+        """Initialize the Hyperband object.
+
+        :param min_budget: The smallest budget of a rung.
+        :param max_budget: The budget of the last rung.
+        :param eta: The factor of the budget between two rungs. Only the best
+            `1 / eta` of the configurations are promoted to the next rung.
+        :param minimize: Whether a smaller metric is better.
+        :param seed: The seed to sample the configurations.
+        """
+        super().__init__(min_budget, max_budget, eta, minimize)
+        self.seed = seed
+
+    def brackets(self, num_configs: int) -> list[Bracket]:
+        rng = random.Random(self.seed)
+        s_max = len(self.rung_budgets(self.min_budget)) - 1
+        brackets = []
+        for s in range(s_max, -1, -1):
+            num = math.ceil((s_max + 1) / (s + 1) * self.eta ** s)
+            num = min(num, num_configs)
+            budgets = self.rung_budgets(self.min_budget)[s_max - s:]
+            positions = sorted(rng.sample(range(num_configs), num))
+            brackets.append(Bracket(f'bracket{s}', positions, budgets))
+        return brackets
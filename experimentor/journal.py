@@ -0,0 +1,153 @@
+"""This module provides an append-only journal of the experiment states.
+
+Every time an experiment starts, succeeds or fails, a record is appended to
+the journal as a single line of JSON. Each record is written with a single
+`os.write` call on a file opened with `O_APPEND`, so a record is either fully
+written or (if the process crashes in the middle of the write) a broken last
+line, which is ignored when the journal is loaded. When the journal is opened
+for writing, a broken last line is ended with a newline, so the next record
+is not appended to it (and ignored with it). The journal is fsync'd
+after every "succeeded" or "failed" record, so a finished experiment is never
+lost.
+
+The journal is loaded once when it is opened. After that, whether an
+experiment has succeeded can be checked without touching the file system.
+"""
+
+import datetime
+import json
+import os
+import threading
+
+STARTED = 'started'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class CompletionJournal:
+    """An append-only journal of the experiment states.
+    """
+    def __init__(self, path: str, read_only=False,
+                 states: dict | None = None, offset=0):
+        """Open the journal. If it does not exist, it will be created.
+
+        :param path: The path to the journal file.
+        :param read_only: Only load the journal. Nothing can be recorded,
+            and the file is not created if it does not exist.
+        :param states: The states loaded before, to continue loading from
+            `offset` (see `load`).
+        :param offset: The offset in the file to start loading from.
+        """
+        self.path = path
+        self.existed = os.path.exists(path)
+        self.states = {} if states is None else states
+        self.reasons = {}
+        self.offset = offset
+        self._lock = threading.Lock()
+        self._fd = None
+        if self.existed:
+            self.offset = self.load(offset)
+        if not read_only:
+            self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT,
+                               0o644)
+            self.end_last_line()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the journal file.
+        """
+        fd = getattr(self, '_fd', None)
+        if fd is not None:
+            self._fd = None
+            os.close(fd)
+
+    def end_last_line(self):
+        """End a broken last line left by a crashed process with a newline.
+
+        If the line is still being written by another process instead, an
+        empty line is appended after it, which is ignored when loading.
+        """
+        size = os.fstat(self._fd).st_size
+        if size and os.pread(self._fd, 1, size - 1) != b'\n':
+            os.write(self._fd, b'\n')
+
+    def load(self, offset=0) -> int:
+        """Load the states of the experiments from the journal file.
+
+        Broken lines (for example, the last line written by a crashed
+        process) are ignored.
+
+        :param offset: The offset in the file to start from. The records
+            before it must have been loaded already.
+        :return: The offset after the last complete line, to continue
+            loading from when more records are appended.
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Possibly still being written
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                    self._apply(record['title'], record['state'],
+                                record.get('reason'))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return offset
+
+    def _apply(self, title: str, state: str, reason: str | None):
+        # Once an experiment succeeded, it stays succeeded
+        if self.states.get(title) == SUCCEEDED:
+            return
+        self.states[title] = state
+        if state == FAILED:
+            self.reasons[title] = reason
+        else:
+            self.reasons.pop(title, None)
+
+    def record(self, title: str, state: str, trial: int,
+               reason: str | None = None):
+        """Append a record to the journal.
+
+        :param title: The title of the experiment.
+        :param state: One of `STARTED`, `SUCCEEDED` and `FAILED`.
+        :param trial: The trial number, starting from 0.
+        :param reason: The reason of the failure, if any.
+        """
+        record = {
+            'title': title,
+            'state': state,
+            'trial': trial,
+            'time': datetime.datetime.now(datetime.UTC).isoformat(),
+        }
+        if reason is not None:
+            record['reason'] = reason
+        data = (json.dumps(record) + '\n').encode()
+        with self._lock:
+            if self._fd is None:
+                raise ValueError("The journal is closed")
+            os.write(self._fd, data)
+            if state != STARTED:
+                os.fsync(self._fd)
+            self._apply(title, state, reason)
+
+    def has_succeeded(self, title: str) -> bool:
+        """Check whether the experiment has succeeded.
+
+        :param title: The title of the experiment.
+        :return: Whether there is a "succeeded" record for the experiment.
+        """
+        return self.states.get(title) == SUCCEEDED
+
+    def get_state(self, title: str) -> str | None:
+        """Get the latest state of the experiment.
+
+        :param title: The title of the experiment.
+        :return: `SUCCEEDED` if the experiment has ever succeeded. Otherwise,
+            the state in the latest record, or None if there's no record.
+        """
+        return self.states.get(title)
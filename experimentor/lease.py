@@ -0,0 +1,229 @@
+"""This module lets several processes share a sweep through leases.
+
+Before a process runs an experiment, it claims a lease: a file named after
+the experiment in the lease directory, created with `O_EXCL`, so only one
+process can hold it. While the experiment runs, a background thread touches
+the lease files every `heartbeat` seconds. A lease that has not been touched
+for `ttl` seconds belongs to a process that died, and is reclaimed by the
+next process that wants it: the stale file is removed and a new lease is
+created. Another process may replace the lease with a fresh one between
+the check and the removal, so a lease is only ever removed (when it is
+reclaimed, or released by its owner) while holding an exclusive `flock` on
+`LOCK_FILE` in the lease directory, after checking it again. Creating a
+lease does not need the lock, as `O_EXCL` fails while the file exists.
+
+When the experiment succeeds, a marker file is written next to the lease
+and the lease is removed, so the other processes skip the experiment. When
+it fails, the lease is only removed, so the experiment can be run again by
+a deferred retry, a resumed sweep or another process. Only files in a
+shared directory are used, so the processes can run on any number of hosts,
+as long as the file system supports `O_EXCL` and `flock` (NFS does, through
+the lock manager on Linux). The clocks of the hosts should roughly agree,
+and `ttl` should be well above `heartbeat`, so a lease is not reclaimed
+while its holder is just slow to touch it.
+"""
+
+import contextlib
+import fcntl
+import os
+import socket
+import threading
+import time
+import uuid
+
+from .configure_production import ExperimentorError
+
+LEASE_SUFFIX = '.lease'
+DONE_SUFFIX = '.done'
+# The file locked while a lease is checked and removed
+LOCK_FILE = '.lock'
+
+# The default seconds after which a lease without heartbeats is stale
+DEFAULT_LEASE_TTL = 60.0
+
+
+class LeaseHeldError(ExperimentorError):
+    """The experiment is being run by another process.
+    """
+    pass
+
+
+class LeaseManager:
+    """Claim, keep alive and release the leases of the experiments.
+    """
+    def __init__(self, lease_dir: str, ttl=DEFAULT_LEASE_TTL,
+                 heartbeat: float | None = None):
+        """Initialize the LeaseManager object.
+
+        :param lease_dir: The directory to store the leases in. It is created
+            if it does not exist.
+        :param ttl: The seconds after which a lease without heartbeats is
+            stale.
+        :param heartbeat: The seconds between two heartbeats. By default, a
+            third of `ttl`.
+        """
+        if heartbeat is None:
+            heartbeat = ttl / 3
+        if not 0 < heartbeat < ttl:
+            raise ValueError("heartbeat must be positive and less than ttl")
+        self.lease_dir = lease_dir
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+        self.held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        os.makedirs(lease_dir, exist_ok=True)
+
+    def lease_path(self, name: str) -> str:
+        return os.path.join(self.lease_dir, name + LEASE_SUFFIX)
+
+    def done_path(self, name: str) -> str:
+        return os.path.join(self.lease_dir, name + DONE_SUFFIX)
+
+    def is_done(self, name: str) -> bool:
+        """Check whether any process has run the experiment successfully.
+
+        :param name: The name of the experiment.
+        :return: Whether the experiment has a done marker.
+        """
+        return os.path.exists(self.done_path(name))
+
+    def try_claim(self, name: str) -> bool:
+        """Claim the lease of an experiment.
+
+        :param name: The name of the experiment.
+        :return: Whether the lease is held by this process now. False if the
+            experiment has succeeded, or another live process holds the
+            lease.
+        """
+        with self._lock:
+            if name in self.held:
+                return True
+        if self.is_done(name):
+            return False
+        path = self.lease_path(name)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                if not self.reclaim(path):
+                    return False
+                continue
+            try:
+                os.write(fd, self.owner.encode())
+            finally:
+                os.close(fd)
+            # The experiment may have finished just before the lease was
+            # created
+            if self.is_done(name):
+                self.remove(path)
+                return False
+            with self._lock:
+                self.held.add(name)
+                self.start_heartbeat()
+            return True
+        return False
+
+    def reclaim(self, path: str) -> bool:
+        """Remove a stale lease.
+
+        :param path: The path to the lease.
+        :return: Whether the lease was stale (or is already gone), so the
+            caller can try to create it again.
+        """
+        lease = self.read_lease(path)
+        if lease is not None and time.time() - lease[1] <= self.ttl:
+            return False
+        with self.locked():
+            # Another process may have reclaimed the lease and created a
+            # fresh one after it was read
+            lease = self.read_lease(path)
+            if lease is None:
+                return True
+            if time.time() - lease[1] <= self.ttl:
+                return False
+            os.remove(path)
+        return True
+
+    def read_lease(self, path: str) -> tuple[str, float] | None:
+        """Read the owner and the time of the last heartbeat of a lease.
+
+        :param path: The path to the lease.
+        :return: The owner and the modification time of the lease, or None
+            if it does not exist.
+        """
+        try:
+            with open(path, 'r') as f:
+                return f.read(), os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the lock of the lease directory, so no other process removes
+        a lease in the context.
+        """
+        # Opened every time: the lock of an open file is shared by the
+        # threads of this process
+        fd = os.open(os.path.join(self.lease_dir, LOCK_FILE),
+                     os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def release(self, name: str, succeeded=False):
+        """Release the lease of an experiment.
+
+        :param name: The name of the experiment.
+        :param succeeded: Whether the experiment succeeded. If True, a done
+            marker is written, so no process runs it again.
+        """
+        with self._lock:
+            if name not in self.held:
+                return
+            self.held.discard(name)
+        if succeeded:
+            with open(self.done_path(name), 'w') as f:
+                f.write(self.owner)
+        self.remove(self.lease_path(name))
+
+    def remove(self, path: str):
+        # Only remove the lease if it is still ours, since another process
+        # may have taken it over while this one was stalled
+        with self.locked():
+            lease = self.read_lease(path)
+            if lease is not None and lease[0] == self.owner:
+                os.remove(path)
+
+    def start_heartbeat(self):
+        # Must be called with the lock held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_heartbeat,
+                                            daemon=True)
+            self._thread.start()
+
+    def run_heartbeat(self):
+        while not self._stopped.wait(self.heartbeat):
+            with self._lock:
+                names = list(self.held)
+            for name in names:
+                try:
+                    os.utime(self.lease_path(name))
+                except FileNotFoundError:
+                    # The lease was reclaimed by another process, which
+                    # should only happen if this process was stalled
+                    print(f"Lost the lease of {name}")
+
+    def close(self):
+        """Stop the heartbeats and release all the leases without marking
+        the experiments as done.
+        """
+        self._stopped.set()
+        with self._lock:
+            names = list(self.held)
+        for name in names:
+            self.release(name)
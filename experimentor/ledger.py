@@ -0,0 +1,236 @@
+"""This module records the cost of every trial in a run ledger.
+
+The ledger is a JSONL file ('ledger.jsonl' in the log directory by
+default). For every trial, a record like the following is appended, with
+the same single-write `O_APPEND` scheme as the journal (see
+`experimentor.journal`), so several processes can share the ledger:
+
+```
+{"title": "a_c_e", "trial": 0, "time": "2024-01-01T00:00:00+00:00",
+ "wall": 12.3, "user": 11.8, "sys": 0.4, "max_rss": 104857600,
+ "exit_code": 0, "log_bytes": 2048, "successful": true, "error": null}
+```
+
+The CPU times and the peak RSS (in bytes) are those of the child processes
+of the trial. They are measured exactly with `os.wait4` by the runners of
+this package (see `wait_child`) even when several trials run at the same
+time. `CallableRunner` reports the usage of its worker process during the
+call. For a runner that reports nothing, these fields are null.
+
+Custom collectors can be plugged in with the `on_start` and `on_finish`
+hooks, for example, to add the GPU memory to each record.
+"""
+
+import contextvars
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable
+
+LEDGER_FILE = 'ledger.jsonl'
+
+# ru_maxrss is in bytes on macOS and in KiB elsewhere
+MAX_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# The usage reported by the children of the current trial
+_child_usage = contextvars.ContextVar('child_usage', default=None)
+
+
+class ChildUsage:
+    """The resources used by the child processes of a trial.
+    """
+    def __init__(self):
+        self.user = None
+        self.sys = None
+        self.max_rss = None
+        self.exit_code = None
+
+    def add(self, user: float, sys_time: float, max_rss: int | None,
+            exit_code: int | None):
+        self.user = (self.user or 0.0) + user
+        self.sys = (self.sys or 0.0) + sys_time
+        if max_rss is not None:
+            self.max_rss = max(self.max_rss or 0, max_rss)
+        self.exit_code = exit_code
+
+
+def record_child_usage(user: float, sys_time: float, max_rss: int | None,
+                       exit_code: int | None = None):
+    """Report the resources used by a child process of the current trial.
+
+    Runners call this function (or `wait_child`) so the usage is recorded in
+    the ledger. It does nothing outside a trial.
+
+    :param user: The user CPU time in seconds.
+    :param sys_time: The system CPU time in seconds.
+    :param max_rss: The peak resident set size in bytes.
+    :param exit_code: The exit code of the child.
+    """
+    usage = _child_usage.get()
+    if usage is not None:
+        usage.add(user, sys_time, max_rss, exit_code)
+
+
+def wait_child(process: subprocess.Popen) -> int:
+    """Wait for a child process and report its resource usage.
+
+    The resource usage is also kept in `process.rusage`, for example, to
+    check the CPU time limit (see `experimentor.ExperimentLimits`).
+
+    :param process: The child process.
+    :return: The return code, as in `subprocess.Popen.returncode`.
+    """
+    if process.returncode is not None:
+        return process.returncode
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped by someone else
+        return process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.rusage = rusage
+    record_child_usage(rusage.ru_utime, rusage.ru_stime,
+                       rusage.ru_maxrss * MAX_RSS_UNIT, process.returncode)
+    return process.returncode
+
+
+class TrialMeasurement:
+    """The measurement of a running trial. See `RunLedger.start`.
+    """
+    def __init__(self, title: str, trial: int):
+        self.title = title
+        self.trial = trial
+        self.time = datetime.datetime.now(datetime.UTC).isoformat()
+        self.start = time.monotonic()
+        self.wall = None
+        self.usage = ChildUsage()
+        self.token = _child_usage.set(self.usage)
+
+    def stop(self):
+        """Stop the clock and stop collecting the usage of the children.
+
+        It must be called in the thread or the task that started the trial.
+        `RunLedger.finish` calls it if it has not been called, so it is only
+        needed before finishing the trial somewhere else.
+        """
+        if self.wall is None:
+            self.wall = time.monotonic() - self.start
+            _child_usage.reset(self.token)
+
+
+class RunLedger:
+    """An append-only JSONL ledger of the cost of every trial.
+    """
+    def __init__(self, path: str,
+                 on_start: list[Callable[[str, int], None]] | None = None,
+                 on_finish: list[Callable[[dict], None]] | None = None):
+        """Open the ledger. If it does not exist, it will be created.
+
+        :param path: The path to the ledger file.
+        :param on_start: Functions called with the title and the trial
+            number before each trial starts.
+        :param on_finish: Functions called with the record of each trial
+            before it is written. They can add fields to the record.
+        """
+        self.path = path
+        self.on_start = list(on_start or [])
+        self.on_finish = list(on_finish or [])
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the ledger file.
+        """
+        fd = getattr(self, '_fd', None)
+        if fd is not None:
+            self._fd = None
+            os.close(fd)
+
+    def start(self, title: str, trial: int) -> TrialMeasurement:
+        """Start measuring a trial in the current thread or task.
+
+        :param title: The title of the experiment.
+        :param trial: The trial number, starting from 0.
+        :return: The measurement to pass to `finish`.
+        """
+        for hook in self.on_start:
+            hook(title, trial)
+        return TrialMeasurement(title, trial)
+
+    def finish(self, measurement: TrialMeasurement, file,
+               error: Exception | None = None) -> dict:
+        """Finish measuring a trial and append its record.
+
+        :param measurement: The measurement returned by `start`.
+        :param file: The log file of the trial. If it is a path, the size of
+            the log (and of the stderr captured separately) is recorded.
+        :param error: The exception raised by the trial, if any.
+        :return: The record.
+        """
+        measurement.stop()
+        usage = measurement.usage
+        record = {
+            'title': measurement.title,
+            'trial': measurement.trial,
+            'time': measurement.time,
+            'wall': measurement.wall,
+            'user': usage.user,
+            'sys': usage.sys,
+            'max_rss': usage.max_rss,
+            'exit_code': usage.exit_code,
+            'log_bytes': log_size(file),
+            'successful': error is None,
+            'error': None if error is None else str(error),
+        }
+        for hook in self.on_finish:
+            hook(record)
+        data = (json.dumps(record, default=str) + '\n').encode()
+        with self._lock:
+            if self._fd is None:
+                raise ValueError("The ledger is closed")
+            os.write(self._fd, data)
+        return record
+
+
+def log_size(file) -> int | None:
+    """Get the size of a log file and its separate stderr.
+
+    :param file: The log file passed to the runner.
+    :return: The size in bytes, or None if the file is not a path.
+    """
+    if not isinstance(file, (str, os.PathLike)):
+        return None
+    # Imported here because log_capture imports this module
+    from .log_capture import STDERR_SUFFIX
+    size = 0
+    for path in (file, str(file) + STDERR_SUFFIX):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+def self_usage() -> tuple[float, float, int]:
+    """Get the resources used by this process and its children so far.
+
+    :return: The user CPU time, the system CPU time and the peak RSS in
+        bytes.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (usage.ru_utime + children.ru_utime,
+            usage.ru_stime + children.ru_stime,
+            max(usage.ru_maxrss, children.ru_maxrss) * MAX_RSS_UNIT)
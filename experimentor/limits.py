@@ -0,0 +1,324 @@
+"""This module limits the time and the resources of the experiments.
+
+An `ExperimentLimits` object sets, for one experiment:
+- A wall-clock timeout.
+- A stall timeout: the experiment is considered hung if its log file (and
+  the stderr captured separately) has not grown for that many seconds.
+- A memory limit (the address space, `RLIMIT_AS`) and a CPU time limit
+  (`RLIMIT_CPU`). The command is started through the `prlimit` command of
+  util-linux, which sets them before it executes the command, so no Python
+  code runs in the child between fork and exec (which is unsafe while the
+  worker threads hold locks). They apply to every process of the command
+  separately.
+
+A command with limits is started in a new session, so it is the leader of
+its own process group, together with everything it starts (for example,
+the children of the shell). While it runs, a `Watchdog` thread checks the
+timeouts. When one expires, the whole process group is sent SIGTERM, and
+SIGKILL after `kill_grace` seconds, and the trial fails with an
+`ExperimentTimeoutError` that tells which limit was exceeded.
+
+As the command is not in the foreground process group of the terminal, it
+does not receive the Ctrl-C of the terminal. `terminate_all` kills the
+process groups of all the commands being watched; `Experimentor` calls it
+when it is interrupted.
+"""
+
+import contextlib
+import functools
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections.abc import Callable
+
+from .configure_production import ExperimentorError
+
+# The number of seconds between SIGTERM and SIGKILL
+DEFAULT_KILL_GRACE = 5.0
+
+# The maximum number of seconds between two checks of the watchdog
+MAX_CHECK_INTERVAL = 1.0
+
+
+class ExperimentTimeoutError(ExperimentorError):
+    """An experiment was killed because it exceeded one of its limits.
+    """
+    pass
+
+
+class ExperimentLimits:
+    """The limits of the time and the resources of an experiment.
+    """
+    def __init__(self, timeout: float | None = None,
+                 stall_timeout: float | None = None,
+                 memory: int | None = None, cpu_time: int | None = None,
+                 kill_grace=DEFAULT_KILL_GRACE):
+        """Initialize the ExperimentLimits object.
+
+        :param timeout: The maximum wall-clock time in seconds.
+        :param stall_timeout: The maximum number of seconds without the log
+            growing. It is only checked if the experiment has a log file.
+        :param memory: The maximum address space in bytes of each process.
+        :param cpu_time: The maximum CPU time in seconds of each process.
+        :param kill_grace: The number of seconds between SIGTERM and SIGKILL
+            when a timeout expires.
+        """
+        for name, value in (('timeout', timeout),
+                            ('stall_timeout', stall_timeout),
+                            ('memory', memory), ('cpu_time', cpu_time)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive")
+        if kill_grace < 0:
+            raise ValueError("kill_grace must not be negative")
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.kill_grace = kill_grace
+
+    def __repr__(self):
+        return (f'ExperimentLimits(timeout={self.timeout}, '
+                f'stall_timeout={self.stall_timeout}, memory={self.memory}, '
+                f'cpu_time={self.cpu_time})')
+
+    def popen_args(self, args: str | list[str], kwargs: dict
+                   ) -> tuple[list[str] | str, dict]:
+        """Get the arguments of `subprocess.Popen` to start a command with
+        these limits.
+
+        :param args: The command string for the shell (with `shell=True` in
+            `kwargs`), or the list of arguments.
+        :param kwargs: The other arguments of `subprocess.Popen`. They are
+            not modified.
+        :return: The command and the other arguments. The command is started
+            in a new session, and with memory or CPU time limits, it is
+            started by `prlimit`.
+        """
+        kwargs = dict(kwargs, start_new_session=True)
+        if self.memory is None and self.cpu_time is None:
+            return args, kwargs
+        prefix = [prlimit_path()]
+        if self.memory is not None:
+            prefix.append(f'--as={self.memory}')
+        if self.cpu_time is not None:
+            # SIGXCPU at the soft limit, SIGKILL at the hard one
+            cpu_time = int(self.cpu_time)
+            prefix.append(f'--cpu={cpu_time}:'
+                          f'{cpu_time + 1 + int(self.kill_grace)}')
+        prefix.append('--')
+        if kwargs.pop('shell', False):
+            return prefix + ['/bin/sh', '-c', args], kwargs
+        executable = kwargs.pop('executable', None)
+        if executable is None:
+            executable = args[0]
+        return prefix + [executable] + list(args[1:]), kwargs
+
+    def exceeded_cpu_time(self, returncode: int,
+                          cpu_time: float | None = None) -> bool:
+        """Check if a command was killed for exceeding its CPU time.
+
+        A process gets SIGXCPU at the soft limit, and SIGKILL at the hard
+        one if it ignores SIGXCPU. A SIGKILL can have other causes (for
+        example, the OOM killer), so it only counts if the command used at
+        least `cpu_time` seconds of CPU time.
+
+        :param returncode: The return code of the command.
+        :param cpu_time: The CPU time used by the command, as measured by
+            `experimentor.ledger.wait_child`. If None, a SIGKILL does not
+            count.
+        :return: Whether it was killed by SIGXCPU (or SIGKILL) with a CPU
+            time limit, directly or as a child of the shell.
+        """
+        sigxcpu = getattr(signal, 'SIGXCPU', None)
+        if self.cpu_time is None or sigxcpu is None:
+            return False
+        if returncode in (-sigxcpu, 128 + sigxcpu):
+            return True
+        return (returncode in (-signal.SIGKILL, 128 + signal.SIGKILL)
+                and cpu_time is not None and cpu_time >= self.cpu_time)
+
+
+@functools.cache
+def prlimit_path() -> str:
+    """Find the `prlimit` command.
+
+    :return: The path to the command.
+    """
+    path = shutil.which('prlimit')
+    if path is None:
+        raise ValueError("Memory and CPU time limits need the prlimit "
+                         "command of util-linux")
+    return path
+
+
+class Watchdog:
+    """Kill the process group of a command if it exceeds its timeouts.
+
+    Use it as a context manager around the wait for the command (or as an
+    asynchronous one on an event loop). On exit, a command that exceeded a
+    timeout or its CPU time raises an `ExperimentTimeoutError`, and the
+    process group of a command interrupted by an exception is killed.
+    """
+    def __init__(self, process: subprocess.Popen, limits: ExperimentLimits,
+                 files: list[str] | None = None,
+                 progress: Callable[[], int] | None = None):
+        """Initialize the Watchdog object.
+
+        :param process: The command, started with `limits.popen_args`.
+        :param limits: The limits.
+        :param files: The files to watch for the stall timeout.
+        :param progress: A function that returns the number of bytes of
+            output so far, for the stall timeout. If None, the total size of
+            `files` is used. Without both, the stall timeout is not checked.
+        """
+        self.process = process
+        self.limits = limits
+        self.files = list(files or [])
+        self.progress = progress
+        self.reason = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        timeouts = [value for value in (self.limits.timeout,
+                                        self.limits.stall_timeout)
+                    if value is not None]
+        with _watched_lock:
+            _watched.add(self)
+        if timeouts:
+            self._interval = min(MAX_CHECK_INTERVAL, min(timeouts) / 4)
+            self._thread = threading.Thread(target=self._watch,
+                                            name='experimentor-watchdog',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with _watched_lock:
+            _watched.discard(self)
+        if exc_type is not None:
+            # Do not leave the rest of the group running
+            self.kill_group(signal.SIGKILL)
+            return
+        rusage = getattr(self.process, 'rusage', None)
+        cpu_time = (None if rusage is None
+                    else rusage.ru_utime + rusage.ru_stime)
+        if self.reason is None and self.limits.exceeded_cpu_time(
+                self.process.returncode, cpu_time):
+            self.reason = (f"Killed after the CPU time limit of "
+                           f"{self.limits.cpu_time}s")
+        if self.reason is not None:
+            raise ExperimentTimeoutError(self.reason)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # The watchdog thread may be waiting for the grace period, so it is
+        # joined in a thread
+        import asyncio
+
+        await asyncio.to_thread(self.__exit__, exc_type, exc_value,
+                                traceback)
+
+    def _watch(self):
+        start = time.monotonic()
+        size = self.log_size()
+        changed = start
+        while not self._stop.wait(self._interval):
+            now = time.monotonic()
+            if (self.limits.timeout is not None
+                    and now - start > self.limits.timeout):
+                self.expire(f"Killed after the timeout of "
+                            f"{self.limits.timeout:g}s")
+                return
+            if self.limits.stall_timeout is not None and (
+                    self.files or self.progress is not None):
+                new_size = self.log_size()
+                if new_size != size:
+                    size = new_size
+                    changed = now
+                elif now - changed > self.limits.stall_timeout:
+                    self.expire(f"Killed after no output for "
+                                f"{self.limits.stall_timeout:g}s")
+                    return
+
+    def log_size(self) -> int:
+        if self.progress is not None:
+            return self.progress()
+        size = 0
+        for path in self.files:
+            try:
+                size += os.stat(path).st_size
+            except OSError:
+                pass
+        return size
+
+    def expire(self, reason: str):
+        """Kill the process group: SIGTERM first, then SIGKILL after the
+        grace period if anything is left.
+
+        :param reason: The message of the `ExperimentTimeoutError`.
+        """
+        self.reason = reason
+        if not self.kill_group(signal.SIGTERM):
+            return
+        deadline = time.monotonic() + self.limits.kill_grace
+        while time.monotonic() < deadline:
+            if not self.kill_group(0):
+                return
+            time.sleep(min(0.1, self.limits.kill_grace))
+        self.kill_group(signal.SIGKILL)
+
+    def kill_group(self, sig: int) -> bool:
+        """Send a signal to the process group of the command.
+
+        :param sig: The signal. 0 only checks that the group exists.
+        :return: Whether the group exists.
+        """
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # The group is gone and its ID is used by another user
+            return False
+        return True
+
+
+# The watchdogs of the running commands, for `terminate_all`
+_watched = set()
+_watched_lock = threading.Lock()
+
+
+def terminate_all():
+    """Kill the process groups of all the commands being watched.
+    """
+    with _watched_lock:
+        watchdogs = list(_watched)
+    for watchdog in watchdogs:
+        watchdog.kill_group(signal.SIGKILL)
+
+
+def watch(process: subprocess.Popen, limits: ExperimentLimits | None,
+          files: list[str] | None = None,
+          progress: Callable[[], int] | None = None):
+    """Watch a command if it has limits.
+
+    :param process: The command.
+    :param limits: The limits, or None.
+    :param files: The files to watch for the stall timeout.
+    :param progress: The function that returns the size of the output. See
+        `Watchdog`.
+    :return: A `Watchdog`, or a context manager that does nothing if
+        `limits` is None.
+    """
+    if limits is None:
+        return contextlib.nullcontext()
+    return Watchdog(process, limits, files, progress)
@@ -0,0 +1,278 @@
+"""This module captures the output of the experiments into the log files.
+
+By default, `SimpleCommandRunner` connects the stdout of the child directly
+to the log file and leaves the stderr on the terminal. A `LogCapture` can
+also capture the stderr, either merged into the log file or in a separate
+file next to it (the log file name with `STDERR_SUFFIX`), compress the logs
+while they are written, and cap their size.
+
+When the output is compressed or capped, the child writes into a pipe, and
+a thread per stream copies it into the log file in chunks of `chunk_size`
+bytes. The memory used by a stream is bounded by the chunk size and the
+retained tail. The compressed logs keep their names; `open_log` (and so
+`experimentor.open_latest_track_log_file`) detects the compression from
+the first bytes of the file.
+
+Zstandard compression needs the optional `zstandard` package.
+"""
+
+import gzip
+import io
+import subprocess
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .ledger import wait_child
+from .limits import ExperimentLimits, watch
+
+# The suffix of the file that captures the stderr separately
+STDERR_SUFFIX = '.stderr'
+
+# The first bytes of the compressed files
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+
+class LogWriter:
+    """Write a stream of bytes to a log file, compressed and capped.
+
+    If `max_bytes` is given, only the first `max_bytes - tail_bytes` bytes
+    and the last `tail_bytes` bytes of the stream are kept, with a line
+    saying how many bytes are omitted in between. The sizes are counted
+    before the compression.
+    """
+    def __init__(self, path: str, compression: str | None = None,
+                 max_bytes: int | None = None, tail_bytes=0):
+        """Initialize the LogWriter object.
+
+        :param path: The path to the log file. It is overwritten.
+        :param compression: None, 'gzip' or 'zstd'.
+        :param max_bytes: The maximum number of bytes to keep. If None, the
+            whole stream is kept.
+        :param tail_bytes: The number of bytes at the end of the stream to
+            keep when the stream is longer than `max_bytes`.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if max_bytes is not None and not 0 <= tail_bytes <= max_bytes:
+            raise ValueError("tail_bytes must be between 0 and max_bytes")
+        self.max_bytes = max_bytes
+        self.tail_bytes = tail_bytes
+        self.head_left = None if max_bytes is None else max_bytes - tail_bytes
+        self.tail = bytearray()
+        self.omitted = 0
+        # The number of bytes written to the stream so far
+        self.received = 0
+        if compression == 'gzip':
+            self.file = gzip.open(path, 'wb', compresslevel=6)
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise ValueError("zstd compression needs the zstandard "
+                                 "package")
+            self.file = zstandard.ZstdCompressor().stream_writer(
+                open(path, 'wb'), closefd=True)
+        else:
+            self.file = open(path, 'wb')
+
+    def write(self, data: bytes):
+        self.received += len(data)
+        if self.head_left is None:
+            self.file.write(data)
+            return
+        if self.head_left > 0:
+            head = data[:self.head_left]
+            self.file.write(head)
+            self.head_left -= len(head)
+            data = data[len(head):]
+        if not data:
+            return
+        self.tail += data
+        if len(self.tail) > self.tail_bytes:
+            extra = len(self.tail) - self.tail_bytes
+            self.omitted += extra
+            del self.tail[:extra]
+
+    def close(self):
+        if self.omitted:
+            self.file.write(f'\n[... {self.omitted} bytes omitted ...]\n'
+                            .encode())
+        self.file.write(self.tail)
+        self.tail = bytearray()
+        self.file.close()
+
+
+class LogCapture:
+    """How to capture the output of a command into its log file.
+    """
+    def __init__(self, stderr: str | None = 'merge',
+                 compression: str | None = None,
+                 max_bytes: int | None = None, tail_bytes: int | None = None,
+                 chunk_size=64 * 1024):
+        """Initialize the LogCapture object.
+
+        :param stderr: 'merge' to write the stderr into the log file,
+            'separate' to write it into the log file name with
+            `STDERR_SUFFIX`, or None to leave it on the terminal.
+        :param compression: None, 'gzip' or 'zstd'.
+        :param max_bytes: The maximum number of bytes to keep of each stream
+            before the compression. If None, the whole output is kept.
+        :param tail_bytes: The number of bytes at the end of a stream to keep
+            when it is longer than `max_bytes`. By default, half of
+            `max_bytes`.
+        :param chunk_size: The number of bytes to read from the pipe at a
+            time.
+        """
+        if stderr not in ('merge', 'separate', None):
+            raise ValueError(f"Unknown stderr mode: {stderr}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        if tail_bytes is None:
+            tail_bytes = 0 if max_bytes is None else max_bytes // 2
+        self.stderr = stderr
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.tail_bytes = tail_bytes
+        self.chunk_size = chunk_size
+
+    def settings(self) -> dict:
+        """Get the settings that change the content of the log files.
+
+        :return: The settings, for example, for the key of the result cache.
+        """
+        return {'stderr': self.stderr, 'compression': self.compression,
+                'max_bytes': self.max_bytes, 'tail_bytes': self.tail_bytes}
+
+    def paths(self, file: str) -> list[str]:
+        """Get the paths of the files written for a log file.
+
+        :param file: The path to the log file.
+        :return: The log file, and the stderr file if the stderr is captured
+            separately.
+        """
+        if self.stderr == 'separate':
+            return [file, file + STDERR_SUFFIX]
+        return [file]
+
+    def run(self, args: str | list[str], file: str,
+            limits: ExperimentLimits | None = None, **kwargs) -> int:
+        """Run a command and capture its output into the log file.
+
+        :param args: The command, passed to `subprocess.Popen`.
+        :param file: The path to the log file.
+        :param limits: The limits of the command. `args` and `kwargs` must
+            be the ones returned by `limits.popen_args`. If a timeout
+            expires, an `experimentor.ExperimentTimeoutError` is raised.
+        :param kwargs: Other arguments of `subprocess.Popen`.
+        :return: The return code of the command.
+        """
+        paths = self.paths(file)
+        if self.compression is None and self.max_bytes is None:
+            # Nothing to do with the output, so the child writes directly
+            files = [open(path, 'wb') for path in paths]
+            try:
+                stderr = files[-1] if self.stderr is not None else None
+                process = subprocess.Popen(args, stdout=files[0],
+                                           stderr=stderr, **kwargs)
+                with watch(process, limits, paths):
+                    return wait_child(process)
+            finally:
+                for f in files:
+                    f.close()
+
+        stderr = {'merge': subprocess.STDOUT, 'separate': subprocess.PIPE,
+                  None: None}[self.stderr]
+        writers = []
+        try:
+            for path in paths:
+                writers.append(LogWriter(path, self.compression,
+                                         self.max_bytes, self.tail_bytes))
+            process = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                       stderr=stderr, **kwargs)
+            pipes = [process.stdout]
+            if self.stderr == 'separate':
+                pipes.append(process.stderr)
+            threads = [threading.Thread(target=self.pump, args=(pipe, writer))
+                       for pipe, writer in zip(pipes, writers)]
+            # The compressed log may not grow for a while, so the stall
+            # timeout watches the output read from the pipes
+            with watch(process, limits, progress=lambda: sum(
+                    writer.received for writer in writers)):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                return wait_child(process)
+        finally:
+            for writer in writers:
+                writer.close()
+
+    def pump(self, pipe, writer: LogWriter):
+        """Copy a pipe into a log writer until the end of the stream.
+
+        :param pipe: The pipe to read from.
+        :param writer: The writer to write to.
+        """
+        with pipe:
+            while chunk := pipe.read1(self.chunk_size):
+                writer.write(chunk)
+
+
+class GzipLogReader(gzip.GzipFile):
+    """Read a gzip-compressed log from a binary stream, and close the
+    stream together with the reader (`gzip.GzipFile` does not close a file
+    object it did not open).
+    """
+    def __init__(self, raw: io.BufferedIOBase):
+        super().__init__(fileobj=raw, mode='rb')
+        self.raw_file = raw
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.raw_file.close()
+
+
+def open_log(path: str, mode='r'):
+    """Open a log file, decompressing it if needed.
+
+    :param path: The path to the log file.
+    :param mode: 'r' for text or 'rb' for bytes.
+    :return: The file object.
+    """
+    return wrap_log(open(path, 'rb'), mode)
+
+
+def wrap_log(raw: io.BufferedIOBase, mode='r'):
+    """Wrap a binary stream of a log, decompressing it if needed.
+
+    :param raw: The binary stream. It must support `peek`, like the files
+        opened with 'rb' or `io.BufferedReader`. It is closed together with
+        the returned object.
+    :param mode: 'r' for text or 'rb' for bytes.
+    :return: The file object.
+    """
+    if mode not in ('r', 'rb'):
+        raw.close()
+        raise ValueError(f"Invalid mode: {mode}")
+    magic = raw.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        stream = GzipLogReader(raw)
+    elif magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raw.close()
+            raise ValueError("Reading a zstd log needs the zstandard package")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    else:
+        stream = raw
+    if mode == 'rb':
+        return stream
+    return io.TextIOWrapper(stream)
@@ -0,0 +1,187 @@
+"""This module orders the configurations by their predicted runtime.
+
+When the configurations run in parallel in the order of the axes, the
+slowest ones often come last, and most of the workers are idle while they
+finish. Starting the longest configurations first (the
+longest-processing-time-first rule) keeps the workers busy until the end,
+and finishes the sweep sooner.
+
+The runtime of a configuration is predicted, in this order:
+1. By the cost function given by the user, if any.
+2. From the previous runs of the same title in the run ledger of the log
+   directory (see `experimentor.RunLedger`): the median wall time of its
+   successful trials.
+3. By a per-axis regression fitted on the configurations of the sweep that
+   have run before: the logarithm of the runtime is modeled as the sum of an
+   effect for every key and value of the configuration, so a new
+   combination of known values gets a prediction.
+4. Otherwise, the median of the other predictions, or 1 if nothing is
+   known.
+"""
+
+import json
+import math
+import os
+import statistics
+from collections.abc import Callable, Iterable
+
+from .ledger import LEDGER_FILE
+
+# The number of passes to fit the per-axis regression
+FIT_ITERATIONS = 10
+
+
+class RuntimePredictor:
+    """Predict the runtime of the configurations.
+
+    Call `fit` with the configurations of the sweep before `predict`, so
+    the per-axis regression is fitted.
+    """
+    def __init__(self, history: dict[str, float] | None = None,
+                 cost: Callable[[str, dict], float | None] | None = None):
+        """Initialize the RuntimePredictor object.
+
+        :param history: The known runtime in seconds of each title.
+        :param cost: A function that takes the title and the configuration
+            and returns the predicted runtime (in any unit, as long as it is
+            the same for all the configurations), or None if it does not
+            know.
+        """
+        self.history = dict(history or {})
+        self.cost = cost
+        self.mean = None
+        self.effects = {}
+
+    @classmethod
+    def from_log_dir(cls, log_dir: str,
+                     cost: Callable[[str, dict], float | None] | None = None
+                     ) -> 'RuntimePredictor':
+        """Create a predictor from the run ledger of a log directory.
+
+        :param log_dir: The log directory. If it has no ledger, nothing is
+            known from the history.
+        :param cost: The cost function. See `__init__`.
+        :return: The predictor.
+        """
+        return cls(read_history(os.path.join(log_dir, LEDGER_FILE)), cost)
+
+    def fit(self, configs: Iterable[tuple[str, dict]]):
+        """Fit the per-axis regression on the configurations with a known
+        runtime.
+
+        :param configs: The (title, config) pairs of the sweep.
+        """
+        rows = []
+        for title, config in configs:
+            runtime = self.history.get(title)
+            if runtime is not None and runtime > 0:
+                rows.append((features(config), math.log(runtime)))
+        self.mean = None
+        self.effects = {}
+        if not rows:
+            return
+        self.mean = statistics.fmean(y for _, y in rows)
+        keys = sorted({key for row, _ in rows for key in row})
+        # The sum of the effects of every row, updated one key at a time
+        # (backfitting), so the effects of correlated axes do not overshoot
+        sums = [0.0] * len(rows)
+        for _ in range(FIT_ITERATIONS):
+            for key in keys:
+                totals = {}
+                for i, (row, y) in enumerate(rows):
+                    value = row.get(key)
+                    if value is None:
+                        continue
+                    feature = (key, value)
+                    residual = (y - self.mean - sums[i]
+                                + self.effects.get(feature, 0.0))
+                    total = totals.setdefault(feature, [0.0, 0])
+                    total[0] += residual
+                    total[1] += 1
+                effects = {feature: total / n
+                           for feature, (total, n) in totals.items()}
+                for i, (row, _) in enumerate(rows):
+                    value = row.get(key)
+                    if value is None:
+                        continue
+                    feature = (key, value)
+                    sums[i] += effects[feature] - self.effects.get(feature, 0.0)
+                self.effects.update(effects)
+
+    def predict(self, title: str, config: dict) -> float | None:
+        """Predict the runtime of a configuration.
+
+        :param title: The title of the configuration.
+        :param config: The configuration.
+        :return: The predicted runtime, or None if nothing is known.
+        """
+        if self.cost is not None:
+            runtime = self.cost(title, config)
+            if runtime is not None:
+                return runtime
+        runtime = self.history.get(title)
+        if runtime is not None:
+            return runtime
+        if self.mean is None:
+            return None
+        log_runtime = self.mean
+        for feature in features(config).items():
+            log_runtime += self.effects.get(feature, 0.0)
+        return math.exp(log_runtime)
+
+    def order(self, configs: Iterable[tuple[str, dict]]
+              ) -> tuple[list[tuple[str, dict]], dict[str, float]]:
+        """Order the configurations from the longest predicted runtime.
+
+        :param configs: The (title, config) pairs. They are all loaded.
+        :return: The ordered (title, config) pairs, and the predicted
+            runtime of each title. The configurations with the same
+            prediction keep their order.
+        """
+        configs = list(configs)
+        self.fit(configs)
+        predictions = [self.predict(title, config) for title, config in configs]
+        known = [runtime for runtime in predictions if runtime is not None]
+        default = statistics.median(known) if known else 1.0
+        weights = {}
+        for (title, _), runtime in zip(configs, predictions):
+            weights[title] = default if runtime is None else max(runtime, 0.0)
+        ordered = sorted(configs, key=lambda item: -weights[item[0]])
+        return ordered, weights
+
+
+def features(config: dict) -> dict:
+    return {key: value_key(value) for key, value in config.items()}
+
+
+def value_key(value) -> str:
+    try:
+        return json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def read_history(path: str) -> dict[str, float]:
+    """Read the runtimes of the previous runs from a run ledger.
+
+    :param path: The path to the ledger.
+    :return: The median wall time of the successful trials of each title.
+        Empty if the ledger does not exist.
+    """
+    walls = {}
+    try:
+        f = open(path, 'r')
+    except FileNotFoundError:
+        return {}
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record['successful'] and record['wall'] is not None:
+                    walls.setdefault(record['title'], []).append(
+                        record['wall'])
+            except (ValueError, KeyError, TypeError):
+                # Broken lines, for example, the last line written by a
+                # crashed process
+                continue
+    return {title: statistics.median(values) for title, values in walls.items()}
@@ -0,0 +1,303 @@
+"""This module compiles a sweep into a binary plan file.
+
+Every process of a sweep that reads the JSON configuration parses all of
+it, and problems such as a key on two axes are only found when the
+configurations are created. `compile_plan` (or `experimentor plan`)
+validates the configuration once and writes a plan that the processes open
+with `mmap`: the pages are shared by all the processes on a machine
+through the page cache, and a configuration is decoded only when it is
+used.
+
+The plan is laid out as follows, with all integers little-endian:
+
+- The header (`HEADER`): the magic bytes, the format version, the number of
+  axes, the number of configurations and the offset of the hash table.
+- The axis directory (`AXIS_ENTRY` for each axis): the number of choices,
+  the offset of the offset table of the axis, and the offset and the length
+  of the JSON list of the keys of the axis.
+- For each axis, the offset table: the offsets (uint64) of the choices, plus
+  the end of the last one. Choice `i` is the UTF-8 JSON array
+  `[title, key, value]` between offsets `i` and `i + 1`. A choice whose key
+  or value would come back from JSON as a different value (a tuple, which
+  comes back as a list, or a dictionary with keys that are not strings) is
+  rejected when the plan is compiled, so a plan always gives the same
+  configurations as the configuration it was compiled from.
+- The hash table: an 8-byte BLAKE2b hash of every configuration (of its
+  JSON with sorted keys, see `config_hash`), in the order of the sweep. Equal configurations
+  have equal hashes, even in different sweeps.
+"""
+
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+import uuid
+
+from .axes import Axis
+from .configure_production import ConfigureIterable
+
+PLAN_MAGIC = b'EXPPLAN\x00'
+PLAN_VERSION = 1
+
+# magic, version, number of axes, number of configurations, hash offset
+HEADER = struct.Struct('<8sIIQQ')
+# number of choices, offset table offset, keys offset, keys length
+AXIS_ENTRY = struct.Struct('<QQQQ')
+OFFSET = struct.Struct('<Q')
+HASH_SIZE = 8
+
+# The number of decoded choices kept for each axis
+CHOICE_CACHE_SIZE = 4096
+
+# The number of hashes written at a time
+HASH_CHUNK = 65536
+
+
+def compile_plan(config: list | ConfigureIterable, path: str) -> int:
+    """Validate a configuration and write it as a plan file.
+
+    The plan is written to a temporary file and renamed, so a process never
+    opens a partial plan.
+
+    :param config: The configuration list, or a `ConfigureIterable` object
+        without constraints.
+    :param path: The path to the plan file.
+    :return: The number of configurations.
+    """
+    if not isinstance(config, ConfigureIterable):
+        config = ConfigureIterable(config)
+    if config.constraints:
+        raise ValueError("A plan cannot be compiled with constraints")
+    if not config.bounded:
+        raise ValueError("A plan needs a known number of configurations")
+    if config.indices != range(len(config.indices)):
+        # A slice or a shard: compile the whole sweep, which can be sliced
+        # again when the plan is opened
+        raise ValueError("A plan is compiled from the whole configuration")
+    total = len(config)
+
+    temp_path = f'{path}.{uuid.uuid4().hex}'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(bytes(HEADER.size + AXIS_ENTRY.size * config.length))
+            entries = []
+            for position, axis in enumerate(config.axes):
+                entries.append(write_axis(f, axis, position))
+            hash_offset = f.tell()
+            hashes = bytearray()
+            for _, conf in config:
+                hashes += config_hash(conf)
+                if len(hashes) >= HASH_CHUNK * HASH_SIZE:
+                    f.write(hashes)
+                    hashes.clear()
+            f.write(hashes)
+            f.seek(0)
+            f.write(HEADER.pack(PLAN_MAGIC, PLAN_VERSION, config.length,
+                                total, hash_offset))
+            for entry in entries:
+                f.write(AXIS_ENTRY.pack(*entry))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return total
+
+
+def write_axis(f, axis: Axis, position: int) -> tuple[int, int, int, int]:
+    """Write the choices of an axis at the end of the plan.
+
+    :param f: The plan file.
+    :param axis: The axis.
+    :param position: The index of the axis, for the error messages.
+    :return: The entry of the axis in the axis directory.
+    """
+    choices = []
+    keys = {}
+    for index in range(axis.length):
+        title, key, value = axis.item(index)
+        try:
+            data = json.dumps([title, key, value])
+            keys[json.dumps(key)] = key
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Choice {title} of axis {position} cannot be "
+                             f"stored in a plan: {e}")
+        _, loaded_key, loaded_value = json.loads(data)
+        if not (same_json(key, loaded_key)
+                and same_json(value, loaded_value)):
+            raise ValueError(f"Choice {title} of axis {position} cannot be "
+                             f"stored in a plan: {key!r}: {value!r} changes "
+                             f"when it is read back from JSON")
+        choices.append(data.encode())
+    keys_data = json.dumps(list(keys.values())).encode()
+    keys_offset = f.tell()
+    f.write(keys_data)
+    table_offset = f.tell()
+    offset = table_offset + OFFSET.size * (len(choices) + 1)
+    table = bytearray()
+    for choice in choices:
+        table += OFFSET.pack(offset)
+        offset += len(choice)
+    table += OFFSET.pack(offset)
+    f.write(table)
+    for choice in choices:
+        f.write(choice)
+    return len(choices), table_offset, keys_offset, len(keys_data)
+
+
+def same_json(value, loaded) -> bool:
+    """Check whether a value came back unchanged from JSON.
+
+    The types are compared as well, so a tuple that came back as a list, or
+    a dictionary whose keys came back as strings, is not the same.
+
+    :param value: The original value.
+    :param loaded: The value decoded from the JSON of `value`.
+    :return: Whether they are the same.
+    """
+    if type(value) is not type(loaded):
+        return False
+    if isinstance(value, dict):
+        return (list(value) == list(loaded)
+                and all(same_json(value[key], loaded[key]) for key in value))
+    if isinstance(value, list):
+        return (len(value) == len(loaded)
+                and all(same_json(a, b) for a, b in zip(value, loaded)))
+    if isinstance(value, float) and value != value:
+        # NaN is written as NaN and is never equal to itself
+        return loaded != loaded
+    return value == loaded
+
+
+def config_hash(config: dict) -> bytes:
+    """Hash a configuration.
+
+    :param config: The configuration.
+    :return: The 8-byte hash of its JSON with sorted keys. If the keys of a
+        dictionary cannot be sorted (for example, int and str keys), the
+        JSON of `canonical(config)` is hashed instead.
+    """
+    try:
+        data = json.dumps(config, sort_keys=True)
+    except TypeError:
+        data = json.dumps(canonical(config))
+    return hashlib.blake2b(data.encode(), digest_size=HASH_SIZE).digest()
+
+
+def canonical(value):
+    """Turn the dictionaries in a value into lists of key-value pairs
+    sorted by the JSON of the keys, so keys of any types can be sorted.
+
+    :param value: The value.
+    :return: The value with the dictionaries replaced.
+    """
+    if isinstance(value, dict):
+        return sorted([json.dumps(key), canonical(item)]
+                      for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    return value
+
+
+class PlanAxis(Axis):
+    """An axis whose choices are read from a memory-mapped plan.
+    """
+    def __init__(self, buffer: mmap.mmap, length: int, table_offset: int,
+                 keys: list):
+        self.buffer = buffer
+        self.length = length
+        self.table_offset = table_offset
+        self.keys = keys
+        self.item = functools.lru_cache(CHOICE_CACHE_SIZE)(self.load_item)
+
+    def known_keys(self) -> list:
+        return self.keys
+
+    def load_item(self, index: int) -> tuple[str, object, object]:
+        if not 0 <= index < self.length:
+            raise IndexError("axis index out of range")
+        start, end = struct.unpack_from(
+            '<QQ', self.buffer, self.table_offset + OFFSET.size * index)
+        title, key, value = json.loads(self.buffer[start:end])
+        return title, key, value
+
+
+class SweepPlan:
+    """A plan file opened with `mmap`.
+
+    `configs` gives the configurations as a `ConfigureIterable`, which can
+    be sliced and sharded as usual. Opening a plan only reads the header
+    and the keys of the axes.
+    """
+    def __init__(self, path: str):
+        """Open a plan file.
+
+        :param path: The path to the plan file.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.buffer) < HEADER.size:
+                raise ValueError(f"{path} is not a plan file")
+            magic, version, num_axes, self.total, self.hash_offset = \
+                HEADER.unpack_from(self.buffer)
+            if magic != PLAN_MAGIC:
+                raise ValueError(f"{path} is not a plan file")
+            if version != PLAN_VERSION:
+                raise ValueError(f"Unsupported plan version: {version}")
+            if self.hash_offset + self.total * HASH_SIZE > len(self.buffer):
+                raise ValueError(f"{path} is truncated")
+            self.axes = []
+            for position in range(num_axes):
+                length, table_offset, keys_offset, keys_length = \
+                    AXIS_ENTRY.unpack_from(
+                        self.buffer, HEADER.size + AXIS_ENTRY.size * position)
+                keys = json.loads(
+                    self.buffer[keys_offset:keys_offset + keys_length])
+                self.axes.append(PlanAxis(self.buffer, length, table_offset,
+                                          keys))
+        except BaseException:
+            self.buffer.close()
+            raise
+
+    def __len__(self):
+        return self.total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the memory map.
+        """
+        self.axes = []
+        self.buffer.close()
+
+    def configs(self, start_index=0, stop_index: int | None = None
+                ) -> ConfigureIterable:
+        """Get the configurations of the plan.
+
+        :param start_index: The index of the first configuration.
+        :param stop_index: The index after the last configuration. If None,
+            all the configurations after `start_index` are used.
+        :return: The configurations.
+        """
+        return ConfigureIterable(self.axes, start_index, stop_index)
+
+    def config_hash(self, index: int) -> bytes:
+        """Get the hash of a configuration.
+
+        :param index: The index of the configuration in the sweep.
+        :return: The 8-byte hash. See `config_hash`.
+        """
+        if not 0 <= index < self.total:
+            raise IndexError("configuration index out of range")
+        offset = self.hash_offset + HASH_SIZE * index
+        return self.buffer[offset:offset + HASH_SIZE]
@@ -0,0 +1,197 @@
+"""This module provides a content-addressed cache of experiment outputs.
+
+The key of an entry is the hash of the command line of the experiment (the
+base command and every argument generated from the configuration values),
+and optionally the hash of the executable and the settings of the log
+capture. If an experiment with the same key has succeeded before, in any
+sweep or log directory, its output is copied to the new log files instead
+of running the experiment again.
+
+An entry has one file per output file of the experiment: the log file is
+stored as the key, and the other files (such as the stderr captured
+separately) as the key with '-1', '-2' and so on. They are evicted
+together.
+
+The cache directory is bounded by a disk budget. When it is exceeded, the
+least recently used entries are removed. Several processes can share a
+cache directory; each of them keeps its own view of the sizes, so the
+budget is only approximate in this case.
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+import shlex
+import shutil
+import threading
+import uuid
+
+from .const import DEFAULT_CACHE_SIZE
+
+
+class ResultCache:
+    """A content-addressed cache of experiment outputs with LRU eviction.
+    """
+    def __init__(self, cache_dir: str, max_bytes=DEFAULT_CACHE_SIZE):
+        """Initialize the ResultCache object.
+
+        The cache directory is scanned once to find the existing entries.
+
+        :param cache_dir: The directory to store the outputs.
+        :param max_bytes: The maximum total size of the outputs in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self._lock = threading.Lock()
+        self._executables = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        found = {}
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    key = entry.name.split('-')[0]
+                    mtime, size = found.get(key, (0, 0))
+                    found[key] = (max(mtime, stat.st_mtime),
+                                  size + stat.st_size)
+        for key, (_, size) in sorted(found.items(),
+                                     key=lambda item: item[1][0]):
+            self.entries[key] = size
+            self.size += size
+        with self._lock:
+            evicted = self._evict()
+        self._remove(evicted)
+
+    def key(self, arguments: list[str], executable_hash: str | None = None,
+            capture: dict | None = None) -> str:
+        """Compute the key of an experiment.
+
+        :param arguments: The command line of the experiment, including the
+            base command.
+        :param executable_hash: The hash of the executable, if any.
+        :param capture: The settings of the log capture (see
+            `experimentor.LogCapture.settings`), if any. The outputs
+            captured differently are not shared.
+        :return: The key.
+        """
+        key = [arguments, executable_hash]
+        if capture is not None:
+            key.append(capture)
+        content = json.dumps(key, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def executable_hash(self, command: str) -> str | None:
+        """Hash the executable of a command.
+
+        The hash is kept until the size or the modification time of the
+        executable changes.
+
+        :param command: The command. The first word is the executable.
+        :return: The hash of the executable, or None if it cannot be found.
+        """
+        words = shlex.split(command)
+        path = shutil.which(words[0]) if words else None
+        if path is None:
+            return None
+        stat = os.stat(path)
+        signature = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if signature in self._executables:
+                return self._executables[signature]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        with self._lock:
+            self._executables[signature] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def entry_paths(self, key: str, count: int) -> list[str]:
+        """Get the paths of the files of an entry.
+
+        :param key: The key of the entry.
+        :param count: The number of files.
+        :return: The paths.
+        """
+        return [os.path.join(self.cache_dir, key if i == 0 else f'{key}-{i}')
+                for i in range(count)]
+
+    def get(self, key: str, files: str | list[str]) -> bool:
+        """Copy the cached output to the files if there is one.
+
+        :param key: The key of the experiment.
+        :param files: The file, or the files, to copy the output to.
+        :return: Whether the output is found.
+        """
+        if isinstance(files, str):
+            files = [files]
+        paths = self.entry_paths(key, len(files))
+        try:
+            for path, file in zip(paths, files):
+                shutil.copyfile(path, file)
+            os.utime(paths[0])
+        except FileNotFoundError:
+            with self._lock:
+                if key in self.entries:
+                    self.size -= self.entries.pop(key)
+            return False
+        with self._lock:
+            if key not in self.entries:
+                size = sum(os.path.getsize(file) for file in files)
+                self.entries[key] = size
+                self.size += size
+            self.entries.move_to_end(key)
+        return True
+
+    def put(self, key: str, files: str | list[str]):
+        """Store the output of an experiment.
+
+        :param key: The key of the experiment.
+        :param files: The file, or the files, that have the output.
+        """
+        if isinstance(files, str):
+            files = [files]
+        size = sum(os.path.getsize(file) for file in files)
+        if size > self.max_bytes:
+            return
+        # The log file goes last, so the entry is complete once it exists
+        paths = self.entry_paths(key, len(files))
+        for path, file in reversed(list(zip(paths, files))):
+            temp_path = os.path.join(self.cache_dir,
+                                     f'.{key}.{uuid.uuid4().hex}')
+            shutil.copyfile(file, temp_path)
+            os.replace(temp_path, path)
+        with self._lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)
+            self.entries[key] = size
+            self.size += size
+            evicted = self._evict()
+        self._remove(evicted)
+
+    def _evict(self) -> list[str]:
+        # Must be called with the lock held
+        evicted = []
+        while self.size > self.max_bytes:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            evicted.append(key)
+        return evicted
+
+    def _remove(self, keys: list[str]):
+        for key in keys:
+            # The log file first, so the entry is not found while its other
+            # files are removed
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+            for i in itertools.count(1):
+                try:
+                    os.remove(os.path.join(self.cache_dir, f'{key}-{i}'))
+                except FileNotFoundError:
+                    break
@@ -0,0 +1,135 @@
+"""This module schedules experiments according to the resources they need.
+
+Each experiment can declare the number of CPU cores and the amount of memory
+it needs with a `Resources` object (see
+`experimentor.BaseExperimentRunner.get_resources`). The `ResourceScheduler`
+keeps track of the resources used by the running experiments, and only
+allows a new experiment to start if it fits into the remaining capacity of
+the machine. By default, the capacity is the number of cores available to
+this process and the available memory reported by `/proc/meminfo`.
+"""
+
+import os
+import threading
+
+
+class Resources:
+    """The resources needed by an experiment (or provided by a machine).
+    """
+    def __init__(self, cpus: int = 1, memory: int | None = 0):
+        """Initialize the Resources object.
+
+        :param cpus: The number of CPU cores. Must be at least 1.
+        :param memory: The amount of memory in bytes. None means unknown,
+            which is only meaningful for the capacity of a machine.
+        """
+        if cpus < 1:
+            raise ValueError("cpus must be at least 1")
+        if memory is not None and memory < 0:
+            raise ValueError("memory must not be negative")
+        self.cpus = cpus
+        self.memory = memory
+
+    def __repr__(self):
+        return f'Resources(cpus={self.cpus}, memory={self.memory})'
+
+
+def machine_resources() -> Resources:
+    """Get the resources of this machine.
+
+    The number of cores is the number of cores this process is allowed to
+    run on. The memory is `MemAvailable` in `/proc/meminfo` (or `MemTotal` if
+    the former is missing). If `/proc/meminfo` cannot be read, the memory is
+    None and will not be taken into account.
+
+    :return: The resources of this machine.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    return Resources(cpus, _read_meminfo())
+
+
+def _read_meminfo() -> int | None:
+    try:
+        with open('/proc/meminfo') as f:
+            fields = {}
+            for line in f:
+                key, _, value = line.partition(':')
+                fields[key] = value.split()
+    except OSError:
+        return None
+    for key in ('MemAvailable', 'MemTotal'):
+        if key in fields:
+            value, *unit = fields[key]
+            return int(value) * 1024 if unit == ['kB'] else int(value)
+    return None
+
+
+class ResourceScheduler:
+    """Keep track of the resources used by the running experiments.
+
+    An experiment must acquire its resources before it starts and release
+    them after it finishes. An experiment that needs more than the total
+    capacity is still allowed to run, but only when nothing else is
+    running. This object is thread-safe and can be shared by several
+    `experimentor.Experimentor` objects.
+    """
+    def __init__(self, capacity: Resources | None = None):
+        """Initialize the ResourceScheduler object.
+
+        :param capacity: The resources that can be used by the experiments.
+            If None, the resources of this machine are used.
+        """
+        self.capacity = machine_resources() if capacity is None else capacity
+        self.used_cpus = 0
+        self.used_memory = 0
+        self.running = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, resources: Resources) -> bool:
+        if self.running == 0:
+            return True
+        if self.used_cpus + resources.cpus > self.capacity.cpus:
+            return False
+        if self.capacity.memory is not None and resources.memory is not None:
+            if self.used_memory + resources.memory > self.capacity.memory:
+                return False
+        return True
+
+    def try_acquire(self, resources: Resources) -> bool:
+        """Acquire the resources if they are available now.
+
+        :param resources: The resources needed by the experiment.
+        :return: Whether the resources are acquired.
+        """
+        with self._condition:
+            if not self._fits(resources):
+                return False
+            self.used_cpus += resources.cpus
+            self.used_memory += resources.memory or 0
+            self.running += 1
+            return True
+
+    def acquire(self, resources: Resources):
+        """Wait until the resources are available and acquire them.
+
+        :param resources: The resources needed by the experiment.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(resources))
+            self.used_cpus += resources.cpus
+            self.used_memory += resources.memory or 0
+            self.running += 1
+
+    def release(self, resources: Resources):
+        """Release the resources acquired by an experiment.
+
+        :param resources: The resources acquired by the experiment.
+        """
+        with self._condition:
+            self.used_cpus -= resources.cpus
+            self.used_memory -= resources.memory or 0
+            self.running -= 1
+            self._condition.notify_all()
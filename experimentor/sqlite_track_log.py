@@ -0,0 +1,240 @@
+"""This module stores the logs of a sweep in a single SQLite database.
+
+`TrackLog` creates a directory and at least one file per experiment, which
+is slow to list and to delete for very large sweeps. `SqliteTrackLog` keeps
+every run (the title, the trial number, the state, the start and end times
+and the error) and its output in 'logs.sqlite3' in the root directory.
+
+The runners still write to a file: each run gets a spool file in the
+'spool' directory, and when the run finishes, the file (and the stderr
+captured separately, see `experimentor.LogCapture`) is copied into the
+database in chunks and removed. So only the running experiments have files.
+
+The database is in WAL mode, so several processes (for example, the
+workers of a distributed sweep) can share it: the readers never block, and
+the writers wait for each other.
+"""
+
+import datetime
+import io
+import itertools
+import os
+import sqlite3
+import threading
+import uuid
+
+from .journal import STARTED, SUCCEEDED, FAILED
+from .log_capture import STDERR_SUFFIX, wrap_log
+from .track_log import BaseTrackLog
+
+DATABASE_FILE = 'logs.sqlite3'
+SPOOL_DIR = 'spool'
+
+# The size of the chunks of the outputs stored in the database
+CHUNK_SIZE = 1024 * 1024
+
+# Seconds to wait for the other writers
+BUSY_TIMEOUT = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_title ON runs (title, id);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state, title);
+CREATE TABLE IF NOT EXISTS chunks (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    stream TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, stream, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteTrackLog(BaseTrackLog):
+    """Track the logs of the experiments in an SQLite database.
+
+    The states are recorded in the `runs` table, so `skip_if_exists` skips
+    only the experiments that have succeeded, like `TrackLog` with the
+    journal.
+    """
+    def __init__(self, root_dir: str):
+        """Initialize the SqliteTrackLog object.
+
+        The database and the spool directory are created if they do not
+        exist.
+
+        :param root_dir: The directory to store the database in.
+        """
+        super().__init__()
+        self.root_dir = root_dir
+        self.path = os.path.join(root_dir, DATABASE_FILE)
+        self.spool_dir = os.path.join(root_dir, SPOOL_DIR)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.spool_files = {}
+        self.run_ids = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            connection.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread.
+
+        :return: The connection.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                         isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def add_log_file(self, name: str, skip_if_exists: bool) -> str | None:
+        """Add a spool file for the experiment with the given name.
+
+        :param name: The name of the experiment.
+        :param skip_if_exists: Skip the experiment if it has succeeded.
+        :return: If the experiment should run, return the path to the spool
+            file. Otherwise, return None.
+        """
+        if skip_if_exists and self.is_finished(name):
+            return None
+        file_path = os.path.join(self.spool_dir, f'{uuid.uuid4().hex}.log')
+        with open(file_path, 'x'):
+            pass
+        with self._lock:
+            self.spool_files[name] = file_path
+        return file_path
+
+    def is_finished(self, name: str) -> bool:
+        """Check whether the experiment has succeeded.
+
+        :param name: The name of the experiment.
+        :return: Whether the experiment has succeeded.
+        """
+        row = self.connection().execute(
+            'SELECT 1 FROM runs WHERE state = ? AND title = ? LIMIT 1',
+            (SUCCEEDED, name)).fetchone()
+        return row is not None
+
+    def experiment_started(self, name: str, trial: int):
+        cursor = self.connection().execute(
+            'INSERT INTO runs (title, trial, state, started) '
+            'VALUES (?, ?, ?, ?)', (name, trial, STARTED, now()))
+        with self._lock:
+            self.run_ids[name] = cursor.lastrowid
+
+    def experiment_finished(self, name: str, trial: int,
+                            error: Exception | None = None):
+        with self._lock:
+            run_id = self.run_ids.pop(name, None)
+            file_path = self.spool_files.pop(name, None)
+        if run_id is None:
+            return
+        state = SUCCEEDED if error is None else FAILED
+        reason = None if error is None else str(error)
+        connection = self.connection()
+        paths = []
+        if file_path is not None:
+            paths = [('stdout', file_path),
+                     ('stderr', file_path + STDERR_SUFFIX)]
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            for stream, path in paths:
+                try:
+                    f = open(path, 'rb')
+                except FileNotFoundError:
+                    continue
+                with f:
+                    for seq in itertools.count():
+                        data = f.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        connection.execute(
+                            'INSERT INTO chunks (run_id, stream, seq, data) '
+                            'VALUES (?, ?, ?, ?)', (run_id, stream, seq, data))
+            connection.execute(
+                'UPDATE runs SET state = ?, finished = ?, error = ? '
+                'WHERE id = ?', (state, now(), reason, run_id))
+        for _, path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_latest_run(self, name: str) -> int | None:
+        """Get the latest run of the experiment with the given name.
+
+        :param name: The name of the experiment.
+        :return: The ID of the run, or None if the experiment has not run.
+        """
+        row = self.connection().execute(
+            'SELECT id FROM runs WHERE title = ? ORDER BY id DESC LIMIT 1',
+            (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def read_log(self, run_id: int, stream='stdout') -> bytes:
+        """Read the output of a run as it was written.
+
+        :param run_id: The ID of the run.
+        :param stream: 'stdout', or 'stderr' if it was captured separately.
+        :return: The output. It may be compressed (see `open_latest_log_file`).
+        """
+        rows = self.connection().execute(
+            'SELECT data FROM chunks WHERE run_id = ? AND stream = ? '
+            'ORDER BY seq', (run_id, stream))
+        return b''.join(row[0] for row in rows)
+
+    def open_latest_log_file(self, name: str, stream='stdout'):
+        """Open the output of the latest run of the experiment.
+
+        A compressed output is decompressed transparently.
+
+        :param name: The name of the experiment.
+        :param stream: 'stdout', or 'stderr' if it was captured separately.
+        :return: If the experiment has not run, raise a ValueError.
+            Otherwise, return the file object.
+        """
+        run_id = self.get_latest_run(name)
+        if run_id is None:
+            raise ValueError("No log for the experiment")
+        data = self.read_log(run_id, stream)
+        return wrap_log(io.BufferedReader(io.BytesIO(data)))
+
+    def runs(self, state: str | None = None) -> list[tuple]:
+        """List the runs.
+
+        :param state: Only list the runs in this state ('started',
+            'succeeded' or 'failed'). If None, list all the runs.
+        :return: The runs, as (id, title, trial, state, started, finished,
+            error) tuples in the order they started.
+        """
+        query = ('SELECT id, title, trial, state, started, finished, error '
+                 'FROM runs')
+        if state is None:
+            return self.connection().execute(query + ' ORDER BY id').fetchall()
+        return self.connection().execute(query + ' WHERE state = ? ORDER BY id',
+                                         (state,)).fetchall()
+
+    def close(self):
+        """Close the connection of the current thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def now() -> str:
+    return datetime.datetime.now(datetime.UTC).isoformat()
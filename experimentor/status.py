@@ -0,0 +1,310 @@
+"""This module reports how far a sweep is from its log directory.
+
+The status of a sweep is computed from three sources:
+
+- The journal of `TrackLog` (or the database of `SqliteTrackLog`) gives the
+  state of every experiment that has started.
+- For the experiments not in the journal (for example, in a log directory
+  created before the journal was introduced), an experiment is done if its
+  directory has a log file.
+- The configurations give the titles that are expected.
+
+Listing the directories of a large sweep one at a time is slow, so only
+the directories of the experiments without records in the journal are
+checked, in parallel, and the result is cached together with the states
+from the journal. On the next run, only the directories whose modification
+time has changed are listed again, and only the records appended to the
+journal since the last run are read.
+
+The cached index is kept in the cache directory of the user (see
+`index_path`), not in the log directory, so a status query never writes to
+the log directory, which may be read-only or shared. If the index cannot be
+written, it is simply not cached.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+
+from .configure_production import ConfigureIterable
+from .journal import CompletionJournal, STARTED, SUCCEEDED, FAILED
+from .sqlite_track_log import DATABASE_FILE, SPOOL_DIR
+from .track_log import JOURNAL_FILE, LEASE_DIR, latest_log_name
+
+# The directory of the cached indexes in the cache directory of the user
+STATUS_CACHE_DIR = os.path.join('experimentor', 'status')
+
+# The version of the index format. An index of another version is rebuilt.
+INDEX_VERSION = 1
+
+# The states of the experiments in a status report
+DONE = 'done'
+MISSING = 'missing'
+STATES = (DONE, FAILED, STARTED, MISSING)
+
+
+class StatusIndex:
+    """The cached index of a log directory.
+
+    `dirs` maps the title of each experiment directory to its modification
+    time (in nanoseconds) and the name of its latest log file (or None).
+    `states` is the journal loaded up to `journal_offset`.
+    """
+    def __init__(self, root_dir: str, load=True, path: str | None = None):
+        """Load the index of a log directory if there is one.
+
+        :param root_dir: The log directory.
+        :param load: Whether to load the index. If False, the index starts
+            empty.
+        :param path: The path to the index file. By default, the one given
+            by `index_path`.
+        """
+        self.root_dir = root_dir
+        self.path = index_path(root_dir) if path is None else path
+        self.dirs = {}
+        self.states = {}
+        self.journal_offset = 0
+        self.journal_size = 0
+        self.changed = True
+        if not load:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                self.dirs = index['dirs']
+                self.states = index['states']
+                self.journal_offset = index['journal_offset']
+                self.journal_size = index['journal_size']
+                self.changed = False
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def refresh(self, max_workers=8, titles: list[str] | None = None):
+        """Bring the index up to date with the log directory.
+
+        The journal is always refreshed first.
+
+        :param max_workers: The number of threads to list the directories.
+        :param titles: Only refresh the directories of these experiments.
+            If None, the whole log directory is walked.
+        """
+        self.refresh_journal()
+        if titles is None:
+            with os.scandir(self.root_dir) as entries:
+                titles = [entry.name for entry in entries
+                          if entry.is_dir()
+                          and entry.name not in (SPOOL_DIR, LEASE_DIR)]
+            removed = self.dirs.keys() - set(titles)
+            for title in removed:
+                del self.dirs[title]
+            self.changed = self.changed or bool(removed)
+
+        def scan(batch):
+            results = []
+            for title in batch:
+                subdir = os.path.join(self.root_dir, title)
+                try:
+                    mtime = os.stat(subdir).st_mtime_ns
+                except (FileNotFoundError, NotADirectoryError):
+                    results.append((title, None))
+                    continue
+                cached = self.dirs.get(title)
+                if cached is None or cached[0] != mtime:
+                    cached = [mtime, latest_log_name(subdir)]
+                results.append((title, cached))
+            return results
+
+        if not titles:
+            return
+        # Imported here, as it is slow to import and most runs only read the
+        # journal
+        import concurrent.futures
+
+        # A task per directory costs more than the stat itself
+        size = max(1, -(-len(titles) // (max_workers * 4)))
+        batches = [titles[i:i + size] for i in range(0, len(titles), size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            for results in executor.map(scan, batches):
+                for title, value in results:
+                    if value is None:
+                        if self.dirs.pop(title, None) is not None:
+                            self.changed = True
+                    elif self.dirs.get(title) != value:
+                        self.dirs[title] = value
+                        self.changed = True
+
+    def refresh_journal(self):
+        """Read the records appended to the journal since the last refresh.
+        """
+        path = os.path.join(self.root_dir, JOURNAL_FILE)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        if size == self.journal_size:
+            return
+        if size < self.journal_size:
+            # The journal was replaced
+            self.states = {}
+            self.journal_offset = 0
+        journal = CompletionJournal(path, read_only=True, states=self.states,
+                                    offset=self.journal_offset)
+        self.states = journal.states
+        self.journal_offset = journal.offset
+        self.journal_size = size
+        self.changed = True
+
+    def save(self):
+        """Write the index if it has changed.
+
+        The index is written to a temporary file first and renamed, so a
+        concurrent reader never sees a partial index. If it cannot be
+        written (for example, the cache directory is read-only), it is not
+        saved.
+        """
+        if not self.changed:
+            return
+        temp_path = f'{self.path}.{uuid.uuid4().hex}'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'dirs': self.dirs,
+                           'states': self.states,
+                           'journal_offset': self.journal_offset,
+                           'journal_size': self.journal_size}, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self.changed = False
+
+    def latest_log_file(self, title: str) -> str | None:
+        """Get the latest log file of an experiment from the index.
+
+        :param title: The title of the experiment.
+        :return: The path to the latest log file, or None if there is none.
+        """
+        value = self.dirs.get(title)
+        if value is None or value[1] is None:
+            return None
+        return os.path.join(self.root_dir, title, value[1])
+
+
+def index_path(root_dir: str) -> str:
+    """Get the path to the cached index of a log directory.
+
+    The index is in `STATUS_CACHE_DIR` in `$XDG_CACHE_HOME` (by default,
+    '~/.cache'), named after the hash of the real path to the log directory.
+
+    :param root_dir: The log directory.
+    :return: The path to the index file.
+    """
+    cache_home = (os.environ.get('XDG_CACHE_HOME')
+                  or os.path.join(os.path.expanduser('~'), '.cache'))
+    digest = hashlib.sha256(os.path.realpath(root_dir).encode()).hexdigest()
+    return os.path.join(cache_home, STATUS_CACHE_DIR, digest[:32] + '.json')
+
+
+class SweepStatus:
+    """The states of the configurations of a sweep.
+
+    `titles` maps each state in `STATES` to the titles in that state, in
+    the order of the configurations. `STARTED` means that the experiment
+    started but did not finish, because it is still running or the process
+    was killed.
+    """
+    def __init__(self):
+        self.titles = {state: [] for state in STATES}
+
+    @property
+    def total(self) -> int:
+        return sum(len(titles) for titles in self.titles.values())
+
+    def count(self, state: str) -> int:
+        return len(self.titles[state])
+
+    def summary(self) -> str:
+        """Get the counts of the states.
+
+        :return: One line per state.
+        """
+        lines = [f"Total: {self.total}"]
+        for state in STATES:
+            lines.append(f"{state.capitalize()}: {self.count(state)}")
+        return '\n'.join(lines)
+
+
+def sweep_status(config: list | ConfigureIterable, log_dir: str,
+                 max_workers=8, use_index=True) -> SweepStatus:
+    """Get the status of a sweep from its log directory.
+
+    :param config: The configuration list, or a `ConfigureIterable` object.
+    :param log_dir: The log directory of the sweep.
+    :param max_workers: The number of threads to walk the log directory.
+    :param use_index: Whether to read and update the cached index. If
+        False, the log directory is walked from scratch, and nothing is
+        written.
+    :return: The status of the sweep.
+    """
+    if not isinstance(config, ConfigureIterable):
+        config = ConfigureIterable(config)
+    status = SweepStatus()
+    titles = [title for title, _ in config]
+    if not os.path.isdir(log_dir):
+        status.titles[MISSING] = titles
+        return status
+
+    database = os.path.join(log_dir, DATABASE_FILE)
+    if os.path.exists(database):
+        states = database_states(database)
+        dirs = {}
+    else:
+        index = StatusIndex(log_dir, use_index)
+        index.refresh_journal()
+        # Only the experiments without records in the journal need their
+        # directories to be checked
+        index.refresh(max_workers, [title for title in titles
+                                    if title not in index.states])
+        if use_index:
+            index.save()
+        states = index.states
+        dirs = index.dirs
+
+    for title in titles:
+        state = states.get(title)
+        if state == SUCCEEDED:
+            state = DONE
+        elif state is None:
+            value = dirs.get(title)
+            state = DONE if value is not None and value[1] else MISSING
+        status.titles[state].append(title)
+    return status
+
+
+def database_states(path: str) -> dict:
+    """Get the latest state of every experiment in a `SqliteTrackLog`
+    database.
+
+    :param path: The path to the database.
+    :return: The state of each title. `SUCCEEDED` if the experiment has ever
+        succeeded.
+    """
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = connection.execute(
+            'SELECT title, state FROM runs WHERE id IN '
+            '(SELECT MAX(id) FROM runs GROUP BY title)').fetchall()
+        states = dict(rows)
+        for (title,) in connection.execute(
+                'SELECT DISTINCT title FROM runs WHERE state = ?',
+                (SUCCEEDED,)):
+            states[title] = SUCCEEDED
+    finally:
+        connection.close()
+    return states
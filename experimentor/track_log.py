@@ -1,5 +1,16 @@
 import os
 import datetime
+import itertools
+import socket
+import uuid
+
+from .journal import CompletionJournal, STARTED, SUCCEEDED, FAILED
+from .lease import DEFAULT_LEASE_TTL, LeaseHeldError, LeaseManager
+from .log_capture import open_log
+
+JOURNAL_FILE = 'journal.jsonl'
+LOCK_FILE = 'lock'
+LEASE_DIR = 'leases'
 
 class BaseTrackLog:
     """Base class for tracking log files for experiments.
@@ -17,6 +28,11 @@ class BaseTrackLog:
     pass to the runner (inherit from `experimentor.BaseExperimentRunner`)
     to run the experiment as the third parameter of the runner's
     `run_experiment` method.
+
+    The `experiment_started` and `experiment_finished` methods are called
+    before and after each trial that is not skipped, and `experiment_done`
+    after the last trial of an experiment. They do nothing by default, and
+    you can override them to record the states of the experiments.
     """
 
     def add_log_file(self, name: str, skip_if_exists: bool) -> str | None:
@@ -44,38 +60,123 @@ class BaseTrackLog:
         """
         raise NotImplementedError
 
+    def experiment_started(self, name: str, trial: int):
+        """Called before a trial of the experiment starts.
+
+        :param name: The name of the experiment.
+        :param trial: The trial number, starting from 0.
+        """
+        pass
+
+    def experiment_finished(self, name: str, trial: int,
+                            error: Exception | None = None):
+        """Called after a trial of the experiment finishes.
+
+        :param name: The name of the experiment.
+        :param trial: The trial number, starting from 0.
+        :param error: The exception raised by the trial. None if the trial
+            succeeded.
+        """
+        pass
+
+    def experiment_done(self, name: str, successful: bool):
+        """Called once after the last trial of the experiment, including
+        when the experiment is skipped.
+
+        :param name: The name of the experiment.
+        :param successful: Whether any of the trials succeeded.
+        """
+        pass
+
 
 class TrackLog(BaseTrackLog):
     """Track the log files for experiments.
 
     On initialization, it will create a lock file to make sure that only one
-    process is using the directory. The lock file will be removed when the
-    object is deleted. You can disable the lock by setting the disable_lock
-    parameter to True when initializing the object. In this case, there
-    can be multiple processes using the directory at the same time.
+    process is using the directory. The lock file records the host and the
+    process ID, so a lock left by a process on the same host that no longer
+    exists is taken over. The lock file will be removed by `close` or when
+    the object is deleted. You can disable the lock by setting the
+    disable_lock parameter to True when initializing the object. In this
+    case, there can be multiple processes using the directory at the same
+    time.
+
+    With `shared`, any number of processes, on any number of hosts sharing
+    the file system, can work through the same sweep in the same directory.
+    Instead of the lock, each experiment is claimed with a lease in the
+    'leases' directory (see `experimentor.lease.LeaseManager`), so it is run
+    by only one process. The experiments that succeeded in any process are
+    skipped, and `add_log_file` raises a `LeaseHeldError` for the
+    experiments claimed by another live process. The experiments that
+    failed are not marked as done, so they are run again by the deferred
+    retries, on resume, or by another process. The lease of a process that
+    died expires after `lease_ttl` seconds and is reclaimed by another
+    process. To run a finished shared sweep again, remove the 'leases'
+    directory.
 
     When running experiments, a log file will be created for each experiment.
-    The file name is the current time in the format of '%Y_%m_%d_%H_%M_%S.log'
-    in UTC time to avoid conflicts. The log file will be stored in a
-    subdirectory named after the experiment title.
+    The file name is the current time in the format of
+    '%Y_%m_%d_%H_%M_%S_%f.log' in UTC time to avoid conflicts. If the name is
+    still taken, a counter is appended to the name. The log file will be
+    stored in a subdirectory named after the experiment title.
+
+    Unless `journal` is False, the states of the experiments (started,
+    succeeded and failed) are also recorded in a journal file named
+    'journal.jsonl' in the root directory (see
+    `experimentor.journal.CompletionJournal`). When `skip_if_exists` is
+    true, the journal is used to skip only the experiments that have
+    succeeded, so experiments that crashed or failed are run again. For log
+    directories created before the journal was introduced, experiments not
+    found in the journal are skipped if their directory has files.
     """
 
-    def __init__(self, root_dir: str, disable_lock=False):
+    def __init__(self, root_dir: str, disable_lock=False, journal=True,
+                 shared=False, lease_ttl=DEFAULT_LEASE_TTL):
         """Initialize the TrackLog object.
 
         :param root_dir: The root directory to store the log files.
         :param disable_lock: Whether to disable the lock file used to
             guarantee that only one process is using the directory.
+        :param journal: Whether to record the states of the experiments in
+            a journal file.
+        :param shared: Whether to share the directory with other processes
+            running the same sweep. The lock is disabled, and the
+            experiments are claimed with leases instead.
+        :param lease_ttl: The seconds after which the lease of a process
+            that stopped sending heartbeats is reclaimed.
         """
         super().__init__()
         self.root_dir = root_dir
-        self.disable_lock = disable_lock
+        self.disable_lock = disable_lock or shared
+        self.journal = None
+        self.legacy_dir = False
+        self.leases = None
+        self.locked = False
         self.init_dir()
+        if journal:
+            self.init_journal()
+        if shared:
+            self.leases = LeaseManager(os.path.join(root_dir, LEASE_DIR),
+                                       lease_ttl)
 
     def __del__(self):
-        if not self.disable_lock:
-            lock_file = os.path.join(self.root_dir, 'lock')
-            os.remove(lock_file)
+        self.close()
+
+    def close(self):
+        """Close the journal, release the leases and remove the lock file.
+        """
+        if getattr(self, 'journal', None) is not None:
+            self.journal.close()
+            self.journal = None
+        if getattr(self, 'leases', None) is not None:
+            self.leases.close()
+            self.leases = None
+        if getattr(self, 'locked', False):
+            self.locked = False
+            try:
+                os.remove(os.path.join(self.root_dir, LOCK_FILE))
+            except FileNotFoundError:
+                pass
 
     def init_dir(self):
         """Initialize the directory.
@@ -89,36 +190,144 @@ class TrackLog(BaseTrackLog):
             return
 
         # Make sure there is no other process using the directory
-        lock_file = os.path.join(self.root_dir, 'lock')
+        lock_file = os.path.join(self.root_dir, LOCK_FILE)
+        owner = f'{socket.gethostname()}:{os.getpid()}'
+        for _ in range(2):
+            try:
+                fd = os.open(lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             0o644)
+            except FileExistsError:
+                if not self.remove_stale_lock(lock_file):
+                    raise ValueError("Another process is using the directory")
+                continue
+            try:
+                os.write(fd, owner.encode())
+            finally:
+                os.close(fd)
+            self.locked = True
+            return
+        raise ValueError("Another process is using the directory")
+
+    def remove_stale_lock(self, lock_file: str) -> bool:
+        """Remove the lock file if its process no longer exists.
+
+        Only the lock files written by a process on this host can be checked.
+        An empty lock file (from an older version) is never removed.
+
+        :param lock_file: The path to the lock file.
+        :return: Whether the lock file was stale and is removed.
+        """
         try:
-            os.open(lock_file, os.O_CREAT | os.O_EXCL)
-        except FileExistsError:
-            raise ValueError("Another process is using the directory")
+            with open(lock_file, 'r') as f:
+                host, _, pid = f.read().strip().rpartition(':')
+        except FileNotFoundError:
+            return True
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        try:
+            os.kill(int(pid), 0)
+            return False
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            # The process exists but belongs to another user
+            return False
+        stale_file = f'{lock_file}.stale.{uuid.uuid4().hex}'
+        try:
+            os.rename(lock_file, stale_file)
+        except FileNotFoundError:
+            return True
+        os.remove(stale_file)
+        print(f"Removed the stale lock of process {pid}")
+        return True
+
+    def init_journal(self):
+        """Open the journal in the root directory.
+
+        If there's no journal yet but the directory already has experiment
+        directories, the directory is treated as a legacy directory: the
+        experiments without records in the journal fall back to checking
+        whether their directories have files.
+        """
+        journal_file = os.path.join(self.root_dir, JOURNAL_FILE)
+        self.journal = CompletionJournal(journal_file)
+        if not self.journal.existed:
+            with os.scandir(self.root_dir) as entries:
+                self.legacy_dir = any(entry.is_dir()
+                                      and entry.name != LEASE_DIR
+                                      for entry in entries)
 
     def add_log_file(self, name: str, skip_if_exists: bool) -> str | None:
         """Add a log file for the experiment with the given name.
 
         This function will create a file named after the current time in the
-        format of '%Y_%m_%d_%H_%M_%S.log' in UTC time. If the directory for
+        format of '%Y_%m_%d_%H_%M_%S_%f.log' in UTC time. The file is created
+        exclusively, so no existing log file will be overwritten even if
+        several experiments start at the same time. If the directory for
         the experiment does not exist, it will be created. If the directory
         already has files, the function will skip creating the log file if
-        `skip_if_exists` is true.
+        `skip_if_exists` is true. If the journal is enabled, the journal is
+        checked instead, and only the experiments that have succeeded are
+        skipped. In shared mode, the experiment is also skipped if another
+        process has run it successfully.
 
         :param name: The name of the experiment.
         :param skip_if_exists: Skip creating the log file if the directory already
             has files.
         :return: If the log file is created, return the path to the file.
             Otherwise, return None.
+        :raises LeaseHeldError: In shared mode, if another live process is
+            running the experiment.
         """
+        if skip_if_exists and self.is_finished(name):
+            return None
+        if self.leases is not None and not self.leases.try_claim(name):
+            if self.leases.is_done(name):
+                return None
+            raise LeaseHeldError(f"{name} is being run by another process")
         subdir = os.path.join(self.root_dir, name)
         os.makedirs(subdir, exist_ok=True)
-        if skip_if_exists and len(os.listdir(subdir)) > 0:
-            return None
-        file_name = f'{datetime.datetime.now(datetime.UTC).strftime('%Y_%m_%d_%H_%M_%S')}.log'
-        file_path = os.path.join(subdir, file_name)
-        with open(file_path, 'w'):
-            pass
-        return file_path
+        time_str = datetime.datetime.now(datetime.UTC).strftime('%Y_%m_%d_%H_%M_%S_%f')
+        for i in itertools.count():
+            suffix = '' if i == 0 else f'_{i}'
+            file_path = os.path.join(subdir, f'{time_str}{suffix}.log')
+            try:
+                with open(file_path, 'x'):
+                    pass
+                return file_path
+            except FileExistsError:
+                continue
+
+    def is_finished(self, name: str) -> bool:
+        """Check whether the experiment should be skipped on resume.
+
+        :param name: The name of the experiment.
+        :return: If the journal is enabled, whether the experiment has
+            succeeded. Otherwise, whether the directory of the experiment has
+            files.
+        """
+        if self.journal is not None:
+            if self.journal.get_state(name) is not None or not self.legacy_dir:
+                return self.journal.has_succeeded(name)
+        subdir = os.path.join(self.root_dir, name)
+        return os.path.isdir(subdir) and len(os.listdir(subdir)) > 0
+
+    def experiment_started(self, name: str, trial: int):
+        if self.journal is not None:
+            self.journal.record(name, STARTED, trial)
+
+    def experiment_finished(self, name: str, trial: int,
+                            error: Exception | None = None):
+        if self.journal is None:
+            return
+        if error is None:
+            self.journal.record(name, SUCCEEDED, trial)
+        else:
+            self.journal.record(name, FAILED, trial, str(error))
+
+    def experiment_done(self, name: str, successful: bool):
+        if self.leases is not None:
+            self.leases.release(name, successful)
 
     def open_latest_log_file(self, name: str):
         """Open the latest log file for the experiment with the given name.
@@ -137,11 +346,7 @@ def has_track_log(root_dir: str, name: str) -> bool:
     :param name: The name of the experiment.
     :return: Whether there's a log file for the given experiment.
     """
-    subdir = os.path.join(root_dir, name)
-    if not os.path.exists(root_dir):
-        return False
-    files = os.listdir(subdir)
-    return len(files) > 0
+    return get_latest_track_log_file(root_dir, name) is not None
 
 
 def get_latest_track_log_file(root_dir: str, name: str) -> str | None:
@@ -150,21 +355,44 @@ def get_latest_track_log_file(root_dir: str, name: str) -> str | None:
     :param root_dir: The root directory to store the log files.
     :param name: The name of the experiment.
     :return: If there's no log file for the given experiment, return None.
-        Otherwise, return the path to the latest log file.
+        Otherwise, return the path to the latest log file. The stderr
+        captured separately is in the same path with
+        `experimentor.log_capture.STDERR_SUFFIX`.
     """
     subdir = os.path.join(root_dir, name)
-    if not os.path.exists(subdir):
+    latest = latest_log_name(subdir)
+    if latest is None:
         return None
-    files = os.listdir(subdir)
-    if not files:
+    return os.path.join(subdir, latest)
+
+
+def latest_log_name(subdir: str) -> str | None:
+    """Find the latest log file in the directory of an experiment.
+
+    The log files are named after the time they begin, so the latest one
+    has the greatest name.
+
+    :param subdir: The directory of the experiment.
+    :return: The name of the latest log file, or None if the directory does
+        not exist or has no log files.
+    """
+    latest = None
+    try:
+        with os.scandir(subdir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.log') and (latest is None
+                                                    or entry.name > latest):
+                    latest = entry.name
+    except (FileNotFoundError, NotADirectoryError):
         return None
-    files.sort()
-    return os.path.join(subdir, files[-1])
+    return latest
 
 
 def open_latest_track_log_file(root_dir: str, name: str):
     """Open the latest log file for the experiment with the given name.
 
+    A compressed log file is decompressed transparently.
+
     You can use this function to open the log file like this:
 
     with open_track_log_file('log', 'a_c_e'):
@@ -179,4 +407,4 @@ def open_latest_track_log_file(root_dir: str, name: str):
     file = get_latest_track_log_file(root_dir, name)
     if file is None:
         raise ValueError("No log file for the experiment")
-    return open(file, 'r')
+    return open_log(file)
@@ -0,0 +1,26 @@
+import threading
+
+import pytest
+
+import experimentor
+
+
+class RecordingRunner(experimentor.BaseExperimentRunner):
+    """Record the experiments that are run, and fail the given titles.
+    """
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def run_experiment(self, title, config, file):
+        with self._lock:
+            self.runs.append(title)
+        if title in self.failing:
+            raise ValueError(f"{title} failed")
+
+
+@pytest.fixture
+def make_runner():
+    return RecordingRunner
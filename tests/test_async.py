@@ -0,0 +1,67 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import experimentor
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'x': 'x', 'y': 'y'}]
+
+
+def process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_async_command_runner(tmp_path):
+    asyncio.run(experimentor.run_experiments_async(
+        CONFIG, experimentor.AsyncCommandRunner('echo'), str(tmp_path),
+        max_concurrency=3))
+    for title, conf in experimentor.ConfigureIterable(CONFIG):
+        with experimentor.open_latest_track_log_file(str(tmp_path),
+                                                     title) as f:
+            assert f.read().split() == [str(value) for value in conf.values()]
+
+
+def test_values_are_single_arguments(tmp_path):
+    runner = experimentor.AsyncCommandRunner("sh -c 'echo $#' sh")
+    file = str(tmp_path / 'log')
+    runner.run_experiment('t', {'v': 'two words', 'w': "it's"}, file)
+    assert open(file).read() == '2\n'
+
+
+def test_failed_trials_are_collected(tmp_path):
+    runner = experimentor.AsyncCommandRunner('false')
+    experiment = experimentor.Experimentor([{'a': 1}], runner, str(tmp_path))
+    errors = []
+    assert not asyncio.run(experiment.run_with_trials_async(
+        'a', {'a': 1}, 2, False, errors))
+    assert errors == ['ValueError: false 1 returns non-zero value: 1'] * 2
+    with pytest.raises(ValueError):
+        asyncio.run(experiment.run_experiments_async(max_trial=1))
+
+
+def test_failure_cancels_the_running_children(tmp_path):
+    pid_file = tmp_path / 'pid'
+    runner = experimentor.AsyncCommandRunner(
+        f"sh -c 'if [ $0 = 1 ]; then echo $$ > {pid_file}; exec sleep 30; "
+        f"fi; sleep 0.5; exit 1'")
+    start = time.monotonic()
+    with pytest.raises(ValueError):
+        asyncio.run(experimentor.run_experiments_async(
+            [{'slow': 1, 'failing': 2}], runner, str(tmp_path), max_trial=1))
+    assert time.monotonic() - start < 10
+    assert not process_exists(int(pid_file.read_text()))
+
+
+def test_max_concurrency_of_the_runner(tmp_path):
+    runner = experimentor.AsyncCommandRunner('sleep', max_concurrency=2)
+    start = time.monotonic()
+    asyncio.run(experimentor.run_experiments_async(
+        [{f'v{i}': 0.3 for i in range(4)}], runner, None,
+        max_concurrency=4))
+    assert time.monotonic() - start >= 0.6
@@ -0,0 +1,48 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from experimentor import ConfigureIterable, IterableAxis, LinspaceAxis
+from experimentor.distributed import Coordinator, run_worker
+
+
+def test_float_titles_are_rounded():
+    assert LinspaceAxis('x', 0, 1, 11).item(3) == ('x=0.3', 'x',
+                                                   0.30000000000000004)
+
+
+def test_path_separators_are_escaped():
+    axis = IterableAxis('path', ['../etc/passwd', 'a\\b', '100%'])
+    assert [axis.item(i)[0] for i in range(3)] == [
+        'path=..%2Fetc%2Fpasswd', 'path=a%5Cb', 'path=100%25']
+    assert axis.item(0)[2] == '../etc/passwd'
+
+
+def titles(space):
+    return [title for title, _ in space]
+
+
+def test_unbounded_first_axis():
+    space = ConfigureIterable([IterableAxis('i', itertools.count()),
+                               {'p': 0, 'q': 1}])
+    assert not space.bounded
+    with pytest.raises(TypeError):
+        len(space)
+    assert titles(space[:4]) == ['i=0_p', 'i=0_q', 'i=1_p', 'i=1_q']
+    assert space[7] == ('i=3_q', {'i': 3, 'q': 1})
+
+
+def test_unbounded_sweep_is_handed_out(make_runner):
+    values = (i for i in range(5))
+    coordinator = Coordinator([IterableAxis('i', values), {'p': 0}], port=0)
+    assert coordinator.total is None
+    thread = threading.Thread(target=coordinator.serve)
+    thread.start()
+    while coordinator.address is None:
+        time.sleep(0.01)
+    runner = make_runner()
+    run_worker(*coordinator.address, runner, None, max_workers=2)
+    thread.join()
+    assert sorted(runner.runs) == [f'i={i}_p' for i in range(5)]
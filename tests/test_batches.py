@@ -0,0 +1,61 @@
+import pytest
+
+import experimentor
+
+numpy = pytest.importorskip('numpy')
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'n': {'$range': [0, 4]}},
+          {'x': 'x', 'y': 'y'}]
+
+
+def flatten(batches) -> list:
+    return [item for batch in batches for item in batch]
+
+
+def test_batches_match_the_iteration():
+    space = experimentor.ConfigureIterable(CONFIG)
+    batches = list(space.index_batches(5))
+    assert [len(batch) for batch in batches] == [5] * 4 + [4]
+    assert flatten(batches) == list(space)
+    assert batches[1].positions.tolist() == list(range(5, 10))
+    # The choice of every axis, the last one changing the fastest
+    assert batches[0].digits.tolist()[:3] == [[0, 0, 0], [0, 0, 1],
+                                              [0, 1, 0]]
+    assert batches[2][3] == space[13]
+
+
+def test_batches_of_a_slice_and_constraints():
+    space = experimentor.ConfigureIterable(CONFIG)[3:20:4]
+    assert flatten(space.index_batches(2)) == list(space)
+    # The positions are in the whole sweep
+    assert [batch.positions.tolist() for batch in space.index_batches(2)] == [
+        [3, 7], [11, 15], [19]]
+    constrained = experimentor.ConfigureIterable(
+        CONFIG, constraints=[lambda conf: conf['n'] != 2])
+    assert flatten(constrained.index_batches(3)) == list(constrained)
+    assert len(flatten(constrained.index_batches())) == 18
+
+
+def test_select():
+    space = experimentor.ConfigureIterable(CONFIG)
+    batch, = space.index_batches()
+    # Only the configurations with the choice 'b' on the first axis
+    selected = batch.select(batch.digits[:, 0] == 1)
+    assert len(selected) == 8
+    assert selected.positions.tolist() == list(range(8, 16))
+    assert all('b' in conf for _, conf in selected)
+
+
+def test_invalid_batches():
+    space = experimentor.ConfigureIterable(CONFIG)
+    with pytest.raises(ValueError):
+        next(space.index_batches(0))
+    unbounded = experimentor.ConfigureIterable(
+        [experimentor.IterableAxis('i', iter(range(3)))])
+    with pytest.raises(ValueError):
+        next(unbounded.index_batches())
+
+
+def test_duplicated_keys_are_found_on_construction():
+    with pytest.raises(ValueError, match='Duplicated key: a'):
+        experimentor.ConfigureIterable([{'a': 1}, {'x': 2, 'a': 3}])
@@ -0,0 +1,55 @@
+import concurrent.futures
+import os
+
+import pytest
+
+import experimentor
+
+
+def train(title, config, budget=None):
+    print(f'training {title}', flush=True)
+    os.system('echo from a child')
+    if config.get('fail'):
+        raise ValueError(f"{title} failed")
+    return os.getpid(), budget
+
+
+def crash(title, config):
+    os._exit(3)
+
+
+def test_output_and_return_value(tmp_path):
+    file = str(tmp_path / 'log')
+    with experimentor.CallableRunner(train, max_workers=1) as runner:
+        pid, budget = runner.run_experiment('t', {}, file, budget=3)
+        assert runner.run_experiment('u', {}, None)[0] == pid
+    assert pid != os.getpid()
+    assert budget == 3
+    assert open(file).read() == 'training t\nfrom a child\n'
+
+
+def test_errors_reach_the_sweep(tmp_path):
+    with experimentor.CallableRunner(train, max_workers=2) as runner:
+        report = experimentor.run_experiments(
+            [{'ok': False, 'fail': True}], runner, str(tmp_path),
+            max_trial=1, max_workers=2, continue_on_failure=True)
+    assert [failure.title for failure in report.failures] == ['fail']
+    # The trial in the sweep and the one in the deferred round
+    assert report.failures[0].errors == ['ValueError: fail failed'] * 2
+    with experimentor.open_latest_track_log_file(str(tmp_path), 'ok') as f:
+        assert f.read().startswith('training ok\n')
+
+
+def test_workers_are_replaced_after_max_tasks(tmp_path):
+    with experimentor.CallableRunner(train, max_workers=1,
+                                     max_tasks_per_child=1) as runner:
+        pids = {runner.run_experiment(str(i), {}, None)[0] for i in range(3)}
+    assert len(pids) == 3
+
+
+def test_pool_is_restarted_after_a_worker_dies():
+    with experimentor.CallableRunner(crash, max_workers=1) as runner:
+        with pytest.raises(concurrent.futures.process.BrokenProcessPool):
+            runner.run_experiment('t', {}, None)
+        runner.function = train
+        assert runner.run_experiment('t', {}, None)[1] is None
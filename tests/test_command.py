@@ -0,0 +1,49 @@
+import pytest
+
+import experimentor
+from experimentor.command import config_arguments
+
+
+def test_values_are_never_split_or_expanded(tmp_path):
+    runner = experimentor.SimpleCommandRunner(
+        "printf '%s|' {args} --name={name}", shell=False)
+    file = str(tmp_path / 'log')
+    runner.run_experiment('t', {'a': "it's $HOME", 'o': {'name': 'a b',
+                                                         'x': '*'}}, file)
+    assert open(file).read() == "it's $HOME|-x|*|--name=a b|"
+
+
+def test_render_places_the_fields_and_the_arguments():
+    template = experimentor.CommandTemplate(
+        ['train', '{args}', 'out/{data}.txt', '--lr={lr:.0e}', '{{x}}'])
+    argv = template.render({'data': 'cifar', 'o': {'lr': 0.001, 'b': 2}},
+                           {'epochs': 3})
+    assert argv == ['train', '-b', '2', '--epochs', '3', 'out/cifar.txt',
+                    '--lr=1e-03', '{x}']
+    # The arguments go at the end by default
+    assert experimentor.CommandTemplate('echo "a b"').render({'v': 1}) == [
+        'echo', 'a b', '1']
+
+
+def test_executable_is_resolved_once():
+    template = experimentor.CommandTemplate('sh -c true')
+    assert template.executable.endswith('/sh')
+    assert template.render({})[0] == 'sh'
+
+
+@pytest.mark.parametrize('command', ['', '{prog} x', 'a {args} {args}',
+                                     'a {}', 'a {x!r}'])
+def test_invalid_templates(command):
+    with pytest.raises(ValueError):
+        experimentor.CommandTemplate(command)
+
+
+def test_missing_field():
+    template = experimentor.CommandTemplate('echo {lr}')
+    with pytest.raises(ValueError, match='No value for {lr}'):
+        template.render({'v': 1})
+
+
+def test_config_arguments():
+    assert config_arguments({'a': 1, 'b': {'x': 2, 'long': 'v'}}) == [
+        '1', '-x', '2', '--long', 'v']
@@ -0,0 +1,60 @@
+import pytest
+
+from experimentor import ConfigureIterable
+
+CONFIG = [
+    {'a': 1, 'b': 2, 'c': 3},
+    {'n0': 0, 'n1': 1, 'n2': 2, 'n3': 3},
+    {'x': 'x', 'y': 'y'},
+]
+
+
+def titles(space):
+    return [title for title, _ in space]
+
+
+def test_iteration_follows_the_product():
+    assert titles(ConfigureIterable(CONFIG)) == [
+        f'{a}_n{n}_{x}' for a in 'abc' for n in range(4) for x in 'xy']
+
+
+def test_random_access_matches_iteration():
+    space = ConfigureIterable(CONFIG)
+    expected = list(ConfigureIterable(CONFIG))
+    assert len(space) == len(expected) == 24
+    assert [space[i] for i in range(len(space))] == expected
+    assert space[-1] == expected[-1]
+    with pytest.raises(IndexError):
+        space[24]
+
+
+def test_slices_and_resume():
+    expected = list(ConfigureIterable(CONFIG))
+    space = ConfigureIterable(CONFIG)
+    assert list(space[5:17:3]) == expected[5:17:3]
+    assert list(space[-4:]) == expected[-4:]
+    assert list(ConfigureIterable(CONFIG, 10)) == expected[10:]
+    assert list(ConfigureIterable(CONFIG, 3, 9)) == expected[3:9]
+
+
+def test_shards_are_disjoint_and_complete():
+    space = ConfigureIterable(CONFIG)
+    shards = [titles(space.shard(k, 5)) for k in range(5)]
+    merged = [title for shard in shards for title in shard]
+    assert sorted(merged) == sorted(titles(space))
+    assert len(set(merged)) == len(merged)
+    with pytest.raises(ValueError):
+        space.shard(5, 5)
+
+
+def test_next_on_the_iterable():
+    space = ConfigureIterable([{'a': 1, 'b': 2}])
+    assert next(space) == ('a', {'a': 1})
+    assert next(space) == ('b', {'b': 2})
+    with pytest.raises(StopIteration):
+        next(space)
+
+
+def test_duplicated_keys_are_rejected():
+    with pytest.raises(ValueError):
+        ConfigureIterable([{'a': 1}, {'a': 2}])
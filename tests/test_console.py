@@ -0,0 +1,105 @@
+import io
+import threading
+import time
+
+import pytest
+
+from experimentor.console import (Console, experiment_output,
+                                  redirect_to_console)
+
+
+class CountingFile(io.StringIO):
+    """A terminal that counts the writes.
+    """
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data: str) -> int:
+        self.writes += 1
+        return super().write(data)
+
+
+def print_lines(stream, title: str, count: int):
+    with experiment_output(title):
+        for i in range(count):
+            stream.write(f'{title} {i}\n')
+            stream.flush()
+
+
+def test_output_is_written_at_a_bounded_rate():
+    file = CountingFile()
+    with Console(io.StringIO(), refresh_interval=10) as console:
+        stream = console.stream(file)
+        print_lines(stream, 'a', 200)
+        assert file.writes == 0
+    assert file.writes == 1
+    assert file.getvalue() == ''.join(f'[a] a {i}\n' for i in range(200))
+
+
+def test_output_is_written_in_the_background():
+    file = CountingFile()
+    with Console(io.StringIO(), refresh_interval=0.05) as console:
+        stream = console.stream(file)
+        start = time.monotonic()
+        while time.monotonic() - start < 0.5:
+            print_lines(stream, 'a', 10)
+        deadline = time.monotonic() + 5
+        while file.writes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert file.writes >= 1
+        # At most one write per interval, however often it is printed
+        assert file.writes <= (time.monotonic() - start) / 0.05 + 1
+
+
+def test_lines_of_an_experiment_are_kept_together():
+    file = io.StringIO()
+    console = Console(io.StringIO(), refresh_interval=10)
+    stream = console.stream(file)
+    threads = [threading.Thread(target=print_lines, args=(stream, title, 50))
+               for title in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    console.flush()
+    lines = file.getvalue().splitlines()
+    assert len(lines) == 100
+    # Each experiment's lines are one block, in the order it printed them
+    first = lines[0][1]
+    assert lines[:50] == [f'[{first}] {first} {i}' for i in range(50)]
+    console.close()
+
+
+def test_incomplete_lines_and_other_output():
+    file = io.StringIO()
+    console = Console(io.StringIO(), refresh_interval=10)
+    stream = console.stream(file)
+    with redirect_to_console(console):
+        with experiment_output('a'):
+            stream.write('no newline')
+        stream.write('outside\n')
+    console.flush()
+    assert file.getvalue() == '[a] no newline\noutside\n'
+    console.close()
+    # Written directly once the console is closed
+    stream.write('late')
+    assert file.getvalue().endswith('outside\nlate')
+
+
+def test_full_buffer_is_written_by_the_writer():
+    file = CountingFile()
+    console = Console(io.StringIO(), refresh_interval=10, max_buffer=100)
+    console.start()
+    stream = console.stream(file)
+    start = time.monotonic()
+    print_lines(stream, 'a', 30)
+    assert time.monotonic() - start < 5
+    assert 1 <= file.writes <= 30 // 5
+    console.close()
+    assert file.getvalue().count('\n') == 30
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        Console(io.StringIO(), refresh_interval=0)
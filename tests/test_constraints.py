@@ -0,0 +1,35 @@
+import warnings
+
+from experimentor import ConfigureIterable, RangeAxis
+
+
+def constrained(**kwargs):
+    return ConfigureIterable(
+        [RangeAxis('batch', 1, 9), RangeAxis('seq', 1, 9), {'m': 0, 'n': 1}],
+        constraints=[lambda c: c['batch'] * c['seq'] <= 12], **kwargs)
+
+
+def test_constraints_prune_the_product():
+    expected = [(title, conf) for title, conf in ConfigureIterable(
+        [RangeAxis('batch', 1, 9), RangeAxis('seq', 1, 9), {'m': 0, 'n': 1}])
+        if conf['batch'] * conf['seq'] <= 12]
+    space = constrained()
+    assert [item for item in space] == expected
+    assert len(space) == len(expected)
+    assert space[-1] == expected[-1]
+    assert list(space[3::4]) == expected[3::4]
+    assert [item for k in range(3)
+            for item in constrained().shard(k, 3)] == [
+        item for k in range(3) for item in expected[k::3]]
+    assert list(constrained(start_index=5, stop_index=20)) == expected[5:20]
+
+
+def test_constraint_with_a_missing_key_warns_once():
+    space = ConfigureIterable(
+        [{'a': 1, 'b': 2}, {'c': 3}],
+        constraints=[lambda c: c['misspelled'] > 0])
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        assert len(list(space)) == 2
+    assert len(caught) == 1
+    assert 'misspelled' in str(caught[0].message)
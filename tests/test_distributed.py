@@ -0,0 +1,113 @@
+import json
+import socket
+import threading
+import time
+
+import experimentor
+from experimentor.distributed import Coordinator, run_worker
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'x': 'x', 'y': 'y'}]
+TITLES = ['a_x', 'a_y', 'b_x', 'b_y', 'c_x', 'c_y']
+
+
+class Client:
+    """A worker speaking the protocol by hand.
+    """
+    def __init__(self, coordinator: Coordinator):
+        self.connection = socket.create_connection(coordinator.address)
+        self.rfile = self.connection.makefile('rb')
+
+    def send(self, message: dict):
+        self.connection.sendall((json.dumps(message) + '\n').encode())
+
+    def request(self) -> dict:
+        self.send({'type': 'request'})
+        return json.loads(self.rfile.readline())
+
+    def close(self):
+        self.rfile.close()
+        self.connection.close()
+
+
+def serve(coordinator: Coordinator) -> tuple[threading.Thread, dict]:
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(failures=coordinator.serve()))
+    thread.start()
+    while coordinator.address is None:
+        time.sleep(0.01)
+    return thread, result
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_workers_run_every_configuration_once(tmp_path, make_runner):
+    coordinator = Coordinator(CONFIG, port=0)
+    thread, result = serve(coordinator)
+    runner = make_runner(failing={'b_y'})
+    run_worker(*coordinator.address, runner, str(tmp_path), max_trial=2,
+               max_workers=3)
+    thread.join()
+    assert sorted(runner.runs) == sorted(TITLES + ['b_y'])
+    assert result['failures'] == {
+        3: ('b_y', ['ValueError: b_y failed'] * 2)}
+    assert experimentor.has_track_log(str(tmp_path), 'a_x')
+
+
+def test_work_of_a_disconnected_worker_is_handed_out_again():
+    coordinator = Coordinator(CONFIG, port=0)
+    coordinator.start()
+    first = Client(coordinator)
+    task = first.request()
+    assert task['type'] == 'task' and task['title'] == 'a_x'
+    first.close()
+    wait_for(lambda: coordinator.requeued)
+
+    second = Client(coordinator)
+    assert second.request()['title'] == 'a_x'
+    assert second.request()['title'] == 'a_y'
+    second.close()
+    coordinator.stop()
+
+
+def test_work_without_heartbeats_is_handed_out_again():
+    coordinator = Coordinator(CONFIG, port=0, heartbeat_timeout=0.5)
+    coordinator.start()
+    stalled = Client(coordinator)
+    task = stalled.request()
+    assert task['heartbeat'] < 0.5
+    alive = Client(coordinator)
+    assert alive.request()['title'] == 'a_y'
+    # Only the worker that sends heartbeats keeps its configuration
+    for _ in range(4):
+        time.sleep(0.2)
+        alive.send({'type': 'heartbeat', 'index': 1})
+        with coordinator._lock:
+            coordinator.requeue_stalled()
+    assert [item[1] for item in coordinator.requeued] == ['a_x']
+    assert list(coordinator.running) == [1]
+    # A late result of the stalled worker is ignored
+    stalled.send({'type': 'result', 'index': 0, 'successful': True,
+                  'elapsed': 1.0, 'errors': []})
+    assert alive.request()['title'] == 'a_x'
+    assert coordinator.finished == 0
+    stalled.close()
+    alive.close()
+    coordinator.stop()
+
+
+def test_invalid_message_drops_the_worker(capsys):
+    coordinator = Coordinator(CONFIG, port=0)
+    coordinator.start()
+    client = Client(coordinator)
+    assert client.request()['title'] == 'a_x'
+    client.send({'type': 'result'})
+    wait_for(lambda: coordinator.requeued)
+    assert 'Invalid message from' in capsys.readouterr().out
+    client.close()
+    coordinator.stop()
@@ -0,0 +1,21 @@
+import pytest
+
+import experimentor
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'x': 'x', 'y': 'y'}]
+TITLES = ['a_x', 'a_y', 'b_x', 'b_y', 'c_x', 'c_y']
+
+
+def test_parallel_runs_every_configuration_once(tmp_path, make_runner):
+    runner = make_runner()
+    experimentor.run_experiments(CONFIG, runner, str(tmp_path),
+                                 max_workers=4)
+    assert sorted(runner.runs) == TITLES
+
+
+def test_parallel_failure_stops_the_sweep(tmp_path, make_runner):
+    runner = make_runner(failing={'a_x'})
+    with pytest.raises(ValueError):
+        experimentor.run_experiments(CONFIG, runner, str(tmp_path),
+                                     max_trial=2, max_workers=2)
+    assert runner.runs.count('a_x') == 2
@@ -0,0 +1,50 @@
+import pytest
+
+import experimentor
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'x': 'x', 'y': 'y'}]
+
+
+def test_continue_on_failure_retries_at_the_end(tmp_path, make_runner):
+    runner = make_runner(failing={'b_y'})
+    report = experimentor.run_experiments(
+        CONFIG, runner, str(tmp_path), max_trial=2, max_workers=3,
+        continue_on_failure=True,
+        retry_policy=experimentor.RetryPolicy(deferred_rounds=2))
+    assert not report
+    assert report.total == 6
+    assert [failure.title for failure in report.failures] == ['b_y']
+    # 2 trials in the sweep, and 2 in each deferred round
+    assert len(report.failures[0].errors) == 6
+    assert report.summary().startswith('5 of 6 configurations succeeded')
+
+
+def test_deferred_round_runs_the_failures_again(tmp_path, make_runner):
+    runner = make_runner(failing={'a_x'})
+    original = runner.run_experiment
+
+    def flaky(title, config, file):
+        # Succeeds once the sweep is over
+        if runner.runs.count(title) == 1:
+            runner.failing.discard(title)
+        return original(title, config, file)
+
+    runner.run_experiment = flaky
+    report = experimentor.run_experiments(CONFIG, runner, str(tmp_path),
+                                          max_trial=1,
+                                          continue_on_failure=True)
+    assert report
+    assert runner.runs.count('a_x') == 2
+    assert runner.runs[-1] == 'a_x'
+    assert report.summary() == '6 of 6 configurations succeeded, 0 failed'
+
+
+def test_retry_delays():
+    policy = experimentor.RetryPolicy(delay=1.0, backoff=3.0, max_delay=5.0)
+    assert [policy.retry_delay(retry) for retry in range(4)] == [
+        0.0, 1.0, 3.0, 5.0]
+    assert experimentor.RetryPolicy().retry_delay(2) == 0.0
+    with pytest.raises(ValueError):
+        experimentor.RetryPolicy(backoff=0.5)
+    with pytest.raises(ValueError):
+        experimentor.RetryPolicy(deferred_rounds=-1)
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+import experimentor
+
+# The metric of a configuration is its value, divided by the budget
+CONFIG = [{f'v{i}': i for i in range(9)}]
+
+
+class MetricRunner(experimentor.BaseExperimentRunner):
+    """Record the runs with their budgets, and fail the given values.
+    """
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def run_experiment(self, title, config, file, budget=None):
+        with self._lock:
+            self.runs.append((title, budget))
+        value, = config.values()
+        if value in self.failing:
+            raise ValueError(f"{title} failed")
+        return value / budget
+
+
+def search(runner, strategy, tmp_path):
+    experiment = experimentor.Experimentor(CONFIG, runner, str(tmp_path),
+                                           max_workers=3)
+    return experiment.run_search(strategy, max_trial=1)
+
+
+def test_successive_halving_promotes_the_best(tmp_path):
+    runner = MetricRunner(failing={0})
+    results = search(runner, experimentor.SuccessiveHalving(1, 9, eta=3),
+                     tmp_path)
+    budgets = [budget for _, budget in runner.runs]
+    assert (budgets.count(1), budgets.count(3), budgets.count(9)) == (9, 3, 1)
+    # The failed configuration is not promoted
+    assert sorted(title for title, budget in runner.runs if budget == 3) == [
+        'v1_rung1', 'v2_rung1', 'v3_rung1']
+    assert [(result.title, result.budget) for result in results] == [
+        ('v1', 9)]
+    assert results[0].metric == pytest.approx(1 / 9)
+
+
+def test_maximize(tmp_path):
+    runner = MetricRunner()
+    results = search(runner, experimentor.SuccessiveHalving(
+        1, 9, eta=3, minimize=False), tmp_path)
+    assert [result.title for result in results] == ['v8']
+
+
+def test_hyperband_brackets(tmp_path):
+    strategy = experimentor.Hyperband(1, 9, eta=3, seed=0)
+    brackets = strategy.brackets(9)
+    assert [(bracket.name, len(bracket.positions), bracket.budgets)
+            for bracket in brackets] == [
+        ('bracket2', 9, [1, 3, 9]), ('bracket1', 5, [3, 9]),
+        ('bracket0', 3, [9])]
+    assert [bracket.positions for bracket in brackets] == [
+        bracket.positions for bracket in strategy.brackets(9)]
+
+    runner = MetricRunner()
+    results = search(runner, strategy, tmp_path)
+    assert len(runner.runs) == 9 + 3 + 1 + 5 + 1 + 3
+    assert ('v0_bracket2_rung0', 1) in runner.runs
+    # One result from each of the first two brackets, and 3 from the last
+    assert len(results) == 5
+    assert [result.metric for result in results] == sorted(
+        result.metric for result in results)
+    assert all(result.budget == 9 for result in results)
+
+
+def test_budgets():
+    assert experimentor.SuccessiveHalving(1, 10, eta=3).rung_budgets(1) == [
+        1, 3, 10]
+    assert experimentor.SuccessiveHalving(0.5, 2.0, eta=2).rung_budgets(
+        0.5) == [0.5, 1.0, 2.0]
+    with pytest.raises(ValueError):
+        experimentor.SuccessiveHalving(2, 1)
+    with pytest.raises(ValueError):
+        experimentor.SuccessiveHalving(1, 9, eta=1)
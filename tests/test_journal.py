@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+import experimentor
+from experimentor.journal import (FAILED, STARTED, SUCCEEDED,
+                                  CompletionJournal)
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}]
+
+
+def run(runner, log_dir, **kwargs):
+    return experimentor.run_experiments(CONFIG, runner, str(log_dir),
+                                        max_trial=1, **kwargs)
+
+
+def test_resume_runs_only_what_did_not_succeed(tmp_path, make_runner):
+    first = make_runner(failing={'b'})
+    with pytest.raises(ValueError):
+        run(first, tmp_path)
+    assert first.runs == ['a', 'b']
+
+    second = make_runner()
+    run(second, tmp_path, skip_if_exists=True)
+    assert second.runs == ['b', 'c']
+
+    third = make_runner()
+    run(third, tmp_path, skip_if_exists=True)
+    assert third.runs == []
+
+
+def test_resume_after_a_crash_runs_the_started_experiment(tmp_path,
+                                                          make_runner):
+    track_log = experimentor.TrackLog(str(tmp_path))
+    track_log.add_log_file('a', False)
+    track_log.experiment_started('a', 0)
+    track_log.close()
+
+    runner = make_runner()
+    run(runner, tmp_path, skip_if_exists=True)
+    assert runner.runs == ['a', 'b', 'c']
+
+
+def test_states_are_reloaded(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = CompletionJournal(path)
+    journal.record('a', STARTED, 0)
+    journal.record('a', FAILED, 0, reason='exit code 1')
+    journal.record('b', STARTED, 0)
+    journal.record('c', SUCCEEDED, 0)
+    # A later failure does not undo a success
+    journal.record('c', FAILED, 1)
+    journal.close()
+    journal = CompletionJournal(path, read_only=True)
+    assert journal.states == {'a': FAILED, 'b': STARTED, 'c': SUCCEEDED}
+    assert journal.reasons == {'a': 'exit code 1'}
+    assert journal.has_succeeded('c') and not journal.has_succeeded('a')
+
+
+def test_record_after_a_torn_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = CompletionJournal(path)
+    journal.record('a', SUCCEEDED, 0)
+    journal.close()
+    # A crash in the middle of a write
+    with open(path, 'a') as f:
+        f.write('{"title": "b", "st')
+
+    journal = CompletionJournal(path)
+    assert journal.states == {'a': SUCCEEDED}
+    journal.record('b', SUCCEEDED, 0)
+    journal.close()
+    assert CompletionJournal(path, read_only=True).states == {
+        'a': SUCCEEDED, 'b': SUCCEEDED}
+
+
+def test_track_log_with_only_add_log_file(tmp_path, make_runner):
+    class MinimalTrackLog:
+        def add_log_file(self, name, skip_if_exists):
+            path = os.path.join(tmp_path, name + '.log')
+            if skip_if_exists and os.path.exists(path):
+                return None
+            open(path, 'w').close()
+            return path
+
+    runner = make_runner()
+    experimentor.run_experiments(CONFIG, runner, None,
+                                 track_log=MinimalTrackLog())
+    assert runner.runs == ['a', 'b', 'c']
+    runner = make_runner()
+    experimentor.run_experiments(CONFIG, runner, None, skip_if_exists=True,
+                                 track_log=MinimalTrackLog())
+    assert runner.runs == []
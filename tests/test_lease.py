@@ -0,0 +1,158 @@
+import os
+import threading
+
+import pytest
+
+import experimentor
+from experimentor.lease import LeaseHeldError, LeaseManager
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}]
+
+
+def run(runner, log_dir, **kwargs):
+    return experimentor.run_experiments(CONFIG, runner, str(log_dir),
+                                        max_trial=1, **kwargs)
+
+
+def make_stale(path: str):
+    # The lease of a process that died without heartbeats
+    with open(path, 'w') as f:
+        f.write('dead')
+    old = os.path.getmtime(path) - 10
+    os.utime(path, (old, old))
+
+
+def owner_of(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_stale_lease_is_reclaimed(tmp_path):
+    live = LeaseManager(str(tmp_path), ttl=1.0)
+    with open(live.lease_path('a'), 'w') as f:
+        f.write('alive')
+    assert not live.try_claim('a')
+    make_stale(live.lease_path('a'))
+    assert live.try_claim('a')
+    assert owner_of(live.lease_path('a')) == live.owner
+    live.close()
+    assert not os.path.exists(live.lease_path('a'))
+    assert not live.is_done('a')
+
+
+def test_done_marker_only_on_success(tmp_path):
+    first = LeaseManager(str(tmp_path))
+    second = LeaseManager(str(tmp_path))
+    assert first.try_claim('a')
+    assert not second.try_claim('a')
+    first.release('a')
+    assert second.try_claim('a')
+    second.release('a', True)
+    assert not first.try_claim('a')
+    first.close()
+    second.close()
+
+
+def test_fresh_lease_is_not_reclaimed_after_the_check(tmp_path):
+    first = LeaseManager(str(tmp_path), ttl=1.0)
+    second = LeaseManager(str(tmp_path), ttl=1.0)
+    path = first.lease_path('x')
+    make_stale(path)
+    read_lease = second.read_lease
+
+    def read_and_race(lease_path):
+        lease = read_lease(lease_path)
+        if lease_path == path:
+            # The first manager reclaims the stale lease and creates a
+            # fresh one after the second has read it
+            second.read_lease = read_lease
+            assert first.try_claim('x')
+        return lease
+
+    second.read_lease = read_and_race
+    assert not second.try_claim('x')
+    assert owner_of(path) == first.owner
+    assert sorted(os.listdir(tmp_path)) == ['.lock', 'x.lease']
+    first.close()
+    second.close()
+
+
+def test_remove_keeps_the_lease_of_another_process(tmp_path):
+    first = LeaseManager(str(tmp_path), ttl=1.0)
+    second = LeaseManager(str(tmp_path), ttl=1.0)
+    assert first.try_claim('x')
+    # The first manager stalled, and the second took its lease over
+    make_stale(first.lease_path('x'))
+    assert second.try_claim('x')
+    first.release('x')
+    assert owner_of(first.lease_path('x')) == second.owner
+    first.close()
+    second.close()
+
+
+def test_only_one_manager_holds_a_contended_lease(tmp_path):
+    managers = [LeaseManager(str(tmp_path), ttl=1.0) for _ in range(4)]
+    for round in range(50):
+        name = f'x{round}'
+        make_stale(managers[0].lease_path(name))
+        barrier = threading.Barrier(len(managers))
+        claimed = []
+
+        def claim(manager):
+            barrier.wait()
+            if manager.try_claim(name):
+                claimed.append(manager)
+
+        threads = [threading.Thread(target=claim, args=(manager,))
+                   for manager in managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(claimed) == 1
+        assert owner_of(managers[0].lease_path(name)) == claimed[0].owner
+    for manager in managers:
+        manager.close()
+
+
+def test_shared_failures_are_retried(tmp_path, make_runner):
+    track_log = experimentor.TrackLog(str(tmp_path), shared=True)
+    runner = make_runner(failing={'a', 'b', 'c'})
+    report = run(runner, tmp_path, track_log=track_log,
+                 continue_on_failure=True)
+    track_log.close()
+    assert not report
+    assert len(report.failures) == 3
+    # The deferred round ran every experiment again
+    assert sorted(runner.runs) == ['a', 'a', 'b', 'b', 'c', 'c']
+
+    track_log = experimentor.TrackLog(str(tmp_path), shared=True)
+    runner = make_runner()
+    report = run(runner, tmp_path, track_log=track_log, skip_if_exists=True,
+                 continue_on_failure=True)
+    track_log.close()
+    assert report
+    assert runner.runs == ['a', 'b', 'c']
+
+
+def test_shared_experiment_held_by_another_process(tmp_path, make_runner):
+    other = LeaseManager(os.path.join(tmp_path, 'leases'))
+    assert other.try_claim('b')
+    track_log = experimentor.TrackLog(str(tmp_path), shared=True)
+    with pytest.raises(LeaseHeldError):
+        track_log.add_log_file('b', False)
+
+    runner = make_runner()
+    report = run(runner, tmp_path, track_log=track_log,
+                 continue_on_failure=True)
+    assert runner.runs == ['a', 'c']
+    assert report.claimed == 1
+    assert '2 of 3 configurations succeeded' in report.summary()
+
+    # Once the other process succeeds, the experiment is skipped
+    other.release('b', True)
+    runner = make_runner()
+    run(runner, tmp_path, track_log=track_log)
+    track_log.close()
+    other.close()
+    assert runner.runs == []
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+
+import experimentor
+
+CONFIG = [{'a': 1, 'b': 2}]
+
+
+def read_ledger(log_dir) -> list[dict]:
+    with open(os.path.join(log_dir, 'ledger.jsonl')) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_no_ledger_by_default(tmp_path):
+    experimentor.run_experiments(
+        CONFIG, experimentor.SimpleCommandRunner('echo'), str(tmp_path))
+    assert not os.path.exists(tmp_path / 'ledger.jsonl')
+
+
+def test_every_trial_is_recorded(tmp_path):
+    runner = experimentor.SimpleCommandRunner(
+        "sh -c 'echo $0; exit $(($0 - 1))'")
+    experimentor.run_experiments(CONFIG, runner, str(tmp_path), max_trial=2,
+                                 ledger=True, continue_on_failure=True)
+    records = read_ledger(tmp_path)
+    assert [(record['title'], record['trial'], record['exit_code'],
+             record['successful']) for record in records] == [
+        ('a', 0, 0, True), ('b', 0, 1, False), ('b', 1, 1, False),
+        ('b', 0, 1, False), ('b', 1, 1, False)]
+    for record in records:
+        assert record['wall'] > 0
+        assert record['user'] is not None and record['sys'] is not None
+        assert record['max_rss'] > 0
+        assert record['log_bytes'] == 2
+    assert 'returns non-zero value: 1' in records[1]['error']
+
+
+def test_hooks_add_fields(tmp_path):
+    started = []
+
+    def add_answer(record):
+        record['answer'] = 42
+
+    ledger = experimentor.RunLedger(
+        str(tmp_path / 'ledger.jsonl'),
+        on_start=[lambda title, trial: started.append((title, trial))],
+        on_finish=[add_answer])
+    experimentor.run_experiments(CONFIG, experimentor.SimpleCommandRunner(
+        'true'), str(tmp_path), ledger=ledger)
+    assert started == [('a', 0), ('b', 0)]
+    assert [record['answer'] for record in read_ledger(tmp_path)] == [42, 42]
+
+
+def test_async_command_runner_reports_the_usage(tmp_path):
+    runner = experimentor.AsyncCommandRunner('echo')
+    asyncio.run(experimentor.Experimentor(
+        CONFIG, runner, str(tmp_path), ledger=True).run_experiments_async())
+    records = read_ledger(tmp_path)
+    assert sorted(record['title'] for record in records) == ['a', 'b']
+    for record in records:
+        assert record['exit_code'] == 0
+        assert record['user'] is not None
+        assert record['max_rss'] > 0
@@ -0,0 +1,139 @@
+import os
+import shutil
+import signal
+import sys
+import time
+
+import pytest
+
+import experimentor
+from experimentor import ExperimentLimits, ExperimentTimeoutError
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32',
+                                reason="needs process groups")
+
+
+def process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def wait_gone(pid: int, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process_exists(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(command: str, limits: ExperimentLimits, file: str, **kwargs):
+    runner = experimentor.SimpleCommandRunner(f'{command} #', limits=limits,
+                                              **kwargs)
+    return runner.run_experiment('t', {}, file)
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    pid_file = tmp_path / 'pid'
+    limits = ExperimentLimits(timeout=0.5, kill_grace=0.5)
+    start = time.monotonic()
+    with pytest.raises(ExperimentTimeoutError, match='timeout of 0.5s'):
+        run(f'sleep 30 & echo $! > {pid_file}; wait', limits,
+            str(tmp_path / 'log'))
+    assert time.monotonic() - start < 10
+    # The background child of the shell is killed too
+    assert wait_gone(int(pid_file.read_text()))
+
+
+def test_sigkill_after_the_grace_period(tmp_path):
+    limits = ExperimentLimits(timeout=0.3, kill_grace=0.3)
+    with pytest.raises(ExperimentTimeoutError):
+        run("trap '' TERM; sleep 30", limits, str(tmp_path / 'log'))
+
+
+def test_stall_timeout(tmp_path):
+    limits = ExperimentLimits(stall_timeout=0.5, kill_grace=0.5)
+    with pytest.raises(ExperimentTimeoutError, match='no output for 0.5s'):
+        run('echo start; sleep 30', limits, str(tmp_path / 'log'))
+    assert (tmp_path / 'log').read_text() == 'start\n'
+
+
+def test_stall_timeout_with_compressed_capture(tmp_path):
+    limits = ExperimentLimits(stall_timeout=0.5, kill_grace=0.5)
+    capture = experimentor.LogCapture(compression='gzip')
+    with pytest.raises(ExperimentTimeoutError):
+        run('echo start; sleep 30', limits, str(tmp_path / 'log'),
+            capture=capture)
+
+
+def test_output_keeps_the_stall_timeout_away(tmp_path):
+    limits = ExperimentLimits(stall_timeout=1.0)
+    run('for i in 1 2 3 4 5 6; do echo $i; sleep 0.3; done', limits,
+        str(tmp_path / 'log'))
+    assert (tmp_path / 'log').read_text().split() == list('123456')
+
+
+@pytest.mark.skipif(shutil.which('prlimit') is None,
+                    reason="needs the prlimit command")
+def test_resource_limits(tmp_path):
+    limits = ExperimentLimits(memory=256 * 1024 * 1024, cpu_time=1,
+                              kill_grace=0.5)
+    script = ('import resource; '
+              'print(resource.getrlimit(resource.RLIMIT_AS)[0], '
+              'resource.getrlimit(resource.RLIMIT_CPU)[0])')
+    runner = experimentor.SimpleCommandRunner(
+        f'{sys.executable} -c "{script}"', shell=False, limits=limits)
+    runner.run_experiment('t', {}, str(tmp_path / 'log'))
+    assert (tmp_path / 'log').read_text().split() == [str(256 * 1024 * 1024),
+                                                      '1']
+    with pytest.raises(ExperimentTimeoutError, match='CPU time limit'):
+        run(f'{sys.executable} -c "while True: pass"', limits,
+            str(tmp_path / 'cpu'))
+
+
+@pytest.mark.skipif(shutil.which('prlimit') is None,
+                    reason="needs the prlimit command")
+def test_sigkill_at_the_hard_cpu_limit(tmp_path):
+    limits = ExperimentLimits(cpu_time=1, kill_grace=0)
+    script = ('import signal; signal.signal(signal.SIGXCPU, signal.SIG_IGN)'
+              '\nwhile True: pass')
+    runner = experimentor.SimpleCommandRunner(
+        f'{sys.executable} -c "{script}"', shell=False, limits=limits)
+    with pytest.raises(ExperimentTimeoutError, match='CPU time limit'):
+        runner.run_experiment('t', {}, str(tmp_path / 'log'))
+
+
+def test_sigkill_is_a_timeout_only_over_the_cpu_limit():
+    limits = ExperimentLimits(cpu_time=10)
+    assert limits.exceeded_cpu_time(-signal.SIGXCPU)
+    assert limits.exceeded_cpu_time(128 + signal.SIGKILL, 10.5)
+    assert not limits.exceeded_cpu_time(-signal.SIGKILL, 2.0)
+    assert not limits.exceeded_cpu_time(-signal.SIGKILL)
+    assert not ExperimentLimits().exceeded_cpu_time(-signal.SIGKILL, 10.5)
+
+
+def test_async_runner_timeout(tmp_path):
+    pid_file = tmp_path / 'pid'
+    limits = ExperimentLimits(timeout=0.5, kill_grace=0.5)
+    runner = experimentor.AsyncCommandRunner(
+        f"sh -c 'sleep 30 & echo $! > {pid_file}; wait'", limits=limits)
+    start = time.monotonic()
+    with pytest.raises(ExperimentTimeoutError, match='timeout of 0.5s'):
+        runner.run_experiment('t', {}, str(tmp_path / 'log'))
+    assert time.monotonic() - start < 10
+    assert wait_gone(int(pid_file.read_text()))
+
+
+def test_callable_runner_rejects_limits():
+    with pytest.raises(ValueError):
+        experimentor.CallableRunner(print, limits=ExperimentLimits(timeout=1))
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        ExperimentLimits(timeout=0)
+    with pytest.raises(ValueError):
+        ExperimentLimits(kill_grace=-1)
@@ -0,0 +1,66 @@
+import gzip
+
+import pytest
+
+import experimentor
+from experimentor.log_capture import GZIP_MAGIC, LogWriter, open_log
+
+COMMAND = 'echo out; echo err >&2 #'
+
+
+def run(tmp_path, capture, command=COMMAND):
+    runner = experimentor.SimpleCommandRunner(command, capture=capture)
+    file = str(tmp_path / 'x.log')
+    runner.run_experiment('t', {}, file)
+    return file
+
+
+def test_stderr_is_merged_or_separate(tmp_path):
+    file = run(tmp_path, experimentor.LogCapture())
+    assert open(file).read() == 'out\nerr\n'
+    file = run(tmp_path, experimentor.LogCapture(stderr='separate'))
+    assert open(file).read() == 'out\n'
+    assert open(file + '.stderr').read() == 'err\n'
+
+
+def test_gzip_logs_are_read_transparently(tmp_path):
+    capture = experimentor.LogCapture(stderr='separate', compression='gzip')
+    file = run(tmp_path, capture)
+    for path, text in ((file, 'out\n'), (file + '.stderr', 'err\n')):
+        with open(path, 'rb') as f:
+            assert f.read(2) == GZIP_MAGIC
+        with open_log(path) as f:
+            assert f.read() == text
+    with open_log(file, 'rb') as f:
+        assert f.read() == b'out\n'
+    assert f.raw_file.closed
+
+
+def test_capped_log_keeps_the_head_and_the_tail(tmp_path):
+    capture = experimentor.LogCapture(max_bytes=100, tail_bytes=40,
+                                      chunk_size=7)
+    file = run(tmp_path, capture, 'seq 1000 #')
+    text = open(file).read()
+    numbers = ''.join(f'{i}\n' for i in range(1, 1001))
+    assert text == (numbers[:60] + f'\n[... {len(numbers) - 100} bytes '
+                    f'omitted ...]\n' + numbers[-40:])
+
+
+def test_log_writer_compresses_and_caps(tmp_path):
+    path = str(tmp_path / 'log')
+    writer = LogWriter(path, 'gzip', max_bytes=8, tail_bytes=4)
+    for chunk in (b'abc', b'defgh', b'ijklmn'):
+        writer.write(chunk)
+    writer.close()
+    assert writer.received == 14
+    assert gzip.decompress(open(path, 'rb').read()) == (
+        b'abcd\n[... 6 bytes omitted ...]\nklmn')
+
+
+def test_invalid_capture_settings(tmp_path):
+    with pytest.raises(ValueError):
+        experimentor.LogCapture(stderr='both')
+    with pytest.raises(ValueError):
+        experimentor.LogCapture(compression='bz2')
+    with pytest.raises(ValueError):
+        LogWriter(str(tmp_path / 'log'), max_bytes=10, tail_bytes=20)
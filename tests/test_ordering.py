@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import experimentor
+from experimentor.ledger import LEDGER_FILE
+
+CONFIG = [{'small': 1, 'large': 10}, {'fast': 'fast', 'slow': 'slow'}]
+
+
+def cost(title, config):
+    return config.get('small', 10) * (2 if 'slow' in config else 1)
+
+
+def test_cost_runs_the_longest_first(tmp_path, make_runner):
+    predictor = experimentor.RuntimePredictor(cost=cost)
+    runner = make_runner()
+    experimentor.run_experiments(CONFIG, runner, str(tmp_path),
+                                 predictor=predictor)
+    assert runner.runs == ['large_slow', 'large_fast', 'small_slow',
+                           'small_fast']
+
+
+def test_history_and_regression():
+    history = {'small_fast': 1.0, 'small_slow': 4.0, 'large_fast': 10.0}
+    predictor = experimentor.RuntimePredictor(history)
+    ordered, weights = predictor.order(experimentor.ConfigureIterable(CONFIG))
+    # A new combination of known values: 10 times as large and 4 times as
+    # slow
+    assert weights['large_slow'] == pytest.approx(40.0, rel=0.05)
+    assert [title for title, _ in ordered] == [
+        'large_slow', 'large_fast', 'small_slow', 'small_fast']
+
+
+def test_unknown_runtimes_keep_their_order():
+    known = {'small_slow': 5.0, 'large_slow': 1.0}
+    predictor = experimentor.RuntimePredictor(
+        cost=lambda title, config: known.get(title))
+    ordered, weights = predictor.order(experimentor.ConfigureIterable(CONFIG))
+    assert [title for title, _ in ordered] == [
+        'small_slow', 'small_fast', 'large_fast', 'large_slow']
+    # The median of the known predictions
+    assert weights['small_fast'] == weights['large_fast'] == 3.0
+    _, weights = experimentor.RuntimePredictor().order(
+        experimentor.ConfigureIterable(CONFIG))
+    assert set(weights.values()) == {1.0}
+
+
+def test_history_from_the_ledger(tmp_path):
+    records = [('a', True, 1.0), ('a', True, 3.0), ('a', True, 2.0),
+               ('a', False, 100.0), ('b', True, None)]
+    with open(tmp_path / LEDGER_FILE, 'w') as f:
+        for title, successful, wall in records:
+            f.write(json.dumps({'title': title, 'successful': successful,
+                                'wall': wall}) + '\n')
+        f.write('{"title": "b", "succ')
+    predictor = experimentor.RuntimePredictor.from_log_dir(str(tmp_path))
+    assert predictor.history == {'a': 2.0}
+    assert experimentor.RuntimePredictor.from_log_dir(
+        str(tmp_path / 'none')).history == {}
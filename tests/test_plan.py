@@ -0,0 +1,41 @@
+import pytest
+
+import experimentor
+from experimentor.plan import config_hash
+
+CONFIG = [{1: 'one', 'two': 2}, {'n': {'$range': [0, 3]}}]
+
+
+def test_plan_matches_the_configuration(tmp_path):
+    path = str(tmp_path / 'sweep.plan')
+    assert experimentor.compile_plan(CONFIG, path) == 6
+    expected = list(experimentor.ConfigureIterable(CONFIG))
+    with experimentor.SweepPlan(path) as plan:
+        assert list(plan.configs()) == expected
+        assert list(plan.configs()[1::2]) == expected[1::2]
+        assert [plan.config_hash(i) for i in range(6)] == [
+            config_hash(conf) for _, conf in expected]
+
+
+@pytest.mark.parametrize('value', [(1, 2), {'a': [(1,)]}, {1: 'a'}])
+def test_values_that_change_in_json_are_rejected(tmp_path, value):
+    path = tmp_path / 'sweep.plan'
+    with pytest.raises(ValueError, match='read back from JSON'):
+        experimentor.compile_plan([{'v': value}], str(path))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_json_values_are_kept(tmp_path):
+    config = [{'v': [1, 2.5, float('nan'), {'a': None}], 'w': True}]
+    path = str(tmp_path / 'sweep.plan')
+    experimentor.compile_plan(config, path)
+    with experimentor.SweepPlan(path) as plan:
+        (_, first), (_, second) = plan.configs()
+    assert repr(first) == repr({'v': [1, 2.5, float('nan'), {'a': None}]})
+    assert second == {'w': True}
+
+
+def test_hash_of_mixed_keys():
+    assert config_hash({1: 'a', 'b': 2}) == config_hash({'b': 2, 1: 'a'})
+    assert config_hash({1: 'a', 'b': 2}) != config_hash({'1': 'a', 'b': 2})
+    assert config_hash({'a': 1, 'b': 2}) == config_hash({'b': 2, 'a': 1})
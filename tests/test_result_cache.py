@@ -0,0 +1,44 @@
+import experimentor
+
+COMMAND = 'echo run >> {counter}; echo out; echo err >&2 #'
+
+
+def run(tmp_path, cache, name, capture=None):
+    runner = experimentor.SimpleCommandRunner(
+        COMMAND.format(counter=tmp_path / 'counter'), cache=cache,
+        capture=capture)
+    log_dir = tmp_path / name
+    log_dir.mkdir()
+    runner.run_experiment('t', {}, str(log_dir / 'x.log'))
+    return {path.name: path.read_text() for path in log_dir.iterdir()}
+
+
+def runs(tmp_path) -> int:
+    return len((tmp_path / 'counter').read_text().split())
+
+
+def test_cache_hit_restores_every_capture_file(tmp_path):
+    cache = experimentor.ResultCache(str(tmp_path / 'cache'))
+    capture = experimentor.LogCapture(stderr='separate')
+    first = run(tmp_path, cache, 'first', capture)
+    assert first == {'x.log': 'out\n', 'x.log.stderr': 'err\n'}
+    assert run(tmp_path, cache, 'second', capture) == first
+    assert runs(tmp_path) == 1
+
+
+def test_capture_settings_are_part_of_the_key(tmp_path):
+    cache = experimentor.ResultCache(str(tmp_path / 'cache'))
+    run(tmp_path, cache, 'separate',
+        experimentor.LogCapture(stderr='separate'))
+    merged = run(tmp_path, cache, 'merged', experimentor.LogCapture())
+    assert merged == {'x.log': 'out\nerr\n'}
+    assert runs(tmp_path) == 2
+
+
+def test_eviction_removes_whole_entries(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = experimentor.ResultCache(str(cache_dir))
+    run(tmp_path, cache, 'first', experimentor.LogCapture(stderr='separate'))
+    assert len(list(cache_dir.iterdir())) == 2
+    experimentor.ResultCache(str(cache_dir), max_bytes=4)
+    assert list(cache_dir.iterdir()) == []
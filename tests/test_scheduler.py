@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+import experimentor
+from experimentor.scheduler import Resources, ResourceScheduler
+
+
+class ConcurrencyRunner(experimentor.BaseExperimentRunner):
+    """Record the largest number of cores in use at the same time. Each
+    configuration has a single value: the number of cores it needs.
+    """
+    def __init__(self):
+        super().__init__(lambda title, config: Resources(*config.values()))
+        self.cpus = 0
+        self.max_cpus = 0
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def run_experiment(self, title, config, file):
+        cpus = self.get_resources(title, config).cpus
+        with self._lock:
+            self.runs.append(title)
+            self.cpus += cpus
+            self.max_cpus = max(self.max_cpus, self.cpus)
+        time.sleep(0.05)
+        with self._lock:
+            self.cpus -= cpus
+
+
+def test_experiments_are_packed_into_the_capacity():
+    runner = ConcurrencyRunner()
+    scheduler = ResourceScheduler(Resources(cpus=4, memory=None))
+    choices = {f'c{i}': cpus for i, cpus in enumerate([2, 2, 1, 3, 2, 1])}
+    experimentor.run_experiments([choices], runner, None, scheduler=scheduler)
+    assert sorted(runner.runs) == sorted(choices)
+    # Two experiments with 2 cores run together, but never more than 4 cores
+    assert runner.max_cpus == 4
+    assert scheduler.running == 0 and scheduler.used_cpus == 0
+
+
+def test_experiment_larger_than_the_capacity_runs_alone():
+    runner = ConcurrencyRunner()
+    scheduler = ResourceScheduler(Resources(cpus=2))
+    experimentor.run_experiments([{'small': 1, 'large': 3, 'other': 1}],
+                                 runner, None, scheduler=scheduler)
+    assert runner.max_cpus == 3
+    assert len(runner.runs) == 3
+
+
+def test_acquire_and_release():
+    scheduler = ResourceScheduler(Resources(cpus=4, memory=100))
+    assert scheduler.try_acquire(Resources(cpus=2, memory=60))
+    # Memory is exhausted even though cores are left
+    assert not scheduler.try_acquire(Resources(cpus=1, memory=50))
+    # Unknown memory is not counted
+    assert scheduler.try_acquire(Resources(cpus=1, memory=None))
+    assert not scheduler.try_acquire(Resources(cpus=2))
+
+    acquired = threading.Event()
+
+    def acquire():
+        scheduler.acquire(Resources(cpus=2))
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    scheduler.release(Resources(cpus=2, memory=60))
+    assert acquired.wait(5)
+    thread.join()
+    assert (scheduler.used_cpus, scheduler.used_memory) == (3, 0)
+
+
+def test_invalid_resources():
+    with pytest.raises(ValueError):
+        Resources(cpus=0)
+    with pytest.raises(ValueError):
+        Resources(memory=-1)
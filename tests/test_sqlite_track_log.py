@@ -0,0 +1,71 @@
+import os
+
+import experimentor
+from experimentor.journal import FAILED, SUCCEEDED
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}]
+# Only the configuration 2 fails
+COMMAND = "sh -c 'echo out $0; echo err $0 >&2; [ $0 != 2 ]'"
+
+
+def run(track_log, capture=None, **kwargs):
+    runner = experimentor.SimpleCommandRunner(COMMAND, capture=capture)
+    return experimentor.run_experiments(
+        CONFIG, runner, None, track_log=track_log, max_trial=1,
+        continue_on_failure=True, **kwargs)
+
+
+def test_runs_and_outputs_are_stored(tmp_path):
+    track_log = experimentor.SqliteTrackLog(str(tmp_path))
+    run(track_log, experimentor.LogCapture(stderr='separate'))
+    runs = track_log.runs()
+    # The failed configuration is retried in the deferred round
+    assert [(row[1], row[3]) for row in runs] == [
+        ('a', SUCCEEDED), ('b', FAILED), ('c', SUCCEEDED), ('b', FAILED)]
+    assert runs[1][6] == f"{COMMAND} 2 returns non-zero value: 1"
+    assert [row[1] for row in track_log.runs(FAILED)] == ['b', 'b']
+    with track_log.open_latest_log_file('c') as f:
+        assert f.read() == 'out 3\n'
+    with track_log.open_latest_log_file('c', 'stderr') as f:
+        assert f.read() == 'err 3\n'
+    # Only the running experiments have spool files
+    assert os.listdir(tmp_path / 'spool') == []
+    track_log.close()
+
+
+def test_only_succeeded_experiments_are_skipped(tmp_path):
+    track_log = experimentor.SqliteTrackLog(str(tmp_path))
+    run(track_log)
+    track_log.close()
+    track_log = experimentor.SqliteTrackLog(str(tmp_path))
+    run(track_log, skip_if_exists=True)
+    assert [row[1] for row in track_log.runs()][4:] == ['b', 'b']
+    assert track_log.get_latest_run('b') == 6
+    assert track_log.is_finished('a') and not track_log.is_finished('b')
+    track_log.close()
+
+
+def test_compressed_output_is_read_transparently(tmp_path):
+    track_log = experimentor.SqliteTrackLog(str(tmp_path))
+    run(track_log, experimentor.LogCapture(compression='gzip'))
+    run_id = track_log.get_latest_run('a')
+    assert track_log.read_log(run_id)[:2] == b'\x1f\x8b'
+    with track_log.open_latest_log_file('a') as f:
+        assert f.read() == 'out 1\nerr 1\n'
+    track_log.close()
+
+
+def test_parallel_writers(tmp_path):
+    track_log = experimentor.SqliteTrackLog(str(tmp_path))
+    config = [{f'v{i}': i for i in range(20)}]
+    runner = experimentor.SimpleCommandRunner('echo')
+    experimentor.run_experiments(config, runner, None, track_log=track_log,
+                                 max_workers=8)
+    assert len(track_log.runs(SUCCEEDED)) == 20
+    with track_log.open_latest_log_file('v7') as f:
+        assert f.read() == '7\n'
+    # Another process opens the same database while it is in use
+    other = experimentor.SqliteTrackLog(str(tmp_path))
+    assert other.is_finished('v19')
+    other.close()
+    track_log.close()
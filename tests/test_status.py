@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import experimentor
+from experimentor.journal import CompletionJournal
+from experimentor.status import (DONE, FAILED, MISSING, StatusIndex,
+                                 index_path, sweep_status)
+from experimentor.track_log import JOURNAL_FILE
+
+CONFIG = [{'a': 1, 'b': 2, 'c': 3}, {'x': 'x', 'y': 'y'}]
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(path))
+    return path
+
+
+def run_sweep(log_dir, make_runner):
+    runner = make_runner(failing={'b_y'})
+    experimentor.run_experiments(CONFIG, runner, str(log_dir), max_trial=1,
+                                 continue_on_failure=True)
+
+
+def add_log(log_dir, title, name='2024-01-01-00-00-00.log'):
+    subdir = log_dir / title
+    subdir.mkdir(exist_ok=True)
+    (subdir / name).write_text('')
+
+
+def test_states_come_from_the_journal(tmp_path, make_runner):
+    log_dir = tmp_path / 'log'
+    run_sweep(log_dir, make_runner)
+    status = sweep_status(CONFIG, str(log_dir))
+    assert status.titles[FAILED] == ['b_y']
+    assert status.count(DONE) == 5
+    assert status.summary().splitlines()[:3] == [
+        'Total: 6', 'Done: 5', 'Failed: 1']
+    assert sweep_status(CONFIG, str(tmp_path / 'none')).count(MISSING) == 6
+
+
+def test_index_is_invalidated_by_the_journal_and_the_directories(tmp_path):
+    log_dir = tmp_path / 'log'
+    log_dir.mkdir()
+    add_log(log_dir, 'a_x')
+    assert sweep_status(CONFIG, str(log_dir)).titles[DONE] == ['a_x']
+    assert os.path.exists(index_path(str(log_dir)))
+    # A new log file changes the modification time of its directory
+    add_log(log_dir, 'b_x')
+    assert sweep_status(CONFIG, str(log_dir)).titles[DONE] == ['a_x', 'b_x']
+    # Records appended to the journal take over the directories
+    journal = CompletionJournal(str(log_dir / JOURNAL_FILE))
+    journal.record('a_x', FAILED, 0)
+    journal.close()
+    status = sweep_status(CONFIG, str(log_dir))
+    assert status.titles[FAILED] == ['a_x']
+    assert status.titles[DONE] == ['b_x']
+
+
+def test_log_directory_is_never_written(tmp_path, make_runner, cache_home):
+    log_dir = tmp_path / 'log'
+    run_sweep(log_dir, make_runner)
+    before = sorted(os.listdir(log_dir))
+    sweep_status(CONFIG, str(log_dir))
+    assert sorted(os.listdir(log_dir)) == before
+    assert len(os.listdir(cache_home / 'experimentor' / 'status')) == 1
+
+
+def test_unwritable_cache_is_skipped(tmp_path, make_runner, cache_home):
+    log_dir = tmp_path / 'log'
+    run_sweep(log_dir, make_runner)
+    # A file in place of the cache directory cannot be written to
+    cache_home.write_text('')
+    assert sweep_status(CONFIG, str(log_dir)).count(DONE) == 5
+    index = StatusIndex(str(log_dir))
+    index.refresh()
+    index.save()
+    assert index.changed
+    assert not os.path.exists(index_path(str(log_dir)))